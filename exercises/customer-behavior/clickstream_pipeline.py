@@ -0,0 +1,378 @@
+"""
+Pipeline de Pontuação de Clickstream em Streaming
+=================================================
+
+Este módulo pontua logs brutos de clickstream (CSV ou JSONL) com o CustomerBehaviorModel
+sem carregar o arquivo inteiro na memória. O arquivo é lido em blocos de tamanho fixo,
+os valores brutos de cada bloco são discretizados nas categorias dos Enums do modelo e
+pontuados de forma vetorizada, e os resultados são gravados incrementalmente.
+
+Colunas esperadas na entrada (nomes configuráveis):
+1. purchase_count: número de compras anteriores do cliente
+2. seconds_on_site: segundos de permanência no site
+3. promo_clicks: número de cliques em promoções
+4. session_id (opcional): identificador copiado para a saída
+5. purchased (opcional): 1 se a sessão terminou em compra, usado no aprendizado das CPTs
+"""
+
+import csv
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass
+from itertools import islice
+from typing import Dict, Iterator, Optional
+
+import numpy as np
+
+from customer_behavior_model import CustomerBehaviorModel, CustomerProfileBatch
+
+
+DEFAULT_COLUMNS = {
+    "id": "session_id",
+    "purchases": "purchase_count",
+    "seconds": "seconds_on_site",
+    "clicks": "promo_clicks",
+    "purchased": "purchased",
+}
+
+
+def bin_purchase_history(purchase_count) -> np.ndarray:
+    """
+    Converte o número de compras em códigos de PurchaseHistory.
+
+    0 compras -> NEW_CUSTOMER, 1-3 -> OCCASIONAL, 4-10 -> REGULAR, mais de 10 -> FREQUENT.
+    """
+    purchase_count = np.asarray(purchase_count)
+    return ((purchase_count >= 1).astype(np.int8) + (purchase_count >= 4) + (purchase_count > 10))
+
+
+def bin_time_on_site(seconds) -> np.ndarray:
+    """
+    Converte segundos no site em códigos de TimeOnSite.
+
+    Menos de 2 minutos -> SHORT, de 2 a 10 minutos -> MEDIUM, mais de 10 minutos -> LONG.
+    """
+    seconds = np.asarray(seconds)
+    return (seconds >= 120).astype(np.int8) + (seconds > 600)
+
+
+def bin_promotion_interaction(clicks) -> np.ndarray:
+    """
+    Converte cliques em promoções em códigos de PromotionInteraction.
+
+    0 cliques -> NO_CLICK, 1-2 -> FEW_CLICKS, 3 ou mais -> MANY_CLICKS.
+    """
+    clicks = np.asarray(clicks)
+    return (clicks >= 1).astype(np.int8) + (clicks >= 3)
+
+
+def bin_clickstream(purchase_count, seconds, clicks) -> CustomerProfileBatch:
+    """
+    Discretiza valores brutos de clickstream em um lote de perfis.
+
+    Raises:
+        ValueError: Se algum valor for negativo ou não numérico (NaN)
+    """
+    for values in (purchase_count, seconds, clicks):
+        values = np.asarray(values)
+        if values.size and not (values >= 0).all():
+            raise ValueError("Valores de clickstream devem ser números não negativos")
+    return CustomerProfileBatch(
+        bin_purchase_history(purchase_count),
+        bin_time_on_site(seconds),
+        bin_promotion_interaction(clicks),
+    )
+
+
+@dataclass
+class PipelineReport:
+    """Resumo de uma execução do pipeline"""
+    rows: int
+    chunks: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self):
+        return (f"{self.rows} linhas em {self.chunks} blocos, {self.seconds:.2f}s "
+                f"({self.rows_per_second:,.0f} linhas/s)")
+
+
+def _detect_format(path: str, allow_npy: bool = False) -> str:
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if extension == ".csv":
+        return "csv"
+    if allow_npy and extension == ".npy":
+        return "npy"
+    supported = ".csv, .jsonl ou .npy" if allow_npy else ".csv ou .jsonl"
+    raise ValueError(f"Formato não suportado: {path} (use {supported})")
+
+
+# Rótulos de compra aceitos: texto do CSV ou número/booleano do JSONL (True == 1)
+_PURCHASE_LABELS = {"0": 0, "1": 1, 0: 0, 1: 1}
+
+
+def _purchase_labels(values, numbers, path: str) -> np.ndarray:
+    """Converte rótulos de compra para int8, rejeitando qualquer valor diferente de 0 e 1"""
+    try:
+        return np.array([_PURCHASE_LABELS[value] for value in values], dtype=np.int8)
+    except (KeyError, TypeError):
+        for value, number in zip(values, numbers):
+            if not isinstance(value, (str, int, float)) or value not in _PURCHASE_LABELS:
+                raise ValueError(f"Linha {number} de {path}: rótulo de compra inválido "
+                                 f"{value!r} (use 0 ou 1)") from None
+        raise
+
+
+class _NpyStreamWriter:
+    """
+    Grava um array .npy float64 unidimensional cujo tamanho só é conhecido no final.
+
+    O cabeçalho é reservado com espaço fixo no início do arquivo, os dados são anexados
+    bloco a bloco e o cabeçalho é reescrito com o tamanho final em close().
+    """
+    HEADER_SIZE = 128  # múltiplo de 64, como exige o formato .npy
+
+    def __init__(self, handle):
+        self.handle = handle
+        self.rows = 0
+        self._write_header()
+
+    def _write_header(self):
+        header = repr({"descr": "<f8", "fortran_order": False, "shape": (self.rows,)})
+        prefix = b"\x93NUMPY\x01\x00"
+        length = self.HEADER_SIZE - len(prefix) - 2
+        self.handle.write(prefix + length.to_bytes(2, "little")
+                          + header.ljust(length - 1).encode("latin1") + b"\n")
+
+    def write(self, values: np.ndarray):
+        self.handle.write(np.ascontiguousarray(values, dtype="<f8").tobytes())
+        self.rows += len(values)
+
+    def close(self):
+        self.handle.seek(0)
+        self._write_header()
+
+
+def read_clickstream(path: str, chunk_size: int = 100_000,
+                     columns: Optional[Dict[str, str]] = None) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    Lê um arquivo de clickstream em blocos de até chunk_size linhas.
+
+    Args:
+        path: Arquivo .csv (com cabeçalho) ou .jsonl
+        chunk_size: Número máximo de linhas por bloco
+        columns: Nomes das colunas, com as mesmas chaves de DEFAULT_COLUMNS
+
+    Yields:
+        Dicionário com os arrays "purchases", "seconds" e "clicks" do bloco, mais "id" e
+        "purchased" quando essas colunas existem no arquivo
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size deve ser positivo")
+    columns = {**DEFAULT_COLUMNS, **(columns or {})}
+    fields = ("purchases", "seconds", "clicks")
+
+    with open(path, newline="", encoding="utf-8") as handle:
+        if _detect_format(path) == "csv":
+            reader = csv.reader(handle)
+            header = next(reader, [])
+            try:
+                positions = [header.index(columns[field]) for field in fields]
+            except ValueError:
+                raise ValueError(f"Cabeçalho sem as colunas {[columns[f] for f in fields]}: "
+                                 f"{header}") from None
+            id_position = header.index(columns["id"]) if columns["id"] in header else None
+            purchased_position = (header.index(columns["purchased"])
+                                  if columns["purchased"] in header else None)
+            width = 1 + max(position for position in (*positions, id_position, purchased_position)
+                            if position is not None)
+            # Linhas em branco (como a do final do arquivo) chegam como [] e são ignoradas
+            numbered = ((reader.line_num, row) for row in reader if row)
+
+            while True:
+                rows, numbers = [], []
+                for number, row in islice(numbered, chunk_size):
+                    if len(row) < width:
+                        raise ValueError(f"Linha {number} de {path}: {len(row)} colunas, "
+                                         f"o cabeçalho exige ao menos {width}")
+                    rows.append(row)
+                    numbers.append(number)
+                if not rows:
+                    return
+                chunk = {field: np.array([row[position] for row in rows], dtype=np.float64)
+                         for field, position in zip(fields, positions)}
+                if id_position is not None:
+                    chunk["id"] = [row[id_position] for row in rows]
+                if purchased_position is not None:
+                    chunk["purchased"] = _purchase_labels([row[purchased_position] for row in rows],
+                                                          numbers, path)
+                yield chunk
+        else:
+            lines = ((number, line) for number, line in enumerate(handle, 1) if line.strip())
+            optional = (columns["id"], columns["purchased"])
+            present = None  # colunas opcionais do arquivo, definidas pelo primeiro registro
+            while True:
+                records, numbers = [], []
+                for number, line in islice(lines, chunk_size):
+                    record = json.loads(line)
+                    missing = [columns[field] for field in fields if columns[field] not in record]
+                    if missing:
+                        raise ValueError(f"Linha {number} de {path}: registro sem as colunas {missing}")
+                    keys = tuple(key in record for key in optional)
+                    if present is None:
+                        present = keys
+                    elif keys != present:
+                        raise ValueError(f"Linha {number} de {path}: as colunas opcionais {list(optional)} "
+                                         f"devem aparecer em todos os registros ou em nenhum")
+                    records.append(record)
+                    numbers.append(number)
+                if not records:
+                    return
+                chunk = {field: np.array([record[columns[field]] for record in records],
+                                         dtype=np.float64)
+                         for field in fields}
+                if present[0]:
+                    chunk["id"] = [record[columns["id"]] for record in records]
+                if present[1]:
+                    chunk["purchased"] = _purchase_labels(
+                        [record[columns["purchased"]] for record in records], numbers, path)
+                yield chunk
+
+
+def score_clickstream(model: CustomerBehaviorModel, input_path: str, output_path: str,
+                      chunk_size: int = 100_000, columns: Optional[Dict[str, str]] = None,
+                      progress: bool = False) -> PipelineReport:
+    """
+    Pontua um arquivo de clickstream bloco a bloco e grava as probabilidades.
+
+    A memória usada é proporcional a chunk_size, não ao tamanho da entrada. Saídas CSV e
+    JSONL têm uma linha por sessão com o identificador (ou o número da linha, quando a
+    entrada não tem a coluna de identificação) e a probabilidade de compra; a saída .npy
+    contém apenas o array de probabilidades, na ordem da entrada.
+
+    Args:
+        model: Modelo usado na pontuação
+        input_path: Arquivo de entrada (.csv ou .jsonl)
+        output_path: Arquivo de saída (.csv, .jsonl ou .npy)
+        chunk_size: Número de linhas processadas por bloco
+        columns: Nomes das colunas de entrada, com as chaves de DEFAULT_COLUMNS
+        progress: Se verdadeiro, reporta a vazão de cada bloco em stderr
+
+    Returns:
+        PipelineReport com total de linhas, blocos e vazão
+    """
+    output_format = _detect_format(output_path, allow_npy=True)
+    id_column = {**DEFAULT_COLUMNS, **(columns or {})}["id"]
+    rows = chunks = 0
+    start = time.perf_counter()
+
+    if output_format == "npy":
+        output = open(output_path, "wb")
+        npy_writer = _NpyStreamWriter(output)
+    else:
+        output = open(output_path, "w", newline="", encoding="utf-8")
+    with output:
+        if output_format == "csv":
+            # csv.writer coloca entre aspas identificadores com vírgulas, aspas ou quebras de linha
+            writer = csv.writer(output, lineterminator="\n")
+            writer.writerow([id_column, "probability"])
+
+        for chunk in read_clickstream(input_path, chunk_size, columns):
+            batch = bin_clickstream(chunk["purchases"], chunk["seconds"], chunk["clicks"])
+            probabilities = model.calculate_purchase_probability_batch(batch)
+            ids = chunk.get("id")
+            if ids is None:
+                ids = range(rows, rows + len(batch))
+
+            if output_format == "npy":
+                npy_writer.write(probabilities)
+            elif output_format == "csv":
+                writer.writerows(zip(ids, probabilities.tolist()))
+            else:
+                output.writelines(
+                    f'{{{json.dumps(id_column)}: {json.dumps(session)}, '
+                    f'"probability": {probability!r}}}\n'
+                    for session, probability in zip(ids, probabilities.tolist()))
+
+            rows += len(batch)
+            chunks += 1
+            if progress:
+                elapsed = time.perf_counter() - start
+                print(f"bloco {chunks}: {rows} linhas ({rows / elapsed:,.0f} linhas/s)",
+                      file=sys.stderr)
+
+        if output_format == "npy":
+            npy_writer.close()
+
+    return PipelineReport(rows=rows, chunks=chunks, seconds=time.perf_counter() - start)
+
+
+def generate_synthetic_clickstream(path: str, rows: int, seed=None,
+                                   chunk_size: int = 100_000) -> None:
+    """
+    Gera um arquivo de clickstream sintético (.csv ou .jsonl) para testes de vazão.
+
+    Args:
+        path: Arquivo a ser criado
+        rows: Número de sessões
+        seed: Semente ou numpy.random.Generator
+        chunk_size: Número de linhas geradas por bloco
+    """
+    rng = np.random.default_rng(seed)
+    output_format = _detect_format(path)
+    names = DEFAULT_COLUMNS
+
+    with open(path, "w", newline="", encoding="utf-8") as output:
+        if output_format == "csv":
+            output.write(f"{names['id']},{names['purchases']},{names['seconds']},{names['clicks']}\n")
+        for offset in range(0, rows, chunk_size):
+            size = min(chunk_size, rows - offset)
+            purchases = rng.poisson(3.0, size).tolist()
+            seconds = rng.exponential(300.0, size).round(1).tolist()
+            clicks = rng.poisson(1.2, size).tolist()
+            sessions = range(offset, offset + size)
+            if output_format == "csv":
+                output.writelines(f"s{i},{p},{s},{c}\n"
+                                  for i, p, s, c in zip(sessions, purchases, seconds, clicks))
+            else:
+                output.writelines(
+                    f'{{"{names["id"]}": "s{i}", "{names["purchases"]}": {p}, '
+                    f'"{names["seconds"]}": {s}, "{names["clicks"]}": {c}}}\n'
+                    for i, p, s, c in zip(sessions, purchases, seconds, clicks))
+
+
+def main():
+    """Pontua um arquivo pela linha de comando ou gera dados sintéticos para teste"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pontuação de clickstream em streaming")
+    parser.add_argument("input", help="Arquivo de entrada (.csv ou .jsonl)")
+    parser.add_argument("output", nargs="?", help="Arquivo de saída (.csv, .jsonl ou .npy)")
+    parser.add_argument("--chunk-size", type=int, default=100_000,
+                        help="Linhas por bloco (padrão: 100000)")
+    parser.add_argument("--generate", type=int, metavar="N",
+                        help="Gera N sessões sintéticas em INPUT em vez de pontuar")
+    parser.add_argument("--seed", type=int, default=None, help="Semente dos dados sintéticos")
+    args = parser.parse_args()
+
+    if args.generate is not None:
+        generate_synthetic_clickstream(args.input, args.generate, args.seed, args.chunk_size)
+        print(f"{args.generate} sessões sintéticas gravadas em {args.input}")
+        return
+    if args.output is None:
+        parser.error("informe o arquivo de saída")
+
+    report = score_clickstream(CustomerBehaviorModel(), args.input, args.output,
+                               chunk_size=args.chunk_size, progress=True)
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Aprendizado Incremental das Tabelas de Probabilidade
+====================================================
+
+Este módulo estima as CPTs do CustomerBehaviorModel a partir de eventos de compra, em vez
+de digitá-las à mão em _initialize_probabilities. Todos os eventos são acumulados em um
+único tensor de contagens N(Histórico, Tempo, Promoção, Compra) de formato 4x3x3x2, do
+qual as quatro tabelas do modelo são derivadas com suavização de Laplace/Dirichlet.
+
+Como as contagens são aditivas, cada processo pode acumular o seu próprio tensor e os
+resultados são combinados por soma simples, em qualquer ordem.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from customer_behavior_model import (
+    CPT_SHAPE,
+    HISTORY_LEVELS,
+    PROMO_LEVELS,
+    TIME_LEVELS,
+    CustomerBehaviorModel,
+    CustomerProfileBatch,
+)
+
+
+COUNT_SHAPE = CPT_SHAPE + (2,)
+
+
+class CPTCounts:
+    """
+    Contagens de eventos para estimar as CPTs do modelo de comportamento.
+
+    Atributos:
+        counts: Tensor int64 com formato 4x3x3x2 indexado por (histórico, tempo, promoção,
+            compra), com os códigos de HISTORY_LEVELS, TIME_LEVELS e PROMO_LEVELS
+        alpha: Pseudo-contagem da priori de Dirichlet (1.0 = suavização de Laplace)
+    """
+
+    def __init__(self, alpha: float = 1.0, counts: Optional[np.ndarray] = None):
+        if alpha < 0:
+            raise ValueError("alpha deve ser não negativo")
+        self.alpha = alpha
+        if counts is None:
+            self.counts = np.zeros(COUNT_SHAPE, dtype=np.int64)
+        else:
+            counts = np.asarray(counts, dtype=np.int64)
+            if counts.shape != COUNT_SHAPE:
+                raise ValueError(f"counts deve ter formato {COUNT_SHAPE}")
+            self.counts = counts.copy()
+
+    @property
+    def total(self) -> int:
+        """Número de eventos acumulados"""
+        return int(self.counts.sum())
+
+    def update(self, history_codes, time_codes, promo_codes, purchased) -> "CPTCounts":
+        """
+        Acumula um lote de eventos em O(tamanho do lote).
+
+        Args:
+            history_codes: Códigos de histórico de cada evento
+            time_codes: Códigos de tempo no site
+            promo_codes: Códigos de interação com promoções
+            purchased: 1 (ou True) quando o evento terminou em compra
+
+        Returns:
+            O próprio objeto, para encadeamento
+        """
+        columns = []
+        for codes, size in zip((history_codes, time_codes, promo_codes, purchased), COUNT_SHAPE):
+            codes = np.asarray(codes)
+            if codes.ndim != 1:
+                raise ValueError("Os códigos devem ser arrays unidimensionais")
+            if codes.dtype.kind not in "iub" and not (
+                    codes.dtype.kind == "f" and np.array_equal(codes, np.floor(codes))):
+                raise ValueError("Os códigos devem ser números inteiros")
+            codes = codes.astype(np.intp, copy=False)
+            if codes.size and (codes.min() < 0 or codes.max() >= size):
+                raise ValueError(f"Códigos fora do intervalo [0, {size - 1}]")
+            columns.append(codes)
+        if len({len(codes) for codes in columns}) > 1:
+            raise ValueError("As quatro colunas de eventos devem ter o mesmo tamanho")
+        flat_index = np.ravel_multi_index(columns, COUNT_SHAPE)
+        self.counts += np.bincount(flat_index, minlength=self.counts.size).reshape(COUNT_SHAPE)
+        return self
+
+    def update_batch(self, batch: CustomerProfileBatch, purchased) -> "CPTCounts":
+        """Acumula os eventos de um CustomerProfileBatch com os respectivos desfechos"""
+        return self.update(batch.history_codes, batch.time_codes, batch.promo_codes, purchased)
+
+    def merge(self, other: "CPTCounts") -> "CPTCounts":
+        """Soma as contagens de outro acumulador (por exemplo, de outro processo)"""
+        self.counts += other.counts
+        return self
+
+    def __iadd__(self, other: "CPTCounts") -> "CPTCounts":
+        return self.merge(other)
+
+    def __add__(self, other: "CPTCounts") -> "CPTCounts":
+        return CPTCounts(self.alpha, self.counts).merge(other)
+
+    def save(self, path: str):
+        """Grava as contagens em um arquivo .npz"""
+        np.savez(path, counts=self.counts, alpha=self.alpha)
+
+    @classmethod
+    def load(cls, path: str) -> "CPTCounts":
+        """Carrega contagens gravadas por save()"""
+        with np.load(path) as data:
+            return cls(alpha=float(data["alpha"]), counts=data["counts"])
+
+    def tables(self) -> Dict[str, Dict]:
+        """
+        Deriva as quatro CPTs do modelo das contagens, com suavização de Dirichlet.
+
+        P(H) = (n_h + a) / (N + 4a), P(T | H) = (n_ht + a) / (n_h + 3a),
+        P(Promo | H) = (n_hp + a) / (n_h + 3a) e
+        P(Compra | H, T, Promo) = (n_htp1 + a) / (n_htp + 2a).
+
+        Returns:
+            Dicionário com as chaves p_purchase_history, p_time_given_history,
+            p_promo_given_history e p_purchase_given_all, no formato do modelo
+
+        Raises:
+            ValueError: Se alpha for 0 e faltarem eventos para alguma distribuição
+        """
+        a = self.alpha
+        counts = self.counts.astype(np.float64)
+        n_history = counts.sum(axis=(1, 2, 3))
+        n_history_time = counts.sum(axis=(2, 3))
+        n_history_promo = counts.sum(axis=(1, 3))
+        n_profile = counts.sum(axis=3)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            p_history = (n_history + a) / (n_history.sum() + len(HISTORY_LEVELS) * a)
+            p_time = (n_history_time + a) / (n_history[:, None] + len(TIME_LEVELS) * a)
+            p_promo = (n_history_promo + a) / (n_history[:, None] + len(PROMO_LEVELS) * a)
+            p_purchase = (counts[..., 1] + a) / (n_profile + 2 * a)
+        if any(np.isnan(table).any() for table in (p_history, p_time, p_promo, p_purchase)):
+            raise ValueError("Eventos insuficientes para estimar todas as tabelas com alpha=0")
+
+        return {
+            "p_purchase_history": {h: float(p_history[i]) for i, h in enumerate(HISTORY_LEVELS)},
+            "p_time_given_history": {
+                (h, t): float(p_time[i, j])
+                for i, h in enumerate(HISTORY_LEVELS) for j, t in enumerate(TIME_LEVELS)
+            },
+            "p_promo_given_history": {
+                (h, p): float(p_promo[i, k])
+                for i, h in enumerate(HISTORY_LEVELS) for k, p in enumerate(PROMO_LEVELS)
+            },
+            "p_purchase_given_all": {
+                (h, t, p): float(p_purchase[i, j, k])
+                for i, h in enumerate(HISTORY_LEVELS)
+                for j, t in enumerate(TIME_LEVELS)
+                for k, p in enumerate(PROMO_LEVELS)
+            },
+        }
+
+    def apply_to(self, model: CustomerBehaviorModel):
+        """Atualiza as CPTs do modelo com as tabelas aprendidas, todas de uma só vez"""
+        model.update_probabilities(**self.tables())
+
+
+def count_events(chunks: Iterable[Dict[str, np.ndarray]], alpha: float = 1.0) -> CPTCounts:
+    """
+    Acumula contagens a partir de blocos de clickstream com a coluna "purchased".
+
+    Args:
+        chunks: Blocos no formato de clickstream_pipeline.read_clickstream
+        alpha: Pseudo-contagem do acumulador resultante
+
+    Returns:
+        CPTCounts com todos os eventos dos blocos
+    """
+    from clickstream_pipeline import bin_clickstream
+
+    learner = CPTCounts(alpha)
+    for chunk in chunks:
+        if "purchased" not in chunk:
+            raise ValueError("Os eventos precisam da coluna 'purchased' para o aprendizado")
+        batch = bin_clickstream(chunk["purchases"], chunk["seconds"], chunk["clicks"])
+        learner.update_batch(batch, chunk["purchased"])
+    return learner
+
+
+def _count_file(path: str, chunk_size: int) -> np.ndarray:
+    from clickstream_pipeline import read_clickstream
+
+    return count_events(read_clickstream(path, chunk_size)).counts
+
+
+def fit_event_files(paths: List[str], alpha: float = 1.0, workers: Optional[int] = None,
+                    chunk_size: int = 100_000) -> CPTCounts:
+    """
+    Conta os eventos de vários arquivos em paralelo e combina as contagens.
+
+    Cada arquivo é lido em streaming por um processo do pool, que devolve apenas o seu
+    tensor 4x3x3x2; o processo principal soma os tensores.
+
+    Args:
+        paths: Arquivos de eventos (.csv ou .jsonl) no formato de clickstream_pipeline
+        alpha: Pseudo-contagem da suavização
+        workers: Número de processos (padrão: número de CPUs)
+        chunk_size: Linhas lidas por bloco em cada processo
+
+    Returns:
+        CPTCounts com os eventos de todos os arquivos
+    """
+    learner = CPTCounts(alpha)
+    workers = min(workers or os.cpu_count() or 1, max(len(paths), 1))
+    if workers == 1:
+        for path in paths:
+            learner.counts += _count_file(path, chunk_size)
+        return learner
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for counts in pool.map(_count_file, paths, [chunk_size] * len(paths)):
+            learner.counts += counts
+    return learner
+
+
+def main():
+    """Demonstra o aprendizado recuperando as CPTs de eventos simulados pelo próprio modelo"""
+    model = CustomerBehaviorModel()
+    rng = np.random.default_rng(42)
+    size = 2_000_000
+
+    p_history = np.array([model.p_purchase_history[h] for h in HISTORY_LEVELS])
+    p_time = np.array([[model.p_time_given_history[(h, t)] for t in TIME_LEVELS]
+                       for h in HISTORY_LEVELS])
+    p_promo = np.array([[model.p_promo_given_history[(h, p)] for p in PROMO_LEVELS]
+                        for h in HISTORY_LEVELS])
+
+    # Amostragem ancestral pela rede: histórico, depois tempo e promoção, depois compra
+    history = rng.choice(len(HISTORY_LEVELS), size=size, p=p_history)
+    time = (rng.random(size)[:, None] > np.cumsum(p_time, axis=1)[history]).sum(axis=1)
+    promo = (rng.random(size)[:, None] > np.cumsum(p_promo, axis=1)[history]).sum(axis=1)
+    time = np.minimum(time, len(TIME_LEVELS) - 1)
+    promo = np.minimum(promo, len(PROMO_LEVELS) - 1)
+    purchased = rng.random(size) < model.calculate_purchase_probability_batch(history, time, promo)
+
+    # Dois "processos" acumulam metades diferentes e as contagens são somadas
+    half = size // 2
+    left = CPTCounts().update(history[:half], time[:half], promo[:half], purchased[:half])
+    right = CPTCounts().update(history[half:], time[half:], promo[half:], purchased[half:])
+    learned = left + right
+
+    fitted = CustomerBehaviorModel()
+    learned.apply_to(fitted)
+    error = np.abs(fitted.build_purchase_tensor() - model.build_purchase_tensor()).max()
+    print(f"{learned.total} eventos acumulados")
+    print(f"Maior erro absoluto em P(Compra | Histórico, Tempo, Promoção): {error:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Interface de Linha de Comando do Modelo de Comportamento de Clientes
+====================================================================
+
+Ponto de entrada para jobs em lote em servidores sem interface gráfica. Bibliotecas de
+gráficos só são importadas pelo subcomando plot, então a inicialização dos demais
+subcomandos é dominada pela importação do NumPy.
+
+Subcomandos:
+- score-file: pontua um arquivo de clickstream (.csv/.jsonl) gravando .csv, .jsonl ou .npy
+- segments: exporta os segmentos de clientes em JSON ou CSV
+- simulate: executa a simulação Monte Carlo e exporta as estatísticas em JSON
+- plot: gera as visualizações do modelo (em arquivo ou na tela)
+
+Os tempos de importação e de execução são reportados em stderr, deixando stdout livre
+para a saída estruturada.
+
+Exemplo:
+    python customer_behavior_cli.py score-file sessions.csv scores.npy
+"""
+
+import time
+
+_started = time.perf_counter()
+
+import argparse  # noqa: E402
+import csv  # noqa: E402
+import json  # noqa: E402
+import sys  # noqa: E402
+
+from customer_behavior_model import CustomerBehaviorModel  # noqa: E402
+
+_import_seconds = time.perf_counter() - _started
+
+
+def _open_output(path):
+    """Abre o arquivo de saída, ou stdout quando path é None ou '-'"""
+    if path in (None, "-"):
+        return sys.stdout
+    return open(path, "w", newline="", encoding="utf-8")
+
+
+def score_file(args) -> dict:
+    from clickstream_pipeline import score_clickstream
+
+    report = score_clickstream(CustomerBehaviorModel(), args.input, args.output,
+                               chunk_size=args.chunk_size)
+    return {"rows": report.rows, "chunks": report.chunks,
+            "rows_per_second": report.rows_per_second}
+
+
+def segments(args) -> dict:
+    model = CustomerBehaviorModel()
+    rows = [
+        {
+            "segment": name,
+            "purchase_history": profile.purchase_history.value,
+            "time_on_site": profile.time_on_site.value,
+            "promotion_interaction": profile.promotion_interaction.value,
+            "probability": probability,
+        }
+        for name, profiles in model.analyze_customer_segments().items()
+        for profile, probability in profiles
+    ]
+    output = _open_output(args.output)
+    try:
+        if args.output and args.output.lower().endswith(".csv"):
+            writer = csv.DictWriter(output, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        else:
+            json.dump(rows, output, ensure_ascii=False, indent=2)
+            output.write("\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return {"profiles": len(rows)}
+
+
+def simulate(args) -> dict:
+    stats = CustomerBehaviorModel().simulate_customer_scenarios(
+        args.scenarios, seed=args.seed, chunk_size=args.chunk_size,
+        bootstrap_samples=args.bootstrap, confidence=args.confidence)
+    output = _open_output(args.output)
+    try:
+        json.dump(stats, output, ensure_ascii=False, indent=2)
+        output.write("\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return {"scenarios": args.scenarios}
+
+
+def plot(args) -> dict:
+    if args.output:
+        # Backend sem janela para gravar em arquivo em servidores sem display
+        import matplotlib
+        matplotlib.use("Agg")
+    from customer_behavior_model import create_visualization
+
+    create_visualization(CustomerBehaviorModel(), output_path=args.output)
+    return {"output": args.output}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Modelo probabilístico de comportamento de clientes")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    parser_score = subcommands.add_parser("score-file", help="Pontua um arquivo de clickstream")
+    parser_score.add_argument("input", help="Arquivo de entrada (.csv ou .jsonl)")
+    parser_score.add_argument("output", help="Arquivo de saída (.csv, .jsonl ou .npy)")
+    parser_score.add_argument("--chunk-size", type=int, default=100_000)
+    parser_score.set_defaults(handler=score_file)
+
+    parser_segments = subcommands.add_parser("segments", help="Exporta os segmentos de clientes")
+    parser_segments.add_argument("--output", "-o", help="Arquivo .json ou .csv (padrão: stdout)")
+    parser_segments.set_defaults(handler=segments)
+
+    parser_simulate = subcommands.add_parser("simulate", help="Simulação Monte Carlo de cenários")
+    parser_simulate.add_argument("--scenarios", type=int, default=1000)
+    parser_simulate.add_argument("--seed", type=int, default=None)
+    parser_simulate.add_argument("--chunk-size", type=int, default=1_000_000)
+    parser_simulate.add_argument("--bootstrap", type=int, default=0,
+                                 help="Número de reamostragens bootstrap (0 desativa)")
+    parser_simulate.add_argument("--confidence", type=float, default=0.95)
+    parser_simulate.add_argument("--output", "-o", help="Arquivo .json (padrão: stdout)")
+    parser_simulate.set_defaults(handler=simulate)
+
+    parser_plot = subcommands.add_parser("plot", help="Gera as visualizações do modelo")
+    parser_plot.add_argument("--output", "-o", help="Arquivo de imagem (padrão: exibe na tela)")
+    parser_plot.set_defaults(handler=plot)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    began = time.perf_counter()
+    summary = args.handler(args)
+    timings = {
+        "command": args.command,
+        "import_ms": round(_import_seconds * 1000, 2),
+        "run_ms": round((time.perf_counter() - began) * 1000, 2),
+        **summary,
+    }
+    print(json.dumps(timings, ensure_ascii=False), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
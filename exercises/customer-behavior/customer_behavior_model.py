@@ -13,11 +13,9 @@ de compra baseadas nas evidências observadas.
 """
 
 import numpy as np
-from typing import Dict, List, Tuple, Optional
+from typing import Callable, Dict, List, NamedTuple, Tuple, Optional
 from dataclasses import dataclass
 from enum import Enum
-import matplotlib.pyplot as plt
-import seaborn as sns
 
 
 class PurchaseHistory(Enum):
@@ -42,6 +40,31 @@ class PromotionInteraction(Enum):
     MANY_CLICKS = "many_clicks"        # 3+ cliques em promoções
 
 
+# Ordem canônica dos códigos inteiros usados pelas APIs vetorizadas:
+# o código de cada categoria é a sua posição na declaração do Enum
+HISTORY_LEVELS = tuple(PurchaseHistory)
+TIME_LEVELS = tuple(TimeOnSite)
+PROMO_LEVELS = tuple(PromotionInteraction)
+CPT_SHAPE = (len(HISTORY_LEVELS), len(TIME_LEVELS), len(PROMO_LEVELS))
+
+
+def _as_codes(codes, size: int, dtype=np.intp, lowest: int = 0, label: str = "Códigos") -> np.ndarray:
+    """
+    Valida códigos inteiros no intervalo [lowest, size - 1] e os converte para dtype.
+    
+    Floats só são aceitos com valores finitos e inteiros, para que a conversão nunca
+    trunque 1.7 em 1 nem transforme NaN em um código arbitrário.
+    """
+    codes = np.asarray(codes)
+    if codes.dtype.kind not in "iu" and not (
+            codes.dtype.kind == "f" and np.isfinite(codes).all()
+            and np.array_equal(codes, np.floor(codes))):
+        raise ValueError(f"{label} devem ser números inteiros")
+    if codes.size and (codes.min() < lowest or codes.max() >= size):
+        raise ValueError(f"{label} fora do intervalo [{lowest}, {size - 1}]")
+    return codes.astype(dtype, copy=False)
+
+
 @dataclass
 class CustomerProfile:
     """Perfil do cliente com suas características observadas"""
@@ -55,6 +78,278 @@ class CustomerProfile:
                 f"Promoções: {self.promotion_interaction.value}")
 
 
+class CustomerProfileView:
+    """
+    Visão de uma linha de CustomerProfileBatch com a mesma interface de CustomerProfile.
+    
+    Guarda apenas a referência ao lote e o índice da linha; os Enums são resolvidos a partir
+    dos códigos sob demanda, então a visão pode ser passada diretamente ao modelo.
+    """
+    __slots__ = ("_batch", "_row")
+    
+    def __init__(self, batch: "CustomerProfileBatch", row: int):
+        self._batch = batch
+        self._row = row
+    
+    @property
+    def purchase_history(self) -> PurchaseHistory:
+        return HISTORY_LEVELS[self._batch.history_codes[self._row]]
+    
+    @property
+    def time_on_site(self) -> TimeOnSite:
+        return TIME_LEVELS[self._batch.time_codes[self._row]]
+    
+    @property
+    def promotion_interaction(self) -> PromotionInteraction:
+        return PROMO_LEVELS[self._batch.promo_codes[self._row]]
+    
+    def to_profile(self) -> CustomerProfile:
+        """Materializa a linha como um CustomerProfile independente do lote"""
+        return CustomerProfile(self.purchase_history, self.time_on_site, self.promotion_interaction)
+    
+    def __eq__(self, other):
+        if isinstance(other, (CustomerProfile, CustomerProfileView)):
+            return (self.purchase_history, self.time_on_site, self.promotion_interaction) == (
+                other.purchase_history, other.time_on_site, other.promotion_interaction)
+        return NotImplemented
+    
+    __hash__ = None
+    
+    def __str__(self):
+        return str(self.to_profile())
+    
+    def __repr__(self):
+        return f"CustomerProfileView(row={self._row}, {self.to_profile()!r})"
+
+
+class CustomerProfileBatch:
+    """
+    Armazenamento colunar compacto de perfis de clientes.
+    
+    Cada variável é um array int8 de códigos (posição em HISTORY_LEVELS, TIME_LEVELS e
+    PROMO_LEVELS), ou seja, 3 bytes por perfil em vez de um objeto CustomerProfile com
+    três Enums. Fatias compartilham memória com o lote original; máscaras e arrays de
+    índices produzem cópias compactas.
+    """
+    __slots__ = ("history_codes", "time_codes", "promo_codes")
+    
+    def __init__(self, history_codes, time_codes, promo_codes):
+        columns = []
+        for codes, size in zip((history_codes, time_codes, promo_codes), CPT_SHAPE):
+            codes = np.asarray(codes)
+            if codes.ndim != 1:
+                raise ValueError("Os códigos devem ser arrays unidimensionais")
+            columns.append(_as_codes(codes, size, dtype=np.int8))
+        if not len(columns[0]) == len(columns[1]) == len(columns[2]):
+            raise ValueError("Os três arrays de códigos devem ter o mesmo tamanho")
+        self.history_codes, self.time_codes, self.promo_codes = columns
+    
+    @classmethod
+    def _from_trusted(cls, history_codes, time_codes, promo_codes) -> "CustomerProfileBatch":
+        """Cria um lote a partir de arrays int8 já validados, sem copiar nem revalidar"""
+        batch = cls.__new__(cls)
+        batch.history_codes = history_codes
+        batch.time_codes = time_codes
+        batch.promo_codes = promo_codes
+        return batch
+    
+    @classmethod
+    def from_records(cls, records) -> "CustomerProfileBatch":
+        """
+        Constrói o lote a partir de registros brutos.
+        
+        Args:
+            records: Iterável de triplas (histórico, tempo, promoção) ou de dicionários com
+                as chaves purchase_history, time_on_site e promotion_interaction. Cada valor
+                pode ser o membro do Enum, o seu valor textual (ex.: "regular") ou o código.
+                
+        Returns:
+            Lote com os registros codificados
+        """
+        lookups = [_code_lookup(levels) for levels in (HISTORY_LEVELS, TIME_LEVELS, PROMO_LEVELS)]
+        fields = ("purchase_history", "time_on_site", "promotion_interaction")
+        columns = ([], [], [])
+        for record in records:
+            if isinstance(record, dict):
+                record = tuple(record[field] for field in fields)
+            for column, lookup, value in zip(columns, lookups, record):
+                try:
+                    column.append(lookup[value])
+                except KeyError:
+                    raise ValueError(f"Categoria desconhecida: {value!r}") from None
+        return cls._from_trusted(*(np.array(column, dtype=np.int8) for column in columns))
+    
+    @classmethod
+    def from_profiles(cls, profiles) -> "CustomerProfileBatch":
+        """Constrói o lote a partir de objetos CustomerProfile (ou visões de linha)"""
+        return cls.from_records(
+            (p.purchase_history, p.time_on_site, p.promotion_interaction) for p in profiles
+        )
+    
+    def to_profiles(self) -> List[CustomerProfile]:
+        """Converte o lote de volta para uma lista de CustomerProfile"""
+        return [
+            CustomerProfile(HISTORY_LEVELS[h], TIME_LEVELS[t], PROMO_LEVELS[p])
+            for h, t, p in zip(self.history_codes.tolist(), self.time_codes.tolist(),
+                               self.promo_codes.tolist())
+        ]
+    
+    def as_array(self) -> np.ndarray:
+        """Retorna os códigos como um array int8 com formato (n, 3)"""
+        return np.column_stack((self.history_codes, self.time_codes, self.promo_codes))
+    
+    def filter(self, purchase_history: Optional[PurchaseHistory] = None,
+               time_on_site: Optional[TimeOnSite] = None,
+               promotion_interaction: Optional[PromotionInteraction] = None) -> "CustomerProfileBatch":
+        """
+        Seleciona os perfis que possuem as categorias informadas.
+        
+        Returns:
+            Novo lote com as linhas correspondentes
+        """
+        mask = np.ones(len(self), dtype=bool)
+        criteria = zip((self.history_codes, self.time_codes, self.promo_codes),
+                       (HISTORY_LEVELS, TIME_LEVELS, PROMO_LEVELS),
+                       (purchase_history, time_on_site, promotion_interaction))
+        for codes, levels, value in criteria:
+            if value is not None:
+                mask &= codes == levels.index(value)
+        return self[mask]
+    
+    @property
+    def nbytes(self) -> int:
+        """Memória ocupada pelos arrays de códigos, em bytes"""
+        return self.history_codes.nbytes + self.time_codes.nbytes + self.promo_codes.nbytes
+    
+    def __len__(self):
+        return len(self.history_codes)
+    
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            size = len(self)
+            if not -size <= index < size:
+                raise IndexError("Índice fora do lote")
+            return CustomerProfileView(self, int(index) % size)
+        return self._from_trusted(self.history_codes[index], self.time_codes[index],
+                                  self.promo_codes[index])
+    
+    def __iter__(self):
+        for row in range(len(self)):
+            yield CustomerProfileView(self, row)
+    
+    def __repr__(self):
+        return f"CustomerProfileBatch({len(self)} perfis, {self.nbytes} bytes)"
+
+
+def _code_lookup(levels: Tuple[Enum, ...]) -> Dict[object, int]:
+    """Mapeia membros do Enum, seus valores textuais e os próprios códigos para o código"""
+    lookup: Dict[object, int] = {}
+    for code, member in enumerate(levels):
+        lookup[member] = code
+        lookup[member.value] = code
+        lookup[code] = code
+    return lookup
+
+
+# Recomendações por faixa de probabilidade de compra (< 0.3, < 0.6, demais)
+LOW_PROBABILITY_RECOMMENDATIONS = (
+    "Exibir promoções mais atrativas na página inicial",
+    "Enviar email com desconto especial",
+    "Mostrar produtos em destaque",
+    "Implementar pop-up com oferta limitada"
+)
+MEDIUM_PROBABILITY_RECOMMENDATIONS = (
+    "Mostrar produtos relacionados ao histórico",
+    "Exibir avaliações de outros clientes",
+    "Oferecer frete grátis",
+    "Sugerir produtos complementares"
+)
+HIGH_PROBABILITY_RECOMMENDATIONS = (
+    "Facilitar o processo de checkout",
+    "Mostrar produtos premium",
+    "Oferecer programa de fidelidade",
+    "Exibir produtos em estoque limitado"
+)
+
+
+class _CPTTable(dict):
+    """Dicionário de CPT que avisa o modelo dono sempre que é modificado"""
+    __slots__ = ("_on_change",)
+    
+    def __init__(self, data, on_change: Callable[[], None]):
+        super().__init__(data)
+        self._on_change = on_change
+    
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._on_change()
+    
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._on_change()
+    
+    def __ior__(self, other):
+        super().update(other)
+        self._on_change()
+        return self
+    
+    def clear(self):
+        super().clear()
+        self._on_change()
+    
+    def pop(self, *args):
+        value = super().pop(*args)
+        self._on_change()
+        return value
+    
+    def popitem(self):
+        item = super().popitem()
+        self._on_change()
+        return item
+    
+    def setdefault(self, key, default=None):
+        value = super().setdefault(key, default)
+        self._on_change()
+        return value
+    
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._on_change()
+    
+    def __reduce__(self):
+        # Serializa como dict comum; o modelo volta a envolver a tabela em __setstate__
+        return dict, (dict(self),)
+
+
+def _cpt_property(name: str) -> property:
+    """Propriedade que guarda a tabela como _CPTTable e invalida o cache a cada atribuição"""
+    attribute = "_" + name
+    
+    def getter(self):
+        return getattr(self, attribute)
+    
+    def setter(self, table):
+        setattr(self, attribute, _CPTTable(table, self._invalidate_cache))
+        self._invalidate_cache()
+    
+    return property(getter, setter)
+
+
+class CacheInfo(NamedTuple):
+    """Contadores do cache de perfis do modelo"""
+    hits: int
+    misses: int
+    version: int
+
+
+@dataclass
+class _ProfileCache:
+    """Resultados pré-calculados para os 36 perfis, válidos para uma versão das CPTs"""
+    tensor: np.ndarray
+    entries: Dict[Tuple[PurchaseHistory, TimeOnSite, PromotionInteraction], Tuple[float, str, Tuple[str, ...]]]
+    segments: Dict[str, List[Tuple[CustomerProfile, float]]]
+
+
 class CustomerBehaviorModel:
     """
     Modelo probabilístico para análise de comportamento de clientes.
@@ -63,12 +358,78 @@ class CustomerBehaviorModel:
     - Histórico de compras é uma variável independente
     - Tempo no site e interação com promoções são influenciados pelo histórico
     - A probabilidade de compra é influenciada por todas as três variáveis
+    
+    Probabilidade, segmento e recomendações de cada um dos 36 perfis são calculados uma
+    única vez e guardados em cache. Qualquer modificação nas tabelas p_* (atribuição ou
+    alteração do dicionário) incrementa cpt_version e descarta o cache.
     """
     
+    p_purchase_history = _cpt_property("p_purchase_history")
+    p_time_given_history = _cpt_property("p_time_given_history")
+    p_promo_given_history = _cpt_property("p_promo_given_history")
+    p_purchase_given_all = _cpt_property("p_purchase_given_all")
+    
     def __init__(self):
         """Inicializa o modelo com probabilidades baseadas em dados históricos"""
+        self.cpt_version = 0
+        self._cache: Optional[_ProfileCache] = None
+        self._cache_hits = 0
+        self._cache_misses = 0
         self._initialize_probabilities()
     
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_cache"] = None
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        for name in ("p_purchase_history", "p_time_given_history",
+                     "p_promo_given_history", "p_purchase_given_all"):
+            setattr(self, name, state["_" + name])
+    
+    def _invalidate_cache(self):
+        """Descarta os resultados em cache após uma modificação nas CPTs"""
+        self.cpt_version += 1
+        self._cache = None
+    
+    def _profile_cache(self) -> _ProfileCache:
+        """Retorna o cache de perfis da versão atual das CPTs, recalculando se necessário"""
+        cache = self._cache
+        if cache is not None:
+            self._cache_hits += 1
+            return cache
+        
+        self._cache_misses += 1
+        tensor = self.build_purchase_tensor()
+        tensor.flags.writeable = False
+        entries = {}
+        segments: Dict[str, List[Tuple[CustomerProfile, float]]] = {
+            "Alto Potencial": [],
+            "Médio Potencial": [],
+            "Baixo Potencial": []
+        }
+        for i, history in enumerate(HISTORY_LEVELS):
+            for j, time in enumerate(TIME_LEVELS):
+                for k, promo in enumerate(PROMO_LEVELS):
+                    probability = float(tensor[i, j, k])
+                    segment = self._segment_for(probability)
+                    entries[(history, time, promo)] = (
+                        probability, segment, self._recommendations_for(probability))
+                    segments[segment].append((CustomerProfile(history, time, promo), probability))
+        
+        # Ordena por probabilidade decrescente
+        for segment in segments:
+            segments[segment].sort(key=lambda x: x[1], reverse=True)
+        
+        cache = _ProfileCache(tensor=tensor, entries=entries, segments=segments)
+        self._cache = cache
+        return cache
+    
+    def cache_info(self) -> CacheInfo:
+        """Retorna os acertos e falhas do cache de perfis e a versão atual das CPTs"""
+        return CacheInfo(self._cache_hits, self._cache_misses, self.cpt_version)
+    
     def _initialize_probabilities(self):
         """Inicializa as probabilidades condicionais baseadas em dados típicos de e-commerce"""
         
@@ -162,6 +523,68 @@ class CustomerBehaviorModel:
             (PurchaseHistory.FREQUENT, TimeOnSite.LONG, PromotionInteraction.MANY_CLICKS): 0.95
         }
     
+    def update_probabilities(self, p_purchase_history: Optional[Dict] = None,
+                             p_time_given_history: Optional[Dict] = None,
+                             p_promo_given_history: Optional[Dict] = None,
+                             p_purchase_given_all: Optional[Dict] = None,
+                             tolerance: float = 1e-6):
+        """
+        Substitui as tabelas de probabilidade informadas de uma só vez.
+        
+        Todas as tabelas são validadas antes de qualquer substituição, então uma tabela
+        inválida nunca deixa o modelo com parte das CPTs antigas e parte das novas. As
+        tabelas omitidas são mantidas.
+        
+        Args:
+            p_purchase_history: Distribuição a priori do histórico
+            p_time_given_history: P(Tempo | Histórico), chaves (histórico, tempo)
+            p_promo_given_history: P(Promoção | Histórico), chaves (histórico, promoção)
+            p_purchase_given_all: P(Compra | Histórico, Tempo, Promoção); combinações ausentes
+                usam o fallback bayesiano
+            tolerance: Tolerância para a soma das distribuições
+            
+        Raises:
+            ValueError: Se alguma tabela tiver chaves inválidas, probabilidades fora de [0, 1]
+                ou distribuições que não somam 1
+        """
+        def check_range(name, table):
+            if not all(0.0 <= value <= 1.0 for value in table.values()):
+                raise ValueError(f"{name}: probabilidades devem estar em [0, 1]")
+        
+        if p_purchase_history is not None:
+            check_range("p_purchase_history", p_purchase_history)
+            if set(p_purchase_history) != set(HISTORY_LEVELS):
+                raise ValueError("p_purchase_history deve ter uma entrada por PurchaseHistory")
+            if abs(sum(p_purchase_history.values()) - 1.0) > tolerance:
+                raise ValueError("p_purchase_history deve somar 1")
+        
+        for name, table, levels in (("p_time_given_history", p_time_given_history, TIME_LEVELS),
+                                    ("p_promo_given_history", p_promo_given_history, PROMO_LEVELS)):
+            if table is None:
+                continue
+            check_range(name, table)
+            if set(table) != {(h, level) for h in HISTORY_LEVELS for level in levels}:
+                raise ValueError(f"{name} deve ter uma entrada por combinação (histórico, categoria)")
+            for history in HISTORY_LEVELS:
+                if abs(sum(table[(history, level)] for level in levels) - 1.0) > tolerance:
+                    raise ValueError(f"{name}: distribuição de {history.value} deve somar 1")
+        
+        if p_purchase_given_all is not None:
+            check_range("p_purchase_given_all", p_purchase_given_all)
+            valid_keys = {(h, t, p) for h in HISTORY_LEVELS for t in TIME_LEVELS for p in PROMO_LEVELS}
+            if not set(p_purchase_given_all) <= valid_keys:
+                raise ValueError("p_purchase_given_all contém chaves inválidas")
+        
+        # Validação concluída: troca as referências sem modificar os dicionários antigos
+        if p_purchase_history is not None:
+            self.p_purchase_history = p_purchase_history
+        if p_time_given_history is not None:
+            self.p_time_given_history = p_time_given_history
+        if p_promo_given_history is not None:
+            self.p_promo_given_history = p_promo_given_history
+        if p_purchase_given_all is not None:
+            self.p_purchase_given_all = p_purchase_given_all
+    
     def calculate_purchase_probability(self, customer: CustomerProfile) -> float:
         """
         Calcula a probabilidade de compra para um cliente específico usando o teorema de Bayes.
@@ -172,14 +595,69 @@ class CustomerBehaviorModel:
         Returns:
             Probabilidade de compra (0.0 a 1.0)
         """
-        # Busca a probabilidade direta na tabela de probabilidades condicionais
+        # Consulta o cache de perfis, calculado a partir de build_purchase_tensor
         key = (customer.purchase_history, customer.time_on_site, customer.promotion_interaction)
+        return self._profile_cache().entries[key][0]
+    
+    def build_purchase_tensor(self) -> np.ndarray:
+        """
+        Constrói a tabela P(Compra | Histórico, Tempo, Promoção) como um tensor denso 4x3x3.
         
-        if key in self.p_purchase_given_all:
-            return self.p_purchase_given_all[key]
-        else:
-            # Fallback: calcula usando Bayes se a combinação não estiver na tabela
-            return self._calculate_bayesian_probability(customer)
+        Os eixos seguem HISTORY_LEVELS, TIME_LEVELS e PROMO_LEVELS. Combinações ausentes de
+        p_purchase_given_all são preenchidas com o mesmo fallback bayesiano do caminho escalar,
+        de modo que indexar o tensor reproduz exatamente calculate_purchase_probability.
+        
+        Returns:
+            Array float64 com formato CPT_SHAPE
+        """
+        tensor = np.empty(CPT_SHAPE, dtype=np.float64)
+        for i, history in enumerate(HISTORY_LEVELS):
+            for j, time in enumerate(TIME_LEVELS):
+                for k, promo in enumerate(PROMO_LEVELS):
+                    # Busca a probabilidade direta na tabela de probabilidades condicionais
+                    key = (history, time, promo)
+                    if key in self.p_purchase_given_all:
+                        tensor[i, j, k] = self.p_purchase_given_all[key]
+                    else:
+                        # Fallback: calcula usando Bayes se a combinação não estiver na tabela
+                        tensor[i, j, k] = self._calculate_bayesian_probability(CustomerProfile(*key))
+        return tensor
+    
+    def calculate_purchase_probability_batch(self, history_codes, time_codes=None,
+                                             promo_codes=None) -> np.ndarray:
+        """
+        Calcula a probabilidade de compra para muitos clientes de uma só vez.
+        
+        Cada cliente é representado por códigos inteiros (posição da categoria em
+        HISTORY_LEVELS, TIME_LEVELS e PROMO_LEVELS), e a probabilidade é obtida por
+        indexação direta no tensor de build_purchase_tensor, sem criar objetos por linha.
+        
+        Args:
+            history_codes: Códigos de histórico, um CustomerProfileBatch, ou um lote colunar
+                com formato (n, 3) quando time_codes e promo_codes são omitidos
+            time_codes: Códigos de tempo no site
+            promo_codes: Códigos de interação com promoções
+            
+        Returns:
+            Array float64 com a probabilidade de compra de cada cliente
+        """
+        if isinstance(history_codes, CustomerProfileBatch):
+            history_codes, time_codes, promo_codes = (
+                history_codes.history_codes, history_codes.time_codes, history_codes.promo_codes)
+        elif time_codes is None and promo_codes is None:
+            batch = np.asarray(history_codes)
+            if batch.ndim != 2 or batch.shape[1] != 3:
+                raise ValueError("Lote colunar deve ter formato (n, 3): histórico, tempo, promoção")
+            history_codes, time_codes, promo_codes = batch[:, 0], batch[:, 1], batch[:, 2]
+        elif time_codes is None or promo_codes is None:
+            raise ValueError("Informe os três arrays de códigos ou um único lote (n, 3)")
+        
+        columns = [_as_codes(codes, size)
+                   for codes, size in zip((history_codes, time_codes, promo_codes), CPT_SHAPE)]
+        
+        # Índice plano h*9 + t*3 + p: um único take() sobre o tensor achatado
+        flat_index = np.ravel_multi_index(columns, CPT_SHAPE)
+        return self._profile_cache().tensor.ravel().take(flat_index)
     
     def _calculate_bayesian_probability(self, customer: CustomerProfile) -> float:
         """
@@ -220,134 +698,352 @@ class CustomerBehaviorModel:
         else:
             return p_purchase_given_history
     
+    @staticmethod
+    def _segment_for(probability: float) -> str:
+        """Classifica uma probabilidade de compra em um segmento de potencial"""
+        if probability >= 0.7:
+            return "Alto Potencial"
+        elif probability >= 0.4:
+            return "Médio Potencial"
+        else:
+            return "Baixo Potencial"
+    
+    @staticmethod
+    def _recommendations_for(probability: float) -> Tuple[str, ...]:
+        """Seleciona a faixa de recomendações correspondente a uma probabilidade de compra"""
+        if probability < 0.3:
+            return LOW_PROBABILITY_RECOMMENDATIONS
+        elif probability < 0.6:
+            return MEDIUM_PROBABILITY_RECOMMENDATIONS
+        else:
+            return HIGH_PROBABILITY_RECOMMENDATIONS
+    
     def analyze_customer_segments(self) -> Dict[str, List[Tuple[CustomerProfile, float]]]:
         """
         Analisa diferentes segmentos de clientes e suas probabilidades de compra.
         
         Returns:
-            Dicionário com segmentos de clientes e suas probabilidades
+            Dicionário com segmentos de clientes e suas probabilidades, ordenados por
+            probabilidade decrescente (cópias das listas em cache)
         """
-        segments = {
-            "Alto Potencial": [],
-            "Médio Potencial": [],
-            "Baixo Potencial": []
-        }
-        
-        # Gera todas as combinações possíveis
-        for history in PurchaseHistory:
-            for time in TimeOnSite:
-                for promo in PromotionInteraction:
-                    customer = CustomerProfile(history, time, promo)
-                    probability = self.calculate_purchase_probability(customer)
-                    
-                    if probability >= 0.7:
-                        segments["Alto Potencial"].append((customer, probability))
-                    elif probability >= 0.4:
-                        segments["Médio Potencial"].append((customer, probability))
-                    else:
-                        segments["Baixo Potencial"].append((customer, probability))
-        
-        # Ordena por probabilidade decrescente
-        for segment in segments:
-            segments[segment].sort(key=lambda x: x[1], reverse=True)
-        
-        return segments
+        segments = self._profile_cache().segments
+        return {name: list(profiles) for name, profiles in segments.items()}
+    
+    def get_customer_segment(self, customer: CustomerProfile) -> str:
+        """Retorna o segmento de potencial do cliente a partir do cache de perfis"""
+        key = (customer.purchase_history, customer.time_on_site, customer.promotion_interaction)
+        return self._profile_cache().entries[key][1]
     
-    def get_recommendations(self, customer: CustomerProfile) -> List[str]:
+    def get_recommendations(self, customer: CustomerProfile) -> Tuple[str, ...]:
         """
         Gera recomendações baseadas no perfil do cliente.
         
+        A consulta é O(1) no cache de perfis e devolve uma tupla compartilhada, sem alocar
+        uma nova lista a cada chamada.
+        
         Args:
             customer: Perfil do cliente
             
         Returns:
-            Lista de recomendações personalizadas
+            Tupla de recomendações personalizadas
         """
-        probability = self.calculate_purchase_probability(customer)
-        recommendations = []
-        
-        if probability < 0.3:
-            recommendations.extend([
-                "Exibir promoções mais atrativas na página inicial",
-                "Enviar email com desconto especial",
-                "Mostrar produtos em destaque",
-                "Implementar pop-up com oferta limitada"
-            ])
-        elif probability < 0.6:
-            recommendations.extend([
-                "Mostrar produtos relacionados ao histórico",
-                "Exibir avaliações de outros clientes",
-                "Oferecer frete grátis",
-                "Sugerir produtos complementares"
-            ])
-        else:
-            recommendations.extend([
-                "Facilitar o processo de checkout",
-                "Mostrar produtos premium",
-                "Oferecer programa de fidelidade",
-                "Exibir produtos em estoque limitado"
-            ])
-        
-        return recommendations
+        key = (customer.purchase_history, customer.time_on_site, customer.promotion_interaction)
+        return self._profile_cache().entries[key][2]
     
-    def simulate_customer_scenarios(self, num_scenarios: int = 100) -> Dict[str, float]:
+    def simulate_customer_scenarios(self, num_scenarios: int = 100, seed=None,
+                                    chunk_size: int = 1_000_000,
+                                    bootstrap_samples: int = 0,
+                                    confidence: float = 0.95) -> Dict[str, float]:
         """
         Simula cenários de clientes para análise estatística.
         
+        Os códigos de histórico, tempo e promoção são sorteados em blocos de até chunk_size
+        cenários por um numpy.random.Generator e pontuados por indexação no tensor de CPT.
+        Como só existem 36 perfis distintos, cada bloco é reduzido a um contador por perfil,
+        e todas as estatísticas (inclusive mediana e percentis) saem exatas desses contadores:
+        a memória fica limitada a um bloco, independentemente de num_scenarios.
+        
         Args:
             num_scenarios: Número de cenários para simular
+            seed: Semente ou numpy.random.Generator para reprodutibilidade
+            chunk_size: Número máximo de cenários sorteados por bloco
+            bootstrap_samples: Número de reamostragens bootstrap (0 desativa os intervalos)
+            confidence: Nível de confiança dos intervalos bootstrap
             
         Returns:
-            Estatísticas dos cenários simulados
+            Estatísticas dos cenários simulados, mais os intervalos de confiança da média e
+            da mediana quando bootstrap_samples > 0
         """
-        probabilities = []
-        
-        for _ in range(num_scenarios):
-            # Seleciona aleatoriamente um perfil de cliente
-            history = np.random.choice(list(PurchaseHistory), 
-                                    p=list(self.p_purchase_history.values()))
-            time = np.random.choice(list(TimeOnSite))
-            promo = np.random.choice(list(PromotionInteraction))
-            
-            customer = CustomerProfile(history, time, promo)
-            prob = self.calculate_purchase_probability(customer)
-            probabilities.append(prob)
-        
-        return {
-            "média": np.mean(probabilities),
-            "mediana": np.median(probabilities),
-            "desvio_padrão": np.std(probabilities),
-            "mínimo": np.min(probabilities),
-            "máximo": np.max(probabilities),
-            "percentil_25": np.percentile(probabilities, 25),
-            "percentil_75": np.percentile(probabilities, 75)
+        if num_scenarios <= 0:
+            raise ValueError("num_scenarios deve ser positivo")
+        if chunk_size <= 0:
+            raise ValueError("chunk_size deve ser positivo")
+        
+        rng = np.random.default_rng(seed)
+        history_weights = np.array([self.p_purchase_history[h] for h in HISTORY_LEVELS])
+        counts = np.zeros(int(np.prod(CPT_SHAPE)), dtype=np.int64)
+        
+        remaining = num_scenarios
+        while remaining > 0:
+            size = min(chunk_size, remaining)
+            # Histórico segue a distribuição a priori; tempo e promoção são uniformes
+            history = rng.choice(len(HISTORY_LEVELS), size=size, p=history_weights)
+            time = rng.integers(0, len(TIME_LEVELS), size=size)
+            promo = rng.integers(0, len(PROMO_LEVELS), size=size)
+            flat_index = np.ravel_multi_index((history, time, promo), CPT_SHAPE)
+            counts += np.bincount(flat_index, minlength=counts.size)
+            remaining -= size
+        
+        # Ordena os perfis pela probabilidade para tratar os contadores como amostra ordenada
+        cell_probabilities = self.build_purchase_tensor().ravel()
+        order = np.argsort(cell_probabilities, kind="stable")
+        values = cell_probabilities[order]
+        counts = counts[order]
+        
+        mean = float(values @ counts / num_scenarios)
+        variance = float(((values - mean) ** 2) @ counts / num_scenarios)
+        observed = values[counts > 0]
+        stats = {
+            "média": mean,
+            "mediana": float(_percentile_from_counts(values, counts, 50)[0]),
+            "desvio_padrão": float(np.sqrt(variance)),
+            "mínimo": float(observed[0]),
+            "máximo": float(observed[-1]),
+            "percentil_25": float(_percentile_from_counts(values, counts, 25)[0]),
+            "percentil_75": float(_percentile_from_counts(values, counts, 75)[0])
         }
+        
+        if bootstrap_samples > 0:
+            # Reamostrar n cenários com reposição equivale a uma multinomial sobre os perfis
+            resampled = rng.multinomial(num_scenarios, counts / num_scenarios,
+                                        size=bootstrap_samples)
+            tail = (1.0 - confidence) / 2 * 100
+            boot_means = resampled @ values / num_scenarios
+            boot_medians = _percentile_from_counts(values, resampled, 50)
+            stats["ic_média_inferior"], stats["ic_média_superior"] = (
+                float(v) for v in np.percentile(boot_means, [tail, 100 - tail]))
+            stats["ic_mediana_inferior"], stats["ic_mediana_superior"] = (
+                float(v) for v in np.percentile(boot_medians, [tail, 100 - tail]))
+        
+        return stats
 
 
-def create_visualization(model: CustomerBehaviorModel):
+def _percentile_from_counts(values: np.ndarray, counts: np.ndarray, q: float) -> np.ndarray:
+    """
+    Calcula percentis de amostras resumidas em contagens por valor.
+    
+    Reproduz a interpolação linear de np.percentile sem expandir a amostra.
+    
+    Args:
+        values: Valores possíveis em ordem crescente, formato (k,)
+        counts: Contagens de cada valor, formato (k,) ou (m, k) para m amostras
+        q: Percentil desejado (0 a 100)
+        
+    Returns:
+        Array com o percentil de cada amostra
+    """
+    counts = np.atleast_2d(counts)
+    n = counts.sum(axis=1)
+    cumulative = np.cumsum(counts, axis=1)
+    position = q / 100.0 * (n - 1)
+    lower = np.floor(position).astype(np.int64)
+    upper = np.minimum(lower + 1, n - 1)
+    fraction = position - lower
+    # O elemento de posição r é o da primeira célula cuja contagem acumulada excede r
+    lower_value = values[(cumulative <= lower[:, None]).sum(axis=1)]
+    upper_value = values[(cumulative <= upper[:, None]).sum(axis=1)]
+    return lower_value + (upper_value - lower_value) * fraction
+
+
+class CustomerInferenceEngine:
+    """
+    Inferência exata com evidência parcial sobre a rede bayesiana do modelo.
+    
+    A distribuição conjunta P(Histórico, Tempo, Promoção, Compra) é calculada uma única vez
+    como um tensor 4x3x3x2 a partir das CPTs do modelo. Qualquer consulta marginal ou
+    condicional é respondida somando os eixos não observados e normalizando; cada redução
+    é guardada em cache pelo conjunto de variáveis consultadas e observadas.
+    
+    As variáveis são identificadas pelos nomes em VARIABLES. A variável "purchase" tem
+    dois estados: 0 (não compra) e 1 (compra). O motor acompanha cpt_version e recalcula
+    a distribuição conjunta quando as CPTs do modelo são modificadas.
+    """
+    VARIABLES = ("purchase_history", "time_on_site", "promotion_interaction", "purchase")
+    
+    def __init__(self, model: CustomerBehaviorModel):
+        self.model = model
+        self.cardinalities = CPT_SHAPE + (2,)
+        self._lookups = [_code_lookup(levels) for levels in (HISTORY_LEVELS, TIME_LEVELS, PROMO_LEVELS)]
+        self._lookups.append({False: 0, True: 1})
+        self.refresh()
+    
+    def refresh(self):
+        """Recalcula a distribuição conjunta a partir das CPTs atuais do modelo"""
+        model = self.model
+        p_history = np.array([model.p_purchase_history[h] for h in HISTORY_LEVELS])
+        p_time = np.array([[model.p_time_given_history[(h, t)] for t in TIME_LEVELS]
+                           for h in HISTORY_LEVELS])
+        p_promo = np.array([[model.p_promo_given_history[(h, p)] for p in PROMO_LEVELS]
+                            for h in HISTORY_LEVELS])
+        p_purchase = model.build_purchase_tensor()
+        self._version = model.cpt_version
+        
+        # Tempo e promoção são condicionalmente independentes dado o histórico
+        evidence = p_history[:, None, None] * p_time[:, :, None] * p_promo[:, None, :]
+        self.joint = np.stack((evidence * (1.0 - p_purchase), evidence * p_purchase), axis=-1)
+        self._conditionals: Dict[Tuple[Tuple[int, ...], Tuple[int, ...]], np.ndarray] = {}
+        self._batch_tables: Dict[int, np.ndarray] = {}
+    
+    def _ensure_current(self):
+        """Recalcula a distribuição conjunta se as CPTs do modelo mudaram"""
+        if self._version != self.model.cpt_version:
+            self.refresh()
+    
+    def _axis(self, variable: str) -> int:
+        try:
+            return self.VARIABLES.index(variable)
+        except ValueError:
+            raise ValueError(f"Variável desconhecida: {variable!r}. Use uma de {self.VARIABLES}") from None
+    
+    def _code(self, axis: int, value) -> int:
+        try:
+            return self._lookups[axis][value]
+        except KeyError:
+            raise ValueError(f"Valor inválido para {self.VARIABLES[axis]}: {value!r}") from None
+    
+    def _conditional(self, target_axes: Tuple[int, ...], evidence_axes: Tuple[int, ...]) -> np.ndarray:
+        """
+        Tabela P(alvos | evidências) com eixos na ordem evidence_axes + target_axes.
+        
+        Combinações de evidência com probabilidade zero resultam em NaN.
+        """
+        self._ensure_current()
+        key = (target_axes, evidence_axes)
+        table = self._conditionals.get(key)
+        if table is None:
+            kept = evidence_axes + target_axes
+            summed = tuple(axis for axis in range(self.joint.ndim) if axis not in kept)
+            marginal = self.joint.sum(axis=summed)
+            # Após a soma os eixos restantes ficam em ordem crescente; reordena para "kept"
+            marginal = np.transpose(marginal, np.argsort(np.argsort(kept)))
+            totals = marginal.sum(axis=tuple(range(len(evidence_axes), len(kept))), keepdims=True)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                table = marginal / totals
+            self._conditionals[key] = table
+        return table
+    
+    def query(self, target, evidence: Optional[Dict[str, object]] = None) -> np.ndarray:
+        """
+        Calcula a distribuição das variáveis alvo dada uma evidência parcial.
+        
+        Exemplos:
+            query("purchase", {"purchase_history": PurchaseHistory.REGULAR})
+            query("purchase_history", {"purchase": True, "promotion_interaction": "many_clicks"})
+        
+        Args:
+            target: Nome de uma variável ou tupla de nomes
+            evidence: Valores observados (membros dos Enums, valores textuais, códigos ou,
+                para "purchase", booleanos)
+                
+        Returns:
+            Array com a distribuição conjunta dos alvos, um eixo por alvo na ordem pedida
+            
+        Raises:
+            ValueError: Se a evidência tiver probabilidade zero ou uma variável for repetida
+        """
+        targets = (target,) if isinstance(target, str) else tuple(target)
+        target_axes = tuple(self._axis(name) for name in targets)
+        evidence = evidence or {}
+        evidence_axes = tuple(self._axis(name) for name in evidence)
+        if len(set(target_axes + evidence_axes)) != len(target_axes) + len(evidence_axes):
+            raise ValueError("Cada variável deve aparecer uma única vez entre alvos e evidências")
+        
+        codes = tuple(self._code(axis, value) for axis, value in zip(evidence_axes, evidence.values()))
+        # Indexação básica devolve uma visão da tabela em cache: copia antes de devolver
+        distribution = self._conditional(target_axes, evidence_axes)[codes].copy()
+        if np.isnan(distribution).any():
+            raise ValueError("A evidência informada tem probabilidade zero")
+        return distribution
+    
+    def purchase_probability(self, **evidence) -> float:
+        """
+        Probabilidade de compra dada uma evidência parcial por nome de variável.
+        
+        Exemplo: purchase_probability(purchase_history=PurchaseHistory.REGULAR)
+        """
+        return float(self.query("purchase", evidence)[1])
+    
+    def query_batch(self, target: str, **evidence) -> np.ndarray:
+        """
+        Distribuição de uma variável alvo para muitas linhas de evidência parcial.
+        
+        Cada evidência é um array de códigos em que -1 indica valor desconhecido; variáveis
+        omitidas são tratadas como desconhecidas em todas as linhas. A consulta é resolvida
+        por indexação em um tensor em que cada eixo de evidência ganha uma posição extra
+        contendo a soma sobre aquele eixo.
+        
+        Exemplo: query_batch("purchase", purchase_history=h, time_on_site=t_ou_menos_um)
+        
+        Args:
+            target: Nome da variável alvo
+            evidence: Arrays de códigos das demais variáveis (-1 = desconhecido)
+            
+        Returns:
+            Array (n, cardinalidade do alvo); linhas com evidência impossível contêm NaN
+        """
+        axis = self._axis(target)
+        self._ensure_current()
+        table = self._batch_tables.get(axis)
+        if table is None:
+            padded = self.joint
+            for other in range(padded.ndim):
+                if other != axis:
+                    padded = np.concatenate((padded, padded.sum(axis=other, keepdims=True)), axis=other)
+            padded = np.moveaxis(padded, axis, -1)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                table = padded / padded.sum(axis=-1, keepdims=True)
+            self._batch_tables[axis] = table
+        
+        index = []
+        for other in range(self.joint.ndim):
+            if other == axis:
+                continue
+            name = self.VARIABLES[other]
+            codes = _as_codes(evidence.pop(name, -1), self.cardinalities[other], lowest=-1,
+                              label=f"Códigos de {name}")
+            # -1 seleciona a última posição do eixo, que guarda a soma (valor desconhecido)
+            index.append(codes)
+        if evidence:
+            raise ValueError(f"Variáveis inválidas na evidência: {sorted(evidence)}")
+        return table[tuple(index)]
+
+
+def create_visualization(model: CustomerBehaviorModel, output_path: Optional[str] = None):
     """
     Cria visualizações do modelo de comportamento de clientes.
     
+    matplotlib e seaborn são importados apenas aqui, para que o uso do modelo sem gráficos
+    (pontuação em lote, servidor, CLI) não pague o custo de importá-los.
+    
     Args:
         model: Instância do modelo de comportamento
+        output_path: Se informado, salva a figura nesse arquivo em vez de exibi-la
     """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    
     # Configuração do estilo
     plt.style.use('seaborn-v0_8')
     fig, axes = plt.subplots(2, 2, figsize=(15, 12))
     fig.suptitle('Análise de Comportamento de Clientes - Modelo Probabilístico', 
                  fontsize=16, fontweight='bold')
     
+    # Probabilidades dos 36 perfis, calculadas uma única vez no cache do modelo
+    tensor = model._profile_cache().tensor
+    
     # 1. Distribuição de probabilidades por histórico
     histories = list(PurchaseHistory)
-    avg_probs = []
-    
-    for history in histories:
-        probs = []
-        for time in TimeOnSite:
-            for promo in PromotionInteraction:
-                customer = CustomerProfile(history, time, promo)
-                probs.append(model.calculate_purchase_probability(customer))
-        avg_probs.append(np.mean(probs))
+    avg_probs = tensor.mean(axis=(1, 2))
     
     axes[0, 0].bar([h.value for h in histories], avg_probs, 
                    color=['#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4'])
@@ -356,27 +1052,18 @@ def create_visualization(model: CustomerBehaviorModel):
     axes[0, 0].tick_params(axis='x', rotation=45)
     
     # 2. Heatmap de probabilidades
-    heatmap_data = np.zeros((len(TimeOnSite), len(PromotionInteraction)))
     time_labels = [t.value for t in TimeOnSite]
     promo_labels = [p.value for p in PromotionInteraction]
     
-    for i, time in enumerate(TimeOnSite):
-        for j, promo in enumerate(PromotionInteraction):
-            # Usa cliente regular como exemplo
-            customer = CustomerProfile(PurchaseHistory.REGULAR, time, promo)
-            heatmap_data[i, j] = model.calculate_purchase_probability(customer)
+    # Usa cliente regular como exemplo
+    heatmap_data = tensor[HISTORY_LEVELS.index(PurchaseHistory.REGULAR)]
     
     sns.heatmap(heatmap_data, annot=True, fmt='.2f', cmap='YlOrRd',
                 xticklabels=promo_labels, yticklabels=time_labels, ax=axes[0, 1])
     axes[0, 1].set_title('Probabilidades: Tempo vs Interação com Promoções\n(Cliente Regular)')
     
     # 3. Distribuição de probabilidades
-    all_probs = []
-    for history in PurchaseHistory:
-        for time in TimeOnSite:
-            for promo in PromotionInteraction:
-                customer = CustomerProfile(history, time, promo)
-                all_probs.append(model.calculate_purchase_probability(customer))
+    all_probs = tensor.ravel()
     
     axes[1, 0].hist(all_probs, bins=20, alpha=0.7, color='skyblue', edgecolor='black')
     axes[1, 0].axvline(np.mean(all_probs), color='red', linestyle='--', 
@@ -397,7 +1084,11 @@ def create_visualization(model: CustomerBehaviorModel):
     axes[1, 1].set_title('Distribuição de Segmentos de Clientes')
     
     plt.tight_layout()
-    plt.show()
+    if output_path:
+        fig.savefig(output_path)
+        plt.close(fig)
+    else:
+        plt.show()
 
 
 def main():
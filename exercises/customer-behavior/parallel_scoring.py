@@ -0,0 +1,175 @@
+"""
+Pontuação Paralela com Memória Compartilhada
+============================================
+
+Este módulo distribui a pontuação vetorizada do CustomerBehaviorModel entre vários
+processos. O tensor de CPT, os códigos de entrada e o array de saída ficam em blocos de
+multiprocessing.shared_memory: cada processo do pool se conecta a eles uma única vez e
+recebe apenas os limites (início, fim) de cada fatia, então nenhum array é serializado.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from multiprocessing import shared_memory
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from customer_behavior_model import CPT_SHAPE, CustomerBehaviorModel, CustomerProfileBatch
+
+
+# Arrays compartilhados do processo trabalhador, preenchidos por _attach_worker
+_worker_state: Dict[str, object] = {}
+
+
+@dataclass
+class WorkerStats:
+    """Linhas e tempo de processamento acumulados por um processo"""
+    rows: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+
+@dataclass
+class ParallelReport:
+    """Resumo de uma execução de score_parallel"""
+    rows: int
+    workers: int
+    shards: int
+    seconds: float
+    per_worker: Dict[int, WorkerStats] = field(default_factory=dict)
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self):
+        lines = [f"{self.rows} linhas, {self.shards} fatias, {self.workers} processos: "
+                 f"{self.seconds:.3f}s ({self.rows_per_second:,.0f} linhas/s)"]
+        for pid, stats in sorted(self.per_worker.items()):
+            lines.append(f"  processo {pid}: {stats.rows} linhas, "
+                         f"{stats.rows_per_second:,.0f} linhas/s")
+        return "\n".join(lines)
+
+
+def _attach_worker(names: Tuple[str, str, str], rows: int):
+    """Inicializador do pool: conecta o processo aos blocos de memória compartilhada"""
+    blocks = [shared_memory.SharedMemory(name=name) for name in names]
+    _worker_state["blocks"] = blocks
+    _worker_state["tensor"] = np.ndarray(int(np.prod(CPT_SHAPE)), dtype=np.float64,
+                                         buffer=blocks[0].buf)
+    _worker_state["codes"] = np.ndarray((3, rows), dtype=np.int8, buffer=blocks[1].buf)
+    _worker_state["output"] = np.ndarray(rows, dtype=np.float64, buffer=blocks[2].buf)
+
+
+def _score_shard(start: int, stop: int) -> Tuple[int, int, float]:
+    """Pontua as linhas [start, stop) e grava o resultado no array de saída compartilhado"""
+    began = time.perf_counter()
+    codes = _worker_state["codes"][:, start:stop]  # já validados por score_parallel
+    flat_index = np.ravel_multi_index(codes.astype(np.intp), CPT_SHAPE)
+    _worker_state["tensor"].take(flat_index, out=_worker_state["output"][start:stop])
+    return os.getpid(), stop - start, time.perf_counter() - began
+
+
+def score_parallel(model: CustomerBehaviorModel, history_codes, time_codes=None, promo_codes=None,
+                   workers: Optional[int] = None,
+                   shard_size: int = 1_000_000) -> Tuple[np.ndarray, ParallelReport]:
+    """
+    Calcula probabilidades de compra em paralelo, em fatias de até shard_size linhas.
+
+    Aceita as mesmas entradas que CustomerBehaviorModel.calculate_purchase_probability_batch
+    (três arrays de códigos, um CustomerProfileBatch ou um lote (n, 3)) e produz
+    exatamente o mesmo resultado.
+
+    Args:
+        model: Modelo cujas CPTs serão usadas
+        history_codes: Códigos de histórico, um CustomerProfileBatch ou um lote (n, 3)
+        time_codes: Códigos de tempo no site
+        promo_codes: Códigos de interação com promoções
+        workers: Número de processos (padrão: número de CPUs)
+        shard_size: Número máximo de linhas por tarefa
+
+    Returns:
+        Tupla (probabilidades, relatório com a vazão total e por processo)
+    """
+    if shard_size <= 0:
+        raise ValueError("shard_size deve ser positivo")
+    # Valida no processo pai, antes de copiar para o buffer int8 compartilhado, com as
+    # mesmas regras de calculate_purchase_probability_batch
+    if not isinstance(history_codes, CustomerProfileBatch):
+        if time_codes is None and promo_codes is None:
+            batch = np.asarray(history_codes)
+            if batch.ndim != 2 or batch.shape[1] != 3:
+                raise ValueError("Lote colunar deve ter formato (n, 3): histórico, tempo, promoção")
+            history_codes = CustomerProfileBatch(batch[:, 0], batch[:, 1], batch[:, 2])
+        elif time_codes is None or promo_codes is None:
+            raise ValueError("Informe os três arrays de códigos ou um único lote (n, 3)")
+        else:
+            history_codes = CustomerProfileBatch(history_codes, time_codes, promo_codes)
+    columns = (history_codes.history_codes, history_codes.time_codes, history_codes.promo_codes)
+    rows = len(columns[0])
+    workers = workers or os.cpu_count() or 1
+    began = time.perf_counter()
+
+    tensor = model.build_purchase_tensor().ravel()
+    blocks = [
+        shared_memory.SharedMemory(create=True, size=tensor.nbytes),
+        shared_memory.SharedMemory(create=True, size=max(3 * rows, 1)),
+        shared_memory.SharedMemory(create=True, size=max(8 * rows, 1)),
+    ]
+    try:
+        np.ndarray(tensor.shape, dtype=np.float64, buffer=blocks[0].buf)[:] = tensor
+        shared_codes = np.ndarray((3, rows), dtype=np.int8, buffer=blocks[1].buf)
+        for target, column in zip(shared_codes, columns):
+            target[:] = column
+        output = np.ndarray(rows, dtype=np.float64, buffer=blocks[2].buf)
+
+        starts = list(range(0, rows, shard_size))
+        stops = [min(start + shard_size, rows) for start in starts]
+        per_worker: Dict[int, WorkerStats] = {}
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach_worker,
+                                 initargs=(tuple(b.name for b in blocks), rows)) as pool:
+            for pid, shard_rows, seconds in pool.map(_score_shard, starts, stops):
+                stats = per_worker.setdefault(pid, WorkerStats())
+                stats.rows += shard_rows
+                stats.seconds += seconds
+
+        probabilities = output.copy()
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    report = ParallelReport(rows=rows, workers=workers, shards=len(starts),
+                            seconds=time.perf_counter() - began, per_worker=per_worker)
+    return probabilities, report
+
+
+def benchmark(rows: int = 20_000_000, max_workers: Optional[int] = None, seed: int = 0):
+    """Compara a pontuação em um processo com score_parallel para 1, 2, 4, ... processos"""
+    model = CustomerBehaviorModel()
+    rng = np.random.default_rng(seed)
+    codes = [rng.integers(0, size, rows, dtype=np.int8) for size in CPT_SHAPE]
+
+    began = time.perf_counter()
+    expected = model.calculate_purchase_probability_batch(*codes)
+    baseline = time.perf_counter() - began
+    print(f"Processo único: {baseline:.3f}s ({rows / baseline:,.0f} linhas/s)")
+
+    max_workers = max_workers or os.cpu_count() or 1
+    workers = 1
+    while workers <= max_workers:
+        probabilities, report = score_parallel(model, *codes, workers=workers)
+        assert np.array_equal(probabilities, expected)
+        print(f"\n{report}")
+        print(f"  aceleração sobre o processo único: {baseline / report.seconds:.2f}x")
+        workers *= 2
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,328 @@
+"""
+Servidor Local de Pontuação com Micro-Lotes
+===========================================
+
+Este módulo expõe o CustomerBehaviorModel por um socket TCP ou Unix usando apenas asyncio.
+Requisições concorrentes são agrupadas em micro-lotes dentro de uma janela de latência
+configurável e pontuadas de uma só vez com calculate_purchase_probability_batch.
+
+Protocolo: uma mensagem JSON por linha.
+- Requisição: {"id": 1, "purchase_history": "regular", "time_on_site": "long",
+  "promotion_interaction": "few_clicks"} (valores textuais dos Enums ou códigos inteiros)
+- Resposta: {"id": 1, "probability": 0.8, "recommendations": [...]}
+- Métricas: {"command": "metrics"} devolve latências p50/p99 e tamanhos de lote
+
+As requisições de uma mesma conexão são respondidas em ordem; a concorrência vem de
+várias conexões simultâneas. O gerador de carga embutido (subcomando loadtest ou bench)
+permite testar o servidor sem nenhum serviço externo.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from customer_behavior_model import (
+    CPT_SHAPE,
+    HISTORY_LEVELS,
+    PROMO_LEVELS,
+    TIME_LEVELS,
+    CustomerBehaviorModel,
+    CustomerProfile,
+)
+
+
+FIELDS = ("purchase_history", "time_on_site", "promotion_interaction")
+_LOOKUPS = [
+    {**{member.value: code for code, member in enumerate(levels)},
+     **{code: code for code in range(len(levels))}}
+    for levels in (HISTORY_LEVELS, TIME_LEVELS, PROMO_LEVELS)
+]
+
+
+def parse_request(message: Dict) -> Tuple[int, int, int]:
+    """
+    Converte os campos de uma requisição em códigos inteiros.
+
+    Raises:
+        ValueError: Se algum campo estiver ausente ou tiver uma categoria desconhecida
+    """
+    codes = []
+    for field, lookup in zip(FIELDS, _LOOKUPS):
+        value = message.get(field)
+        try:
+            if isinstance(value, bool):
+                raise KeyError(value)
+            codes.append(lookup[value])
+        except (KeyError, TypeError):
+            raise ValueError(f"Valor inválido para {field}: {value!r}") from None
+    return codes[0], codes[1], codes[2]
+
+
+class ScoringError(Exception):
+    """Falha ao pontuar o lote de uma requisição; enviada ao cliente como erro"""
+
+
+class MicroBatcher:
+    """
+    Agrupa requisições concorrentes em lotes e as pontua de forma vetorizada.
+
+    Um lote é fechado quando atinge max_batch_size requisições ou quando a mais antiga
+    delas completa max_latency segundos de espera, o que ocorrer primeiro.
+    """
+
+    def __init__(self, model: CustomerBehaviorModel, max_batch_size: int = 1024,
+                 max_latency: float = 0.002, history_size: int = 100_000):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.latencies: deque = deque(maxlen=history_size)
+        self.batch_sizes: deque = deque(maxlen=history_size)
+        self.requests = 0
+        self.failed_batches = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._recommendations: List[List[str]] = []
+        self._version = None
+
+    def _recommendation_table(self) -> List[List[str]]:
+        """Recomendações dos 36 perfis por índice plano, recalculadas se as CPTs mudarem"""
+        if self._version != self.model.cpt_version:
+            self._recommendations = [
+                list(self.model.get_recommendations(CustomerProfile(h, t, p)))
+                for h in HISTORY_LEVELS for t in TIME_LEVELS for p in PROMO_LEVELS
+            ]
+            self._version = self.model.cpt_version
+        return self._recommendations
+
+    async def submit(self, codes: Tuple[int, int, int]) -> Tuple[float, List[str]]:
+        """Enfileira uma requisição e aguarda a probabilidade e as recomendações"""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((codes, future, time.perf_counter()))
+        return await future
+
+    async def run(self):
+        """Laço de formação e pontuação de lotes; executa até ser cancelado"""
+        self._queue = asyncio.Queue()
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            deadline = batch[0][2] + self.max_latency
+            while len(batch) < self.max_batch_size:
+                while not queue.empty() and len(batch) < self.max_batch_size:
+                    batch.append(queue.get_nowait())
+                remaining = deadline - time.perf_counter()
+                if len(batch) >= self.max_batch_size or remaining <= 0:
+                    break
+                await asyncio.sleep(remaining)
+            try:
+                self._score(batch)
+            except Exception as error:
+                # Uma falha afeta apenas as requisições deste lote; o laço continua
+                self.failed_batches += 1
+                failure = ScoringError(f"Falha ao pontuar a requisição: {error}")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(failure)
+
+    def _score(self, batch):
+        codes = np.array([item[0] for item in batch], dtype=np.int8)
+        probabilities = self.model.calculate_purchase_probability_batch(codes)
+        flat_index = np.ravel_multi_index(codes.T.astype(np.intp), CPT_SHAPE)
+        table = self._recommendation_table()
+
+        finished = time.perf_counter()
+        for (_, future, enqueued), probability, index in zip(
+                batch, probabilities.tolist(), flat_index.tolist()):
+            if not future.done():
+                future.set_result((probability, table[index]))
+            self.latencies.append(finished - enqueued)
+        self.batch_sizes.append(len(batch))
+        self.requests += len(batch)
+
+    def metrics(self) -> Dict[str, float]:
+        """Latências (em milissegundos) e tamanhos de lote das últimas requisições"""
+        if not self.latencies:
+            return {"requests": self.requests, "batches": 0, "failed_batches": self.failed_batches}
+        latencies = np.array(self.latencies) * 1000.0
+        sizes = np.array(self.batch_sizes)
+        return {
+            "requests": self.requests,
+            "batches": len(sizes),
+            "failed_batches": self.failed_batches,
+            "latency_p50_ms": float(np.percentile(latencies, 50)),
+            "latency_p99_ms": float(np.percentile(latencies, 99)),
+            "batch_size_mean": float(sizes.mean()),
+            "batch_size_p50": float(np.percentile(sizes, 50)),
+            "batch_size_max": int(sizes.max()),
+        }
+
+
+async def _handle_connection(batcher: MicroBatcher, reader: asyncio.StreamReader,
+                             writer: asyncio.StreamWriter):
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                message = json.loads(line)
+                if not isinstance(message, dict):
+                    raise ValueError("A requisição deve ser um objeto JSON")
+                if message.get("command") == "metrics":
+                    response = batcher.metrics()
+                else:
+                    probability, recommendations = await batcher.submit(parse_request(message))
+                    response = {"id": message.get("id"), "probability": probability,
+                                "recommendations": recommendations}
+            except (ValueError, ScoringError) as error:
+                response = {"error": str(error)}
+            writer.write(json.dumps(response, ensure_ascii=False).encode() + b"\n")
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def start_server(model: CustomerBehaviorModel, host: str = "127.0.0.1", port: int = 8765,
+                       unix_path: Optional[str] = None, max_batch_size: int = 1024,
+                       max_latency: float = 0.002):
+    """
+    Inicia o servidor e a tarefa de micro-lotes no laço de eventos atual.
+
+    Returns:
+        Tupla (servidor asyncio, MicroBatcher, tarefa do laço de lotes)
+    """
+    batcher = MicroBatcher(model, max_batch_size, max_latency)
+    batch_task = asyncio.ensure_future(batcher.run())
+    await asyncio.sleep(0)  # garante que a fila exista antes da primeira conexão
+
+    def handler(reader, writer):
+        return _handle_connection(batcher, reader, writer)
+
+    if unix_path:
+        server = await asyncio.start_unix_server(handler, path=unix_path)
+    else:
+        server = await asyncio.start_server(handler, host, port)
+    return server, batcher, batch_task
+
+
+async def _open(host: str, port: int, unix_path: Optional[str]):
+    if unix_path:
+        return await asyncio.open_unix_connection(unix_path)
+    return await asyncio.open_connection(host, port)
+
+
+async def run_load(host: str = "127.0.0.1", port: int = 8765, unix_path: Optional[str] = None,
+                   connections: int = 64, requests_per_connection: int = 500,
+                   seed: int = 0) -> Dict[str, float]:
+    """
+    Gerador de carga: abre várias conexões concorrentes e envia perfis aleatórios.
+
+    Returns:
+        Vazão e latências vistas pelo cliente, mais as métricas reportadas pelo servidor
+    """
+    rng = np.random.default_rng(seed)
+    latencies: List[float] = []
+
+    async def client(profiles):
+        reader, writer = await _open(host, port, unix_path)
+        for i, (h, t, p) in enumerate(profiles.tolist()):
+            request = {"id": i, "purchase_history": h, "time_on_site": t,
+                       "promotion_interaction": p}
+            began = time.perf_counter()
+            writer.write(json.dumps(request).encode() + b"\n")
+            await writer.drain()
+            await reader.readline()
+            latencies.append(time.perf_counter() - began)
+        writer.close()
+        await writer.wait_closed()
+
+    workloads = [np.column_stack([rng.integers(0, size, requests_per_connection) for size in CPT_SHAPE])
+                 for _ in range(connections)]
+    began = time.perf_counter()
+    await asyncio.gather(*(client(profiles) for profiles in workloads))
+    elapsed = time.perf_counter() - began
+
+    reader, writer = await _open(host, port, unix_path)
+    writer.write(b'{"command": "metrics"}\n')
+    await writer.drain()
+    server_metrics = json.loads(await reader.readline())
+    writer.close()
+    await writer.wait_closed()
+
+    client_latencies = np.array(latencies) * 1000.0
+    return {
+        "requests": len(latencies),
+        "seconds": elapsed,
+        "requests_per_second": len(latencies) / elapsed,
+        "client_latency_p50_ms": float(np.percentile(client_latencies, 50)),
+        "client_latency_p99_ms": float(np.percentile(client_latencies, 99)),
+        **{f"server_{name}": value for name, value in server_metrics.items()},
+    }
+
+
+def _print_metrics(metrics: Dict[str, float]):
+    for name, value in metrics.items():
+        print(f"  {name}: {value:,.3f}" if isinstance(value, float) else f"  {name}: {value}")
+
+
+async def _serve_forever(args):
+    server, _, batch_task = await start_server(CustomerBehaviorModel(), args.host, args.port,
+                                               args.unix, args.max_batch_size, args.max_latency_ms / 1000)
+    print(f"Servindo em {args.unix or f'{args.host}:{args.port}'}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        batch_task.cancel()
+
+
+async def _bench(args):
+    server, _, batch_task = await start_server(CustomerBehaviorModel(), args.host, args.port,
+                                               args.unix, args.max_batch_size, args.max_latency_ms / 1000)
+    try:
+        metrics = await run_load(args.host, args.port, args.unix, args.connections, args.requests)
+    finally:
+        server.close()
+        await server.wait_closed()
+        batch_task.cancel()
+    print("Resultados do teste de carga:")
+    _print_metrics(metrics)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local de pontuação com micro-lotes")
+    parser.add_argument("mode", choices=("serve", "loadtest", "bench"),
+                        help="serve: inicia o servidor; loadtest: gera carga contra um servidor "
+                             "em execução; bench: servidor e carga no mesmo processo")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="Caminho de socket Unix (substitui host/porta)")
+    parser.add_argument("--max-batch-size", type=int, default=1024)
+    parser.add_argument("--max-latency-ms", type=float, default=2.0,
+                        help="Janela de formação dos micro-lotes, em milissegundos")
+    parser.add_argument("--connections", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=500, help="Requisições por conexão")
+    args = parser.parse_args()
+
+    if args.mode == "serve":
+        try:
+            asyncio.run(_serve_forever(args))
+        except KeyboardInterrupt:
+            pass
+    elif args.mode == "loadtest":
+        metrics = asyncio.run(run_load(args.host, args.port, args.unix,
+                                       args.connections, args.requests))
+        print("Resultados do teste de carga:")
+        _print_metrics(metrics)
+    else:
+        asyncio.run(_bench(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+Landmark (ALT) Heuristics
+=========================
+
+Preprocessing for fast recommendation routing. A few landmark products are chosen and
+the shortest-path distances from and to each of them are precomputed. By the triangle
+inequality, for any landmark L:
+
+    d(v, t) >= d(L, t) - d(L, v)    and    d(v, t) >= d(v, L) - d(t, L)
+
+so the largest of these bounds is an admissible (and consistent) A* heuristic. This
+replaces near-exhaustive exploration on large graphs with a search focused towards the
+target.
+
+Landmarks are picked by farthest-point selection: each new landmark is the product
+farthest from the ones already chosen, which spreads them around the graph's edges.
+Distances are computed with scipy.sparse.csgraph when SciPy is installed and with a
+pure-Python Dijkstra otherwise. The result is saved to an .npz archive of .npy arrays,
+together with a fingerprint of the graph and costs it was built for, so a restarted
+service can load it instead of preprocessing again.
+"""
+
+import hashlib
+import heapq
+import time
+
+import numpy as np
+
+try:
+    from scipy import sparse
+    from scipy.sparse.csgraph import dijkstra
+except ImportError:  # scipy only speeds up preprocessing
+    sparse = None
+
+
+def graph_fingerprint(graph, costs):
+    """Hash of the graph structure and edge costs a landmark index is valid for."""
+    digest = hashlib.sha1()
+    for array in (graph.indptr, graph.indices, np.asarray(costs, dtype=np.float64)):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+
+def _single_source(indptr, indices, costs, source):
+    """Shortest-path lengths from one node (pure-Python Dijkstra)."""
+    distances = np.full(len(indptr) - 1, np.inf)
+    distances[source] = 0.0
+    done = np.zeros(len(indptr) - 1, dtype=bool)
+    open_set = [(0.0, source)]
+    while open_set:
+        distance, node = heapq.heappop(open_set)
+        if done[node]:
+            continue
+        done[node] = True
+        start, stop = indptr[node], indptr[node + 1]
+        for neighbor, cost in zip(indices[start:stop].tolist(), costs[start:stop].tolist()):
+            candidate = distance + cost
+            if candidate < distances[neighbor]:
+                distances[neighbor] = candidate
+                heapq.heappush(open_set, (candidate, neighbor))
+    return distances
+
+
+class LandmarkIndex:
+    """
+    Precomputed landmark distances for one graph and cost function.
+
+    Attributes:
+        landmarks (np.ndarray): Landmark product ids
+        from_landmarks (np.ndarray): (n_products x n_landmarks) distances d(L, v)
+        to_landmarks (np.ndarray): (n_products x n_landmarks) distances d(v, L)
+        fingerprint (str): graph_fingerprint of the graph and costs used
+    """
+
+    def __init__(self, landmarks, from_landmarks, to_landmarks, fingerprint):
+        self.landmarks = np.asarray(landmarks, dtype=np.int64)
+        self.from_landmarks = np.ascontiguousarray(from_landmarks, dtype=np.float64)
+        self.to_landmarks = np.ascontiguousarray(to_landmarks, dtype=np.float64)
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def build(cls, graph, costs=None, count=16, seed=0):
+        """
+        Choose landmarks and compute their distance arrays.
+
+        Args:
+            graph (ProductGraph): Graph to preprocess
+            costs (np.ndarray, optional): Edge costs aligned with graph.indices
+                (default: graph.costs)
+            count (int): Number of landmarks
+            seed (int): Seed for the first landmark
+
+        Returns:
+            LandmarkIndex: Index valid for this graph and these costs
+        """
+        costs = graph.costs if costs is None else np.asarray(costs, dtype=np.float64)
+        n = graph.num_nodes
+        count = min(count, n)
+        forward = (graph.indptr, graph.indices, costs)
+        backward = graph.transpose(costs)
+
+        if sparse is not None:
+            matrices = [sparse.csr_matrix((c, i, p), shape=(n, n)) for p, i, c in (forward, backward)]
+
+            def distances(direction, source):
+                return dijkstra(matrices[direction], indices=source)
+        else:
+            def distances(direction, source):
+                return _single_source(*(forward, backward)[direction], source)
+
+        landmarks = []
+        from_landmarks = np.empty((n, count))
+        to_landmarks = np.empty((n, count))
+        spread = np.full(n, np.inf)
+        candidate = int(np.random.default_rng(seed).integers(n))
+        for column in range(count):
+            landmarks.append(candidate)
+            from_landmarks[:, column] = distances(0, candidate)
+            to_landmarks[:, column] = distances(1, candidate)
+
+            # Farthest point: unreachable products count as farther than any finite one
+            round_trip = from_landmarks[:, column] + to_landmarks[:, column]
+            finite = np.isfinite(round_trip)
+            ceiling = round_trip[finite].max() + 1.0 if finite.any() else 1.0
+            spread = np.minimum(spread, np.where(finite, round_trip, 2 * ceiling))
+            spread[landmarks] = -1.0
+            candidate = int(spread.argmax())
+
+        return cls(landmarks, from_landmarks, to_landmarks, graph_fingerprint(graph, costs))
+
+    def lower_bounds(self, target):
+        """
+        Lower bounds on the distance from every product to target.
+
+        Returns:
+            np.ndarray: Admissible heuristic values, np.inf where target is unreachable
+        """
+        with np.errstate(invalid='ignore'):
+            bounds = np.maximum(self.from_landmarks[target] - self.from_landmarks,
+                                self.to_landmarks - self.to_landmarks[target])
+        # inf - inf gives no information about that landmark
+        bounds[np.isnan(bounds)] = 0.0
+        return np.maximum(bounds.max(axis=1), 0.0)
+
+    def heuristic(self, target):
+        """A* heuristic (product id -> lower bound) for one target."""
+        return _LandmarkHeuristic(self, target)
+
+    @property
+    def nbytes(self):
+        return self.from_landmarks.nbytes + self.to_landmarks.nbytes
+
+    def save(self, path):
+        """Save the index to an .npz archive."""
+        np.savez(path, landmarks=self.landmarks, from_landmarks=self.from_landmarks,
+                 to_landmarks=self.to_landmarks, fingerprint=np.array(self.fingerprint))
+
+    @classmethod
+    def load(cls, path, graph=None, costs=None):
+        """
+        Load an index written by save().
+
+        Args:
+            path (str): Archive path
+            graph (ProductGraph, optional): When given, the index must have been built
+                for this graph and these costs
+            costs (np.ndarray, optional): Edge costs used with graph (default: graph.costs)
+
+        Raises:
+            ValueError: If the index was built for a different graph or costs
+        """
+        with np.load(path) as data:
+            index = cls(data['landmarks'], data['from_landmarks'], data['to_landmarks'],
+                        str(data['fingerprint']))
+        if graph is not None:
+            costs = graph.costs if costs is None else costs
+            if index.fingerprint != graph_fingerprint(graph, costs):
+                raise ValueError(f"Landmark index {path} was built for a different graph")
+        return index
+
+
+class _LandmarkHeuristic:
+    """
+    Landmark lower bounds towards one target, computed only for the nodes a search
+    reaches. many() bounds all neighbors of an expanded node in one vectorized call.
+    """
+
+    __slots__ = ("from_landmarks", "to_landmarks", "from_target", "to_target")
+
+    def __init__(self, index, target):
+        self.from_landmarks = index.from_landmarks
+        self.to_landmarks = index.to_landmarks
+        self.from_target = index.from_landmarks[target]
+        self.to_target = index.to_landmarks[target]
+
+    def __call__(self, node):
+        return float(self.many(np.array([node]))[0])
+
+    def many(self, nodes):
+        # fmax ignores the NaN of inf - inf, which carries no information
+        with np.errstate(invalid='ignore'):
+            bounds = np.fmax(np.fmax.reduce(self.from_target - self.from_landmarks[nodes], axis=1),
+                             np.fmax.reduce(self.to_landmarks[nodes] - self.to_target, axis=1))
+        return np.fmax(bounds, 0.0)
+
+
+def benchmark(num_products=200_000, co_purchases=1_000_000, landmark_count=16, queries=20, seed=0):
+    """Compare node expansions and query time with and without landmarks."""
+    import os
+    import tempfile
+
+    from produtos_eletronicos import AStarRecommendation, Product
+    from product_graph import ProductGraph
+
+    rng = np.random.default_rng(seed)
+    products = [Product(f"Product {i}", f"Category {i % 50}", float(p))
+                for i, p in enumerate(rng.uniform(0.05, 0.95, num_products))]
+    graph = ProductGraph.from_relations(products, category_neighbors=5)
+    pairs = rng.integers(0, num_products, (co_purchases, 2))
+    graph.add_edges(np.concatenate([pairs[:, 0], pairs[:, 1]]), np.concatenate([pairs[:, 1], pairs[:, 0]]))
+    print(f"{num_products:,} products, {graph.num_edges:,} edges")
+
+    recommender = AStarRecommendation(products, graph)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "landmarks.npz")
+        began = time.perf_counter()
+        recommender.prepare_landmarks(landmark_count, path=path)
+        print(f"Preprocessing {landmark_count} landmarks: {time.perf_counter() - began:.2f}s "
+              f"({recommender.landmarks.nbytes / 1e6:.1f} MB)")
+        began = time.perf_counter()
+        recommender.prepare_landmarks(landmark_count, path=path)
+        print(f"Reloading them from disk: {time.perf_counter() - began:.2f}s")
+
+    pairs = rng.integers(0, num_products, (queries, 2))
+    totals = {}
+    for label, use_landmarks in (("without landmarks", False), ("with landmarks", True)):
+        expanded, seconds, routes = 0, 0.0, []
+        for source, target in pairs.tolist():
+            began = time.perf_counter()
+            routes.append(recommender.conversion_route(products[source], products[target],
+                                                       use_landmarks=use_landmarks, use_cache=False))
+            seconds += time.perf_counter() - began
+            expanded += recommender.last_stats.expanded
+        totals[label] = routes
+        print(f"{label:>18}: {expanded / queries:>10,.0f} expansions/query, "
+              f"{seconds / queries * 1000:>8.1f} ms/query")
+    same = totals["without landmarks"] == totals["with landmarks"]
+    print(f"Identical routes: {same}")
+
+
+if __name__ == "__main__":
+    benchmark()
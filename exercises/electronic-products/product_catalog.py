@@ -0,0 +1,536 @@
+"""
+Columnar Product Catalog
+========================
+
+Stores a large catalog as a few NumPy columns instead of one Product object per item:
+
+- ids: int64 external product ids (e.g. SKUs)
+- category_codes: int32 index into the interned list of category names
+- conversion: float64 conversion probabilities
+- names: UTF-8 bytes of all names in one buffer, sliced by name_offsets
+
+A product is addressed by its row (position in the columns). ProductView is a small
+__slots__ object holding only (catalog, row) that offers the Product getters and setters
+and reads/writes the columns, so existing code keeps working while the data stays in the
+arrays. At roughly 40 bytes per product plus its name, ten million products take a few
+hundred MB instead of several GB of Python objects.
+
+Lookups by name or id use open-addressing hash tables of row numbers, built on first use,
+so they take O(1) probes without a Python dict entry per product. Category filters read
+a precomputed grouping of rows by category code instead of scanning the catalog.
+
+For "top k products" queries the catalog keeps rows sorted by conversion probability,
+once overall and once per category. set_conversion_prob moves the changed row to its new
+place with a binary search and one shift of the rows in between, so the rankings never
+need a full re-sort and a query only copies the first k rows. Arbitrary candidate sets
+(e.g. the neighbors of a product) are ranked with np.argpartition by top_k_rows.
+"""
+
+import csv
+
+import numpy as np
+
+
+class ProductView:
+    """
+    One catalog row with the Product interface (get_name(), set_conversion_prob(), ...).
+
+    Views are created on demand; two views of the same row compare equal and hash alike,
+    so they can be used as dictionary keys just like Product objects.
+    """
+
+    __slots__ = ("catalog", "row")
+
+    def __init__(self, catalog, row):
+        self.catalog = catalog
+        self.row = row
+
+    @property
+    def name(self):
+        return self.catalog.name_of(self.row)
+
+    @name.setter
+    def name(self, name):
+        self.catalog.set_name(self.row, name)
+
+    @property
+    def category(self):
+        return self.catalog.categories[self.catalog.category_codes[self.row]]
+
+    @category.setter
+    def category(self, category):
+        self.catalog.set_category(self.row, category)
+
+    @property
+    def conversion_prob(self):
+        return float(self.catalog.conversion[self.row])
+
+    @conversion_prob.setter
+    def conversion_prob(self, conversion_prob):
+        self.catalog.set_conversion_prob(self.row, conversion_prob)
+
+    @property
+    def product_id(self):
+        return int(self.catalog.ids[self.row])
+
+    def set_name(self, name):
+        self.name = name
+
+    def set_category(self, category):
+        self.category = category
+
+    def set_conversion_prob(self, conversion_prob):
+        self.conversion_prob = conversion_prob
+
+    def get_name(self):
+        return self.name
+
+    def get_category(self):
+        return self.category
+
+    def get_conversion_prob(self):
+        return self.conversion_prob
+
+    def __eq__(self, other):
+        if not isinstance(other, ProductView):
+            return NotImplemented
+        return self.catalog is other.catalog and self.row == other.row
+
+    def __hash__(self):
+        return hash((id(self.catalog), self.row))
+
+    def __repr__(self):
+        return f"ProductView(row={self.row}, name={self.name!r})"
+
+
+def _encode_names(names):
+    """UTF-8 buffer and offsets of a sequence of names."""
+    encoded = [name.encode('utf-8') for name in names]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(name) for name in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def _hash_table(hashes):
+    """
+    Open-addressing (linear probing) table of row numbers for int64 hash values.
+
+    The table has at least twice as many slots as rows, and -1 marks an empty slot. Rows
+    are inserted in vectorized rounds: every pending row tries its next slot, the first
+    row claiming each free slot wins and the others probe on in the next round.
+    """
+    size = 1 << max(3, (2 * len(hashes) - 1).bit_length())
+    mask = size - 1
+    table = np.full(size, -1, dtype=np.int32 if len(hashes) < 2 ** 31 else np.int64)
+    pending = np.arange(len(hashes))
+    slots = hashes & mask
+    while len(pending):
+        free = table[slots] == -1
+        claimed, first = np.unique(slots[free], return_index=True)
+        winners = pending[free][first]
+        table[claimed] = winners
+        placed = np.zeros(len(hashes), dtype=bool)
+        placed[winners] = True
+        keep = ~placed[pending]
+        pending, slots = pending[keep], (slots[keep] + 1) & mask
+    return table
+
+
+def _probe(table, hashed):
+    """Rows stored in table along the probe sequence of one hash value."""
+    mask = len(table) - 1
+    slot = hashed & mask
+    while True:
+        row = int(table[slot])
+        if row < 0:
+            return
+        yield row
+        slot = (slot + 1) & mask
+
+
+def top_k_rows(conversion, k, rows=None):
+    """
+    Rows with the k highest conversion probabilities, best first.
+
+    Args:
+        conversion (np.ndarray): Conversion probability of every row
+        k (int): Number of rows to return
+        rows (array-like of int, optional): Candidate rows (default: all rows)
+
+    Returns:
+        np.ndarray: Up to k rows sorted by decreasing conversion probability
+    """
+    rows = np.arange(len(conversion)) if rows is None else np.asarray(rows, dtype=np.int64)
+    values = conversion[rows]
+    if k < len(rows):
+        best = np.argpartition(-values, k - 1)[:k]
+        rows, values = rows[best], values[best]
+    return rows[np.argsort(-values, kind='stable')]
+
+
+class _Ranking:
+    """Rows kept sorted by decreasing conversion probability, updated in place."""
+
+    def __init__(self, rows, conversion):
+        self.rows = np.asarray(rows)
+        # Ascending keys are the negated probabilities
+        self.keys = -conversion[self.rows]
+        order = np.argsort(self.keys, kind='stable')
+        self.rows, self.keys = self.rows[order], self.keys[order]
+
+    def _position(self, row, key):
+        start = np.searchsorted(self.keys, key, side='left')
+        stop = np.searchsorted(self.keys, key, side='right')
+        return start + int(np.flatnonzero(self.rows[start:stop] == row)[0])
+
+    def move(self, row, old_probability, new_probability):
+        """Re-rank one row after its probability changed (one shift of the rows in between)."""
+        old = self._position(row, -old_probability)
+        new = int(np.searchsorted(self.keys, -new_probability, side='left'))
+        if new > old:
+            new -= 1  # the row itself leaves its old place first
+            self.rows[old:new] = self.rows[old + 1:new + 1]
+            self.keys[old:new] = self.keys[old + 1:new + 1]
+        elif new < old:
+            self.rows[new + 1:old + 1] = self.rows[new:old]
+            self.keys[new + 1:old + 1] = self.keys[new:old]
+        self.rows[new] = row
+        self.keys[new] = -new_probability
+
+    def insert(self, row, probability):
+        position = np.searchsorted(self.keys, -probability, side='left')
+        self.rows = np.insert(self.rows, position, row)
+        self.keys = np.insert(self.keys, position, -probability)
+
+    def remove(self, row, probability):
+        position = self._position(row, -probability)
+        self.rows = np.delete(self.rows, position)
+        self.keys = np.delete(self.keys, position)
+
+    @property
+    def nbytes(self):
+        return self.rows.nbytes + self.keys.nbytes
+
+
+class ProductCatalog:
+    """
+    Catalog of products stored column-wise.
+
+    Attributes:
+        ids (np.ndarray): int64 external id of every row
+        category_codes (np.ndarray): int32 category code of every row
+        categories (list): Interned category names; codes index into this list
+        conversion (np.ndarray): float64 conversion probability of every row
+        names (np.ndarray): uint8 buffer with the UTF-8 encoded names
+        name_offsets (np.ndarray): int64; the name of row i is names[offsets[i]:offsets[i + 1]]
+        version (int): Incremented on every change, for caches keyed on the catalog
+    """
+
+    def __init__(self, names, categories, conversion, ids=None):
+        """
+        Args:
+            names (iterable of str): Product names (by_name returns the first match)
+            categories (iterable of str): Category name of every product
+            conversion (array-like of float): Conversion probabilities in [0, 1]
+            ids (array-like of int, optional): Unique external ids (default: row numbers)
+        """
+        self.names, self.name_offsets = _encode_names(names)
+        size = len(self.name_offsets) - 1
+
+        self.categories = []
+        self._category_index = {}
+        self.category_codes = np.array([self._intern(category) for category in categories], dtype=np.int32)
+
+        self.conversion = np.array(conversion, dtype=np.float64)
+        self.ids = np.arange(size, dtype=np.int64) if ids is None else np.array(ids, dtype=np.int64)
+        if not len(self.category_codes) == len(self.conversion) == len(self.ids) == size:
+            raise ValueError("names, categories, conversion and ids must have the same length")
+        self._validate()
+
+        self.version = 0
+        self._renamed = {}  # row -> new name, for names changed after loading
+        self._renamed_rows = {}  # new name -> rows renamed to it, so by_name stays O(1)
+        self._name_table = None
+        self._id_table = None
+        self._members = None
+        self._rankings = None  # (overall, {category code: ranking}), built on first top_k
+
+    def _validate(self):
+        if ((self.conversion < 0) | (self.conversion > 1)).any() or np.isnan(self.conversion).any():
+            raise ValueError("Conversion probabilities must be in [0, 1]")
+        if len(np.unique(self.ids)) != len(self.ids):
+            raise ValueError("Product ids must be unique")
+
+    def _intern(self, category):
+        code = self._category_index.get(category)
+        if code is None:
+            code = self._category_index[category] = len(self.categories)
+            self.categories.append(category)
+        return code
+
+    @classmethod
+    def from_products(cls, products):
+        """Build a catalog from Product objects."""
+        return cls([p.get_name() for p in products], [p.get_category() for p in products],
+                   [p.get_conversion_prob() for p in products])
+
+    @classmethod
+    def from_csv(cls, path, name_column='name', category_column='category',
+                 conversion_column='conversion_prob', id_column=None, chunk_size=1_000_000):
+        """
+        Load a catalog from a CSV file with a header row.
+
+        Rows are converted to columns chunk by chunk, so at most chunk_size rows exist as
+        Python strings at any time.
+
+        Args:
+            path (str): CSV file
+            name_column (str): Column with the product name
+            category_column (str): Column with the category name
+            conversion_column (str): Column with the conversion probability
+            id_column (str, optional): Column with the external id (default: row numbers)
+            chunk_size (int): Rows converted at once
+        """
+        catalog = cls([], [], [])
+        parts = []
+        rows = []
+
+        def flush():
+            names, offsets = _encode_names([row[name_position] for row in rows])
+            parts.append((names, np.diff(offsets),
+                          np.array([catalog._intern(row[category_position]) for row in rows], dtype=np.int32),
+                          np.array([row[conversion_position] for row in rows], dtype=np.float64),
+                          np.array([row[id_position] for row in rows], dtype=np.int64)
+                          if id_position is not None else None))
+            rows.clear()
+
+        with open(path, newline='', encoding='utf-8') as handle:
+            reader = csv.reader(handle)
+            header = next(reader)
+            try:
+                columns = [header.index(column) for column in (name_column, category_column, conversion_column)]
+                id_position = header.index(id_column) if id_column is not None else None
+            except ValueError as error:
+                raise ValueError(f"Missing column in {path}: {error}") from None
+            name_position, category_position, conversion_position = columns
+            for row in reader:
+                rows.append(row)
+                if len(rows) >= chunk_size:
+                    flush()
+            if rows:
+                flush()
+
+        if parts:
+            names, lengths, codes, conversion, ids = zip(*parts)
+            catalog.names = np.concatenate(names)
+            catalog.name_offsets = np.zeros(sum(len(part) for part in lengths) + 1, dtype=np.int64)
+            np.cumsum(np.concatenate(lengths), out=catalog.name_offsets[1:])
+            catalog.category_codes = np.concatenate(codes)
+            catalog.conversion = np.concatenate(conversion)
+            catalog.ids = (np.concatenate(ids) if id_position is not None
+                           else np.arange(len(catalog.conversion), dtype=np.int64))
+            catalog._validate()
+        return catalog
+
+    def save(self, path):
+        """Save the columns to an .npz archive."""
+        self._apply_renames()
+        np.savez(path, ids=self.ids, category_codes=self.category_codes, conversion=self.conversion,
+                 names=self.names, name_offsets=self.name_offsets, categories=np.array(self.categories))
+
+    @classmethod
+    def load(cls, path):
+        """Load a catalog written by save() without going through Python objects per row."""
+        catalog = cls([], [], [])
+        with np.load(path) as data:
+            catalog.ids = data['ids']
+            catalog.category_codes = data['category_codes']
+            catalog.conversion = data['conversion']
+            catalog.names = data['names']
+            catalog.name_offsets = data['name_offsets']
+            catalog.categories = [str(category) for category in data['categories']]
+        catalog._category_index = {category: code for code, category in enumerate(catalog.categories)}
+        return catalog
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, row):
+        if not -len(self) <= row < len(self):
+            raise IndexError(f"Catalog row out of range: {row}")
+        return ProductView(self, int(row) % len(self))
+
+    def __iter__(self):
+        return (ProductView(self, row) for row in range(len(self)))
+
+    @property
+    def nbytes(self):
+        """Memory used by the columns and any lookup tables built so far."""
+        arrays = [self.ids, self.category_codes, self.conversion, self.names, self.name_offsets,
+                  self._name_table, self._id_table]
+        if self._members is not None:
+            arrays.extend(self._members)
+        total = sum(array.nbytes for array in arrays if array is not None)
+        if self._rankings is not None:
+            overall, by_category = self._rankings
+            total += overall.nbytes + sum(ranking.nbytes for ranking in by_category.values())
+        return total
+
+    def name_of(self, row):
+        """Name of one row."""
+        if row in self._renamed:
+            return self._renamed[row]
+        return self._stored_name(row)
+
+    def _stored_name(self, row):
+        """Name of one row in the name buffer (its original name if renamed since)."""
+        return self.names[self.name_offsets[row]:self.name_offsets[row + 1]].tobytes().decode('utf-8')
+
+    def row_of(self, product):
+        """Row of a ProductView of this catalog."""
+        if isinstance(product, ProductView) and product.catalog is self:
+            return product.row
+        raise ValueError(f"Product not in catalog: {product}")
+
+    def by_name(self, name):
+        """
+        View of the product with this name.
+
+        Raises:
+            KeyError: If no product has this name
+        """
+        # The table indexes the name buffer; rows renamed since then are in _renamed_rows
+        if self._name_table is None:
+            hashes = np.fromiter((hash(self._stored_name(row)) for row in range(len(self))),
+                                 dtype=np.int64, count=len(self))
+            self._name_table = _hash_table(hashes)
+        for row in _probe(self._name_table, hash(name)):
+            if self.name_of(row) == name:
+                return ProductView(self, row)
+        if name in self._renamed_rows:
+            return ProductView(self, min(self._renamed_rows[name]))
+        raise KeyError(name)
+
+    def by_id(self, product_id):
+        """
+        View of the product with this external id.
+
+        Raises:
+            KeyError: If no product has this id
+        """
+        if self._id_table is None:
+            self._id_table = _hash_table(self.ids)
+        for row in _probe(self._id_table, int(product_id)):
+            if self.ids[row] == product_id:
+                return ProductView(self, row)
+        raise KeyError(product_id)
+
+    def category_code(self, category):
+        """Code of a category name, or -1 if no product has ever had it."""
+        return self._category_index.get(category, -1)
+
+    def in_category(self, category):
+        """
+        Rows of one category, in ascending order.
+
+        Rows are grouped by category code once (and again after category changes), so
+        each call only slices the group instead of scanning the catalog.
+        """
+        code = self.category_code(category)
+        if code < 0:
+            return np.empty(0, dtype=np.int64)
+        if self._members is None:
+            order = np.argsort(self.category_codes, kind='stable')
+            indptr = np.zeros(len(self.categories) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self.category_codes, minlength=len(self.categories)), out=indptr[1:])
+            self._members = (indptr, order)
+        indptr, order = self._members
+        return order[indptr[code]:indptr[code + 1]]
+
+    def products_in_category(self, category):
+        """Views of the products of one category."""
+        return [ProductView(self, row) for row in self.in_category(category).tolist()]
+
+    def _ranking(self, category):
+        if self._rankings is None:
+            row_dtype = np.int32 if len(self) < 2 ** 31 else np.int64
+            overall = _Ranking(np.arange(len(self), dtype=row_dtype), self.conversion)
+            # Split the overall order by category: a stable sort keeps each group ranked
+            grouped = overall.rows[np.argsort(self.category_codes[overall.rows], kind='stable')]
+            bounds = np.cumsum(np.bincount(self.category_codes, minlength=len(self.categories)))
+            by_category = {code: _Ranking(rows, self.conversion)
+                           for code, rows in enumerate(np.split(grouped, bounds[:-1]))}
+            self._rankings = (overall, by_category)
+        overall, by_category = self._rankings
+        if category is None:
+            return overall
+        return by_category.get(self.category_code(category))
+
+    def top_k(self, k, category=None, exclude=()):
+        """
+        Rows of the k products with the highest conversion probability, best first.
+
+        Args:
+            k (int): Number of rows to return
+            category (str, optional): Only rank products of this category
+            exclude (iterable of int): Rows to leave out (e.g. the current product)
+
+        Returns:
+            np.ndarray: Up to k rows; reads the precomputed ranking, so it costs O(k)
+        """
+        ranking = self._ranking(category)
+        if ranking is None:
+            return np.empty(0, dtype=np.int64)
+        exclude = set(exclude)
+        rows = ranking.rows[:k + len(exclude)]
+        if exclude:
+            rows = rows[~np.isin(rows, list(exclude))]
+        return rows[:k].astype(np.int64)
+
+    def set_name(self, row, name):
+        if name == self.name_of(row):
+            return
+        previous = self._renamed.pop(row, None)
+        if previous is not None:
+            rows = self._renamed_rows[previous]
+            rows.discard(row)
+            if not rows:
+                del self._renamed_rows[previous]
+        # Getting the original name back needs no override: the table indexes it already
+        if name != self._stored_name(row):
+            self._renamed[row] = name
+            self._renamed_rows.setdefault(name, set()).add(row)
+        self.version += 1
+
+    def set_category(self, row, category):
+        old_code, code = self.category_codes[row], self._intern(category)
+        self.category_codes[row] = code
+        self._members = None
+        if self._rankings is not None and code != old_code:
+            by_category = self._rankings[1]
+            by_category[old_code].remove(row, self.conversion[row])
+            if code in by_category:
+                by_category[code].insert(row, self.conversion[row])
+            else:
+                by_category[code] = _Ranking(np.array([row], dtype=self._rankings[0].rows.dtype), self.conversion)
+        self.version += 1
+
+    def set_conversion_prob(self, row, conversion_prob):
+        if not 0.0 <= conversion_prob <= 1.0:
+            raise ValueError("Conversion probability must be in [0, 1]")
+        old = self.conversion[row]
+        self.conversion[row] = conversion_prob
+        if self._rankings is not None and conversion_prob != old:
+            overall, by_category = self._rankings
+            overall.move(row, old, conversion_prob)
+            by_category[self.category_codes[row]].move(row, old, conversion_prob)
+        self.version += 1
+
+    def _apply_renames(self):
+        """Rewrite the name buffer with pending renames (used before saving)."""
+        if not self._renamed:
+            return
+        self.names, self.name_offsets = _encode_names([self.name_of(row) for row in range(len(self))])
+        self._renamed = {}
+        self._renamed_rows = {}
+        self._name_table = None
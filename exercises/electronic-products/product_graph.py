@@ -0,0 +1,285 @@
+"""
+Product Graph
+=============
+
+Persistent graph of product relations for AStarRecommendation. Products are referred to
+by integer ids (their position in the product list), and edges are stored in compressed
+sparse row (CSR) arrays: the successors of product i are indices[indptr[i]:indptr[i + 1]],
+with transition costs in the matching slice of costs. The graph is built once from real
+relations (co-purchases, shared categories, explicit links) and reused by every query.
+
+Edge updates are buffered and merged into the CSR arrays the next time the graph is
+read, so a burst of updates costs one O(E log E) merge instead of a rebuild each.
+Every change increments version, which caches can use as part of their keys.
+
+Besides the stored costs, conversion_costs() folds each target product's conversion
+probability into the edge cost as -log(p), so the cheapest route maximizes the product
+of conversion probabilities along the way while costs stay non-negative.
+"""
+
+import numpy as np
+
+from product_catalog import ProductCatalog
+
+
+class ProductGraph:
+    """
+    Directed graph over product ids in CSR form.
+
+    Attributes:
+        products (list or ProductCatalog): Products; a product's id is its position in
+            this list (or its catalog row)
+        version (int): Incremented on every edge change
+    """
+
+    def __init__(self, products, sources=(), targets=(), costs=None):
+        """
+        Args:
+            products (list or ProductCatalog): Products of the graph; a catalog is kept
+                as is and its rows are the product ids
+            sources (array-like of int): Edge source ids
+            targets (array-like of int): Edge target ids
+            costs (array-like of float, optional): Edge costs (default 1.0 each)
+        """
+        if isinstance(products, ProductCatalog):
+            self.products = products
+            self._ids = None
+        else:
+            self.products = list(products)
+            self._ids = {product: i for i, product in enumerate(self.products)}
+        self.version = 0
+        self._indptr = np.zeros(len(self.products) + 1, dtype=np.int64)
+        self._indices = np.empty(0, dtype=np.int32)
+        self._costs = np.empty(0, dtype=np.float64)
+        self._pending = []
+        self._transpose = None
+        self.add_edges(sources, targets, costs)
+
+    @classmethod
+    def complete(cls, products):
+        """Graph linking every product to every other one with cost 1."""
+        n = len(products)
+        sources = np.repeat(np.arange(n), n)
+        targets = np.tile(np.arange(n), n)
+        keep = sources != targets
+        return cls(products, sources[keep], targets[keep])
+
+    @classmethod
+    def from_relations(cls, products, co_purchases=(), links=(), category_neighbors=0):
+        """
+        Build a graph from product relations.
+
+        Args:
+            products (list): Products of the graph
+            co_purchases (iterable): (product_a, product_b) pairs bought together;
+                linked in both directions
+            links (iterable): Explicit (source, target) or (source, target, cost) links
+            category_neighbors (int): Link every product to this many of the
+                highest-converting other products of its category
+
+        Products in relations may be given as Product objects or integer ids.
+        """
+        graph = cls(products)
+        pairs = [tuple(graph.id_of(product) for product in pair) for pair in co_purchases]
+        if pairs:
+            pairs = np.array(pairs, dtype=np.int64)
+            graph.add_edges(np.concatenate([pairs[:, 0], pairs[:, 1]]),
+                            np.concatenate([pairs[:, 1], pairs[:, 0]]))
+
+        links = list(links)
+        if links:
+            graph.add_edges([graph.id_of(link[0]) for link in links],
+                            [graph.id_of(link[1]) for link in links],
+                            [link[2] if len(link) > 2 else 1.0 for link in links])
+
+        if category_neighbors > 0:
+            graph.add_edges(*_category_edges(graph.products, category_neighbors))
+        return graph
+
+    def id_of(self, product):
+        """Integer id of a product (ids are passed through unchanged)."""
+        if isinstance(product, (int, np.integer)):
+            if not 0 <= product < len(self.products):
+                raise ValueError(f"Invalid product id: {product}")
+            return int(product)
+        if self._ids is None:
+            return self.products.row_of(product)
+        try:
+            return self._ids[product]
+        except KeyError:
+            raise ValueError(f"Product not in graph: {product}") from None
+
+    @property
+    def num_nodes(self):
+        return len(self.products)
+
+    @property
+    def num_edges(self):
+        return len(self.indices)
+
+    @property
+    def indptr(self):
+        self._compact()
+        return self._indptr
+
+    @property
+    def indices(self):
+        self._compact()
+        return self._indices
+
+    @property
+    def costs(self):
+        self._compact()
+        return self._costs
+
+    @property
+    def nbytes(self):
+        """Memory used by the CSR arrays."""
+        return self.indptr.nbytes + self.indices.nbytes + self.costs.nbytes
+
+    def neighbors(self, node):
+        """Successor ids and edge costs of one product id."""
+        indptr = self.indptr
+        start, stop = indptr[node], indptr[node + 1]
+        return self._indices[start:stop], self._costs[start:stop]
+
+    def transpose(self, costs=None):
+        """
+        Reverse graph in CSR form (the predecessor lists of every product).
+
+        Args:
+            costs (np.ndarray, optional): Edge costs aligned with indices (default: costs)
+
+        Returns:
+            tuple: (indptr, indices, costs) of the reversed edges
+        """
+        indptr, indices = self.indptr, self.indices
+        if self._transpose is None or self._transpose[0] != self.version:
+            n = len(self.products)
+            order = np.argsort(indices, kind='stable')
+            reverse_indptr = np.zeros(n + 1, dtype=np.int64)
+            np.cumsum(np.bincount(indices, minlength=n), out=reverse_indptr[1:])
+            sources = np.repeat(np.arange(n, dtype=np.int32), np.diff(indptr))[order]
+            self._transpose = (self.version, reverse_indptr, sources, order)
+        _, reverse_indptr, sources, order = self._transpose
+        costs = self._costs if costs is None else costs
+        return reverse_indptr, sources, costs[order]
+
+    def conversion(self):
+        """Conversion probability of every product, as a float64 array indexed by id."""
+        return _conversion_column(self.products)
+
+    def conversion_costs(self):
+        """
+        Edge costs with the target's conversion probability folded in.
+
+        Returns:
+            np.ndarray: cost + -log(p) for every edge, aligned with indices; edges into
+            products with zero conversion probability get an infinite cost
+        """
+        conversion = self.conversion()
+        with np.errstate(divide='ignore'):
+            penalty = -np.log(np.clip(conversion, 0.0, 1.0))
+        return self.costs + penalty[self.indices]
+
+    def add_edge(self, source, target, cost=1.0):
+        """Add an edge, or replace the cost of an existing one."""
+        self.add_edges([self.id_of(source)], [self.id_of(target)], [cost])
+
+    def add_edges(self, sources, targets, costs=None):
+        """
+        Add a batch of edges by id; an existing edge takes the new cost.
+
+        Args:
+            sources (array-like of int): Edge source ids
+            targets (array-like of int): Edge target ids
+            costs (array-like of float, optional): Non-negative costs (default 1.0 each)
+        """
+        sources = np.asarray(sources, dtype=np.int64).ravel()
+        targets = np.asarray(targets, dtype=np.int64).ravel()
+        if costs is None:
+            costs = np.ones(len(sources))
+        costs = np.asarray(costs, dtype=np.float64).ravel()
+        if not len(sources) == len(targets) == len(costs):
+            raise ValueError("sources, targets and costs must have the same length")
+        if not len(sources):
+            return
+        n = len(self.products)
+        if min(sources.min(), targets.min()) < 0 or max(sources.max(), targets.max()) >= n:
+            raise ValueError(f"Product ids must be in [0, {n - 1}]")
+        if (costs < 0).any() or np.isnan(costs).any():
+            raise ValueError("Edge costs must be non-negative")
+        self._pending.append((sources, targets, costs))
+        self.version += 1
+
+    def remove_edge(self, source, target):
+        """Remove an edge if it exists."""
+        self.remove_edges([self.id_of(source)], [self.id_of(target)])
+
+    def remove_edges(self, sources, targets):
+        """Remove a batch of edges by id; missing edges are ignored."""
+        sources = np.asarray(sources, dtype=np.int64).ravel()
+        targets = np.asarray(targets, dtype=np.int64).ravel()
+        if len(sources) != len(targets):
+            raise ValueError("sources and targets must have the same length")
+        if len(sources):
+            # NaN cost marks a removal; it is dropped when the edges are merged
+            self._pending.append((sources, targets, np.full(len(sources), np.nan)))
+            self.version += 1
+
+    def _compact(self):
+        """Merge buffered edge updates into the CSR arrays."""
+        if not self._pending:
+            return
+        n = len(self.products)
+        rows = np.repeat(np.arange(n), np.diff(self._indptr))
+        sources = np.concatenate([rows] + [batch[0] for batch in self._pending])
+        targets = np.concatenate([self._indices.astype(np.int64)] + [batch[1] for batch in self._pending])
+        costs = np.concatenate([self._costs] + [batch[2] for batch in self._pending])
+        self._pending = []
+
+        # Stable sort by (source, target): the last update of each edge wins
+        keys = sources * n + targets
+        order = np.argsort(keys, kind='stable')
+        keys, costs = keys[order], costs[order]
+        last = np.append(keys[1:] != keys[:-1], True)
+        keys, costs = keys[last], costs[last]
+        keep = ~np.isnan(costs)
+        keys, costs = keys[keep], costs[keep]
+
+        self._indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys // n, minlength=n), out=self._indptr[1:])
+        self._indices = (keys % n).astype(np.int32)
+        self._costs = costs
+
+
+def _conversion_column(products):
+    """Conversion probability of every product as a float64 array."""
+    if isinstance(products, ProductCatalog):
+        return products.conversion
+    return np.array([p.get_conversion_prob() for p in products], dtype=np.float64)
+
+
+def _category_edges(products, count):
+    """Edges from every product to the `count` best-converting others of its category."""
+    conversion = _conversion_column(products)
+    if isinstance(products, ProductCatalog):
+        groups = [products.in_category(category) for category in products.categories]
+    else:
+        categories = {}
+        codes = np.array([categories.setdefault(p.get_category(), len(categories)) for p in products])
+        groups = [np.flatnonzero(codes == code) for code in range(len(categories))]
+    sources, targets = [], []
+    for members in groups:
+        if len(members) < 2:
+            continue
+        top = members[np.argsort(-conversion[members], kind='stable')[:count + 1]]
+        # every member links to the top list minus itself, capped at `count`
+        candidates = np.broadcast_to(top, (len(members), len(top)))
+        mask = candidates != members[:, None]
+        mask &= np.cumsum(mask, axis=1) <= count
+        sources.append(np.repeat(members, mask.sum(axis=1)))
+        targets.append(candidates[mask])
+    if not sources:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(sources), np.concatenate(targets)
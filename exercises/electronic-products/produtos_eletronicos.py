@@ -1,9 +1,32 @@
+import os
+
+import numpy as np
+
+from landmarks import LandmarkIndex
+from product_catalog import ProductCatalog, top_k_rows
+from product_graph import ProductGraph
+from route_search import RouteCache, SearchWorkspace, astar, beam_search, bidirectional, shortest_path_tree
+
+
 class Product:
+    # Incremented whenever any product's conversion probability changes, so cached edge
+    # costs and landmark distances know when they are stale
+    conversion_version = 0
+
     def __init__(self, name, category, conversion_prob):
         self.name = name
         self.category = category
         self.conversion_prob = conversion_prob
 
+    @property
+    def conversion_prob(self):
+        return self._conversion_prob
+
+    @conversion_prob.setter
+    def conversion_prob(self, conversion_prob):
+        self._conversion_prob = conversion_prob
+        Product.conversion_version += 1
+
     def set_name(self, name):
         self.name = name
 
@@ -23,53 +46,246 @@ class Product:
         return self.conversion_prob
 
 class AStarRecommendation:
-    def __init__(self, products):
+    # Search modes accepted by conversion_route
+    SEARCH_MODES = ("astar", "bidirectional", "beam")
+
+    def __init__(self, products, graph=None, cache_size=100_000):
         self.products = products
-    
-    def a_star_recommendation(self, initial_product, final_product):
+        # Built once and reused by every query. Without explicit relations every product
+        # is linked to every other one, which only suits small catalogs; large catalogs
+        # should pass ProductGraph.from_relations(...)
+        self.graph = graph if graph is not None else ProductGraph.complete(products)
+        self.last_stats = None  # expanded/pushed counters of the latest query
+        self.landmarks = None
+        self._landmarks_key = None
+        self._conversion_costs = None
+        self._conversion = None
+        self._reverse = None
+        self._workspace = None
+        self._reverse_workspace = None
+        # Conversion routes by (source id, target id, cost key); cleared when the key changes
+        self.route_cache = RouteCache(cache_size)
+        self._route_cache_key = None
+
+    def _search_workspace(self):
+        if self._workspace is None or self._workspace.num_nodes != self.graph.num_nodes:
+            self._workspace = SearchWorkspace(self.graph.num_nodes)
+        return self._workspace
+
+    def _reverse_search(self):
+        """Workspace pair and reversed conversion-cost graph for bidirectional search."""
+        if self._reverse_workspace is None or self._reverse_workspace.num_nodes != self.graph.num_nodes:
+            self._reverse_workspace = SearchWorkspace(self.graph.num_nodes)
+        key = self._cost_key()
+        if self._reverse is None or self._reverse[0] != key:
+            self._reverse = (key, self.graph.transpose(self.conversion_costs()))
+        return (self._search_workspace(), self._reverse_workspace), self._reverse[1]
+
+    def _cost_key(self):
+        # A ProductCatalog tracks changes to its own rows in catalog.version
+        catalog_version = getattr(self.graph.products, 'version', 0)
+        return (id(self.graph), self.graph.version, Product.conversion_version, catalog_version)
+
+    def conversion_costs(self):
+        """Edge costs with conversion probabilities folded in, cached until they change."""
+        key = self._cost_key()
+        if self._conversion_costs is None or self._conversion_costs[0] != key:
+            self._conversion_costs = (key, self.graph.conversion_costs())
+        return self._conversion_costs[1]
+
+    def _cached_routes(self):
+        key = self._cost_key()
+        if self._route_cache_key != key:
+            self.route_cache.clear()  # graph or conversion probabilities changed
+            self._route_cache_key = key
+        return key
+
+    def _route_names(self, path):
+        if path is None:
+            return None
+        products = self.graph.products
+        return [products[node].get_name() for node in path]
+
+    def top_products(self, k, category=None, near=None):
         """
-        Implements the A* algorithm to recommend the optimal path from initial_product to final_product
-        based on conversion probability as heuristic.
+        The k products with the highest conversion probability, best first.
+
+        Args:
+            k (int): Number of products to return
+            category (str, optional): Only consider products of this category
+            near (Product, optional): Only consider the graph neighbors of this product
+
+        With a ProductCatalog, category-wide queries read its precomputed rankings;
+        neighbor queries rank the few neighbors with np.argpartition.
         """
-        import heapq
-
-        # Build adjacency list where each product connects to all other products
-        # Cost can be defined, for example, as 1 for each transition (or other relevant criteria)
-        graph = {}
-        for product in self.products:
-            neighbors = []
-            for other_product in self.products:
-                if other_product != product:
-                    # Define transition cost as needed; here we use cost 1 as example
-                    neighbors.append((other_product, 1))
-            graph[product] = neighbors
+        graph = self.graph
+        products = graph.products
+        if near is None and isinstance(products, ProductCatalog):
+            return [products[row] for row in products.top_k(k, category).tolist()]
 
-        # Heuristic function: negative conversion probability (higher probability = lower cost)
-        def heuristic(product):
-            return -product.get_conversion_prob()
+        key = self._cost_key()
+        if self._conversion is None or self._conversion[0] != key:
+            self._conversion = (key, graph.conversion())
+        conversion = self._conversion[1]
+
+        if near is not None:
+            candidates = graph.neighbors(graph.id_of(near))[0].astype(np.int64)
+        elif category is not None:
+            candidates = np.arange(len(products))
+        else:
+            candidates = None
+        if category is not None:
+            if isinstance(products, ProductCatalog):
+                candidates = candidates[products.category_codes[candidates] == products.category_code(category)]
+            else:
+                candidates = np.array([c for c in candidates.tolist() if products[c].get_category() == category],
+                                      dtype=np.int64)
+        return [products[row] for row in top_k_rows(conversion, k, candidates).tolist()]
+
+    def prepare_landmarks(self, count=16, path=None, seed=0):
+        """
+        Precompute landmark distances for conversion_route (optional preprocessing).
+
+        When path is given, a matching index saved there is loaded instead of being
+        rebuilt, and a newly built one is saved there. Landmarks are dropped when the
+        graph or any conversion probability changes; call this again afterwards.
+        """
+        costs = self.conversion_costs()
+        landmarks = None
+        if path is not None and os.path.exists(path):
+            try:
+                landmarks = LandmarkIndex.load(path, self.graph, costs)
+            except ValueError:
+                landmarks = None  # built for another graph; rebuild below
+        if landmarks is None:
+            landmarks = LandmarkIndex.build(self.graph, costs, count, seed)
+            if path is not None:
+                landmarks.save(path)
+        self.landmarks = landmarks
+        self._landmarks_key = self._cost_key()
+        return landmarks
+
+    def conversion_route(self, initial_product, final_product, use_landmarks=True, use_cache=True,
+                         mode="astar", max_frontier=10_000):
+        """
+        Recommend the route that maximizes the product of conversion probabilities.
+
+        Each step costs its edge cost plus -log(conversion probability of the next
+        product). With prepared landmarks the search uses their admissible lower
+        bounds as heuristic; otherwise it runs as Dijkstra (zero heuristic). Routes
+        are served from and stored in route_cache unless use_cache is False.
+
+        mode selects the search per query (see route_search):
+        - "astar": A*, optimal routes
+        - "bidirectional": bidirectional Dijkstra, optimal routes with fewer expansions
+          on long routes when no landmarks are prepared
+        - "beam": A* with at most max_frontier open entries; bounded memory, but routes
+          may be suboptimal (and are not cached)
+
+        last_stats holds the expansions, peak frontier size and wall time of the search.
+        """
+        if mode not in self.SEARCH_MODES:
+            raise ValueError(f"Invalid search mode: {mode}. Must be one of {self.SEARCH_MODES}")
+        graph = self.graph
+        source, target = graph.id_of(initial_product), graph.id_of(final_product)
+        if use_cache:
+            key = (source, target, self._cached_routes())
+            path = self.route_cache.get(key, key)
+            if path is not key:
+                return self._route_names(path)
+        if self.landmarks is not None and self._landmarks_key != self._cost_key():
+            self.landmarks = None  # built for an older graph or older probabilities
+        if use_landmarks and self.landmarks is not None:
+            heuristic = self.landmarks.heuristic(target)
+        else:
+            def heuristic(node):
+                return 0.0
+
+        if mode == "bidirectional":
+            workspaces, reverse = self._reverse_search()
+            result = bidirectional(graph, source, target, workspaces, self.conversion_costs(), reverse)
+        elif mode == "beam":
+            result = beam_search(graph, source, target, heuristic, max_frontier,
+                                 self._search_workspace(), self.conversion_costs())
+        else:
+            result = astar(graph, source, target, heuristic, self._search_workspace(), self.conversion_costs())
+        self.last_stats = result.stats
+        if use_cache and mode != "beam":
+            self.route_cache.put(key, None if result.path is None else tuple(result.path))
+        return self._route_names(result.path)
+
+    def routes_from(self, initial_product, final_products):
+        """
+        Conversion routes from one product to many, sharing a single search.
 
-        open_set = []
-        heapq.heappush(open_set, (heuristic(initial_product), 0, initial_product, [initial_product]))
+        Cached routes are returned directly; the missing ones are found with one
+        Dijkstra expansion from initial_product that stops once all of them are reached
+        (see route_search.shortest_path_tree). Routes are the same as conversion_route's.
 
-        closed_set = set()
-        g_scores = {initial_product: 0}
+        Returns:
+            list: Route (list of names, or None if unreachable) for each final product
+        """
+        graph = self.graph
+        version = self._cached_routes()
+        source = graph.id_of(initial_product)
+        targets = [graph.id_of(product) for product in final_products]
+        cache = self.route_cache
+        paths = {}
+        missing = []
+        for target in targets:
+            key = (source, target, version)
+            path = cache.get(key, key)
+            if path is key:
+                missing.append(target)
+            else:
+                paths[target] = path
+
+        if missing:
+            tree = shortest_path_tree(graph, source, missing, self._search_workspace(), self.conversion_costs())
+            self.last_stats = tree.stats
+            for target, path in tree.paths.items():
+                paths[target] = None if path is None else tuple(path)
+                cache.put((source, target, version), paths[target])
+        return [self._route_names(paths[target]) for target in targets]
+
+    def route_many(self, pairs):
+        """
+        Conversion routes for many (initial, final) product pairs.
+
+        Pairs are grouped by initial product so that each source is expanded only once.
 
-        while open_set:
-            _, current_g, current, path = heapq.heappop(open_set)
+        Returns:
+            list: Route (list of names, or None) for each pair, in the order given
+        """
+        pairs = list(pairs)
+        by_source = {}
+        for position, (initial_product, final_product) in enumerate(pairs):
+            by_source.setdefault(self.graph.id_of(initial_product), []).append(position)
+        routes = [None] * len(pairs)
+        for source, positions in by_source.items():
+            found = self.routes_from(source, [pairs[position][1] for position in positions])
+            for position, route in zip(positions, found):
+                routes[position] = route
+        return routes
 
-            if current == final_product:
-                return [p.get_name() for p in path]
+    def a_star_recommendation(self, initial_product, final_product):
+        """
+        Implements the A* algorithm to recommend the optimal path from initial_product to final_product
+        based on conversion probability as heuristic.
+        """
+        graph = self.graph
+        products = graph.products
 
-            closed_set.add(current)
+        # Heuristic function: negative conversion probability (higher probability = lower cost)
+        def heuristic(node):
+            return -products[node].get_conversion_prob()
 
-            for neighbor, cost in graph.get(current, []):
-                if neighbor in closed_set:
-                    continue
-                tentative_g = current_g + cost
-                if neighbor not in g_scores or tentative_g < g_scores[neighbor]:
-                    g_scores[neighbor] = tentative_g
-                    f_score = tentative_g + heuristic(neighbor)
-                    heapq.heappush(open_set, (f_score, tentative_g, neighbor, path + [neighbor]))
+        # Integer-id search with parent pointers; see route_search.astar
+        result = astar(graph, graph.id_of(initial_product), graph.id_of(final_product),
+                       heuristic, self._search_workspace())
+        self.last_stats = result.stats
+        if result.path is not None:
+            return [products[node].get_name() for node in result.path]
 
         return None  # No path found
         
@@ -0,0 +1,552 @@
+"""
+Route Search Engine
+===================
+
+A* over a ProductGraph using integer product ids. The open set holds
+(f, g, counter, node) tuples: the insertion counter breaks ties between equal f and g
+in FIFO order, so products are never compared. Instead of carrying a copy of the path
+in every heap entry, each node records its parent when its cost improves, and the route
+is rebuilt once from the parent pointers when the target is reached. Entries made
+obsolete by a cheaper push are not removed from the heap; they are skipped when popped
+(lazy deletion).
+
+Per-node arrays live in a SearchWorkspace that is reused across queries: instead of
+clearing them, each query gets a new stamp, and a node's entries are valid only when
+its stamp matches, so starting a query costs O(1) regardless of catalog size.
+
+For one-to-many queries, shortest_path_tree runs a single Dijkstra expansion from the
+source until every requested target is settled, and RouteCache keeps recent routes in
+LRU order.
+
+Two further modes trade generality for less work on long routes:
+
+- bidirectional: Dijkstra from the source over the graph and from the target over the
+  reversed graph, stopping once the two frontiers cannot improve the best meeting point.
+  Routes are optimal; each side only explores about half the route's cost radius.
+- beam_search: A* whose open set is capped at max_frontier entries; when it overflows,
+  the worse half is dropped. Memory is bounded, but routes may be suboptimal or missed.
+
+Every search records expansions, peak frontier size and wall time in its SearchStats.
+"""
+
+import heapq
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+
+INFINITY = float('inf')
+
+
+@dataclass
+class SearchStats:
+    """Work done by one search."""
+    expanded: int = 0
+    pushed: int = 0
+    stale: int = 0
+    pruned: int = 0
+    peak_frontier: int = 0
+    seconds: float = 0.0
+
+
+@dataclass
+class SearchResult:
+    """Route found by a search (path is None when the target is unreachable)."""
+    path: Optional[List[int]]
+    cost: float
+    stats: SearchStats = field(default_factory=SearchStats)
+
+
+@dataclass
+class TreeResult:
+    """Routes from one source to several targets (None for unreachable targets)."""
+    paths: Dict[int, Optional[List[int]]]
+    costs: Dict[int, float]
+    stats: SearchStats = field(default_factory=SearchStats)
+
+
+class SearchWorkspace:
+    """Reusable per-node cost, parent and state arrays for graphs of a given size."""
+
+    def __init__(self, num_nodes):
+        self.num_nodes = num_nodes
+        self.g_scores = [0.0] * num_nodes
+        self.parents = [-1] * num_nodes
+        # seen[i] == stamp: g_scores[i]/parents[i] belong to the current query;
+        # closed[i] == stamp: node i was expanded by the current query
+        self.seen = [0] * num_nodes
+        self.closed = [0] * num_nodes
+        self.stamp = 0
+
+    def begin(self):
+        """Start a new query and return its stamp."""
+        self.stamp += 1
+        return self.stamp
+
+    def path_to(self, target):
+        """Rebuild the route ending at target from the parent pointers."""
+        path = [target]
+        parents = self.parents
+        while parents[path[-1]] != -1:
+            path.append(parents[path[-1]])
+        path.reverse()
+        return path
+
+
+def astar(graph, source, target, heuristic, workspace=None, costs=None):
+    """
+    Find a route from source to target with A*.
+
+    Expanded nodes are closed and never reopened, as in the original
+    a_star_recommendation, so routes are identical to it for the same heuristic.
+
+    Args:
+        graph (ProductGraph): Graph to search
+        source (int): Source product id
+        target (int): Target product id
+        heuristic (callable): Maps a product id to its heuristic value; nodes with an
+            infinite value (or an infinite path cost) cannot lead to the target and are
+            never pushed. If it also has a many(node_ids) method, that is used to
+            evaluate all neighbors of an expanded node in one vectorized call
+        workspace (SearchWorkspace, optional): Reusable arrays for graph.num_nodes
+        costs (np.ndarray, optional): Edge costs aligned with graph.indices (default:
+            graph.costs), e.g. graph.conversion_costs()
+
+    Returns:
+        SearchResult: Path of product ids (or None), its cost and search counters
+    """
+    began = time.perf_counter()
+    if workspace is None or workspace.num_nodes != graph.num_nodes:
+        workspace = SearchWorkspace(graph.num_nodes)
+    stamp = workspace.begin()
+    g_scores, parents = workspace.g_scores, workspace.parents
+    seen, closed = workspace.seen, workspace.closed
+    indptr, indices = graph.indptr, graph.indices
+    costs = graph.costs if costs is None else costs
+    many = getattr(heuristic, 'many', None)
+    stats = SearchStats()
+
+    g_scores[source] = 0.0
+    parents[source] = -1
+    seen[source] = stamp
+    counter = 0
+    open_set = [(heuristic(source), 0.0, counter, source)]
+    stats.pushed = 1
+
+    while open_set:
+        _, current_g, _, current = heapq.heappop(open_set)
+        if closed[current] == stamp or current_g > g_scores[current]:
+            stats.stale += 1
+            continue
+
+        if current == target:
+            stats.seconds = time.perf_counter() - began
+            return SearchResult(workspace.path_to(target), current_g, stats)
+
+        closed[current] = stamp
+        stats.expanded += 1
+
+        start, stop = indptr[current], indptr[current + 1]
+        neighbors = indices[start:stop]
+        estimates = many(neighbors).tolist() if many is not None else None
+        for position, (neighbor, cost) in enumerate(zip(neighbors.tolist(), costs[start:stop].tolist())):
+            if closed[neighbor] == stamp:
+                continue
+            tentative_g = current_g + cost
+            if seen[neighbor] != stamp or tentative_g < g_scores[neighbor]:
+                estimate = estimates[position] if estimates is not None else heuristic(neighbor)
+                if estimate == INFINITY or tentative_g == INFINITY:
+                    continue
+                seen[neighbor] = stamp
+                g_scores[neighbor] = tentative_g
+                parents[neighbor] = current
+                counter += 1
+                heapq.heappush(open_set, (tentative_g + estimate, tentative_g, counter, neighbor))
+                stats.pushed += 1
+        if len(open_set) > stats.peak_frontier:
+            stats.peak_frontier = len(open_set)
+
+    stats.seconds = time.perf_counter() - began
+    return SearchResult(None, INFINITY, stats)
+
+
+def shortest_path_tree(graph, source, targets, workspace=None, costs=None):
+    """
+    Cheapest routes from one source to many targets with a single Dijkstra expansion.
+
+    The search stops as soon as every target is settled, so the shared work is the
+    expansion up to the farthest requested target instead of one search per target.
+
+    Args:
+        graph (ProductGraph): Graph to search
+        source (int): Source product id
+        targets (iterable of int): Target product ids
+        workspace (SearchWorkspace, optional): Reusable arrays for graph.num_nodes
+        costs (np.ndarray, optional): Edge costs aligned with graph.indices
+
+    Returns:
+        TreeResult: Path and cost of every target, with search counters
+    """
+    began = time.perf_counter()
+    if workspace is None or workspace.num_nodes != graph.num_nodes:
+        workspace = SearchWorkspace(graph.num_nodes)
+    stamp = workspace.begin()
+    g_scores, parents = workspace.g_scores, workspace.parents
+    seen, closed = workspace.seen, workspace.closed
+    indptr, indices = graph.indptr, graph.indices
+    costs = graph.costs if costs is None else costs
+    stats = SearchStats()
+
+    remaining = set(targets)
+    result = TreeResult({target: None for target in remaining},
+                        {target: INFINITY for target in remaining}, stats)
+    g_scores[source] = 0.0
+    parents[source] = -1
+    seen[source] = stamp
+    counter = 0
+    open_set = [(0.0, counter, source)]
+    stats.pushed = 1
+
+    while open_set and remaining:
+        current_g, _, current = heapq.heappop(open_set)
+        if closed[current] == stamp or current_g > g_scores[current]:
+            stats.stale += 1
+            continue
+        closed[current] = stamp
+        if current in remaining:
+            remaining.discard(current)
+            result.paths[current] = workspace.path_to(current)
+            result.costs[current] = current_g
+            if not remaining:
+                break
+        stats.expanded += 1
+
+        start, stop = indptr[current], indptr[current + 1]
+        for neighbor, cost in zip(indices[start:stop].tolist(), costs[start:stop].tolist()):
+            if closed[neighbor] == stamp:
+                continue
+            tentative_g = current_g + cost
+            if tentative_g == INFINITY:
+                continue
+            if seen[neighbor] != stamp or tentative_g < g_scores[neighbor]:
+                seen[neighbor] = stamp
+                g_scores[neighbor] = tentative_g
+                parents[neighbor] = current
+                counter += 1
+                heapq.heappush(open_set, (tentative_g, counter, neighbor))
+                stats.pushed += 1
+        if len(open_set) > stats.peak_frontier:
+            stats.peak_frontier = len(open_set)
+
+    stats.seconds = time.perf_counter() - began
+    return result
+
+
+def bidirectional(graph, source, target, workspaces=None, costs=None, reverse=None):
+    """
+    Find the cheapest route with bidirectional Dijkstra.
+
+    A forward search from source and a backward search from target (over the reversed
+    graph) alternately expand whichever side has the smaller frontier. Every edge
+    relaxation that reaches a node labelled by the other side is a candidate route; the
+    search stops when the two smallest open costs add up to at least the best candidate,
+    since no later meeting point can be cheaper.
+
+    Args:
+        graph (ProductGraph): Graph to search
+        source (int): Source product id
+        target (int): Target product id
+        workspaces (tuple, optional): Two SearchWorkspace objects (forward, backward)
+        costs (np.ndarray, optional): Non-negative edge costs aligned with graph.indices
+        reverse (tuple, optional): graph.transpose(costs), when already computed
+
+    Returns:
+        SearchResult: Optimal path of product ids (or None), its cost and counters
+    """
+    began = time.perf_counter()
+    if workspaces is None or any(w.num_nodes != graph.num_nodes for w in workspaces):
+        workspaces = (SearchWorkspace(graph.num_nodes), SearchWorkspace(graph.num_nodes))
+    costs = graph.costs if costs is None else costs
+    reverse = graph.transpose(costs) if reverse is None else reverse
+    adjacency = ((graph.indptr, graph.indices, costs), reverse)
+    stats = SearchStats()
+    if source == target:
+        stats.seconds = time.perf_counter() - began
+        return SearchResult([source], 0.0, stats)
+
+    stamps = [workspace.begin() for workspace in workspaces]
+    heaps = []
+    for side, start in enumerate((source, target)):
+        workspaces[side].g_scores[start] = 0.0
+        workspaces[side].parents[start] = -1
+        workspaces[side].seen[start] = stamps[side]
+        heaps.append([(0.0, 0, start)])
+    stats.pushed = 2
+    counter = 0
+    best, meeting = INFINITY, -1
+
+    while heaps[0] and heaps[1]:
+        if heaps[0][0][0] + heaps[1][0][0] >= best:
+            break
+        side = 0 if len(heaps[0]) <= len(heaps[1]) else 1
+        workspace, other = workspaces[side], workspaces[1 - side]
+        stamp, other_stamp = stamps[side], stamps[1 - side]
+        current_g, _, current = heapq.heappop(heaps[side])
+        if workspace.closed[current] == stamp or current_g > workspace.g_scores[current]:
+            stats.stale += 1
+            continue
+        workspace.closed[current] = stamp
+        stats.expanded += 1
+
+        indptr, indices, edge_costs = adjacency[side]
+        g_scores, seen = workspace.g_scores, workspace.seen
+        start, stop = indptr[current], indptr[current + 1]
+        for neighbor, cost in zip(indices[start:stop].tolist(), edge_costs[start:stop].tolist()):
+            tentative_g = current_g + cost
+            if tentative_g == INFINITY:
+                continue
+            if seen[neighbor] != stamp or tentative_g < g_scores[neighbor]:
+                if workspace.closed[neighbor] == stamp:
+                    continue
+                seen[neighbor] = stamp
+                g_scores[neighbor] = tentative_g
+                workspace.parents[neighbor] = current
+                counter += 1
+                heapq.heappush(heaps[side], (tentative_g, counter, neighbor))
+                stats.pushed += 1
+            if other.seen[neighbor] == other_stamp:
+                candidate = g_scores[neighbor] + other.g_scores[neighbor]
+                if candidate < best:
+                    best, meeting = candidate, neighbor
+        frontier = len(heaps[0]) + len(heaps[1])
+        if frontier > stats.peak_frontier:
+            stats.peak_frontier = frontier
+
+    stats.seconds = time.perf_counter() - began
+    if meeting < 0:
+        return SearchResult(None, INFINITY, stats)
+    # The backward parents lead from the meeting point towards the target
+    path = workspaces[0].path_to(meeting) + workspaces[1].path_to(meeting)[-2::-1]
+    return SearchResult(path, best, stats)
+
+
+def beam_search(graph, source, target, heuristic, max_frontier, workspace=None, costs=None):
+    """
+    A* with a hard cap on the size of the open set.
+
+    Whenever the open set reaches max_frontier entries, only the best half (by f) is
+    kept. Dropped nodes may be rediscovered later through another parent. Memory stays
+    bounded regardless of graph size, but the route found may be more expensive than
+    the optimum, and a reachable target can be missed.
+
+    Args:
+        graph (ProductGraph): Graph to search
+        source (int): Source product id
+        target (int): Target product id
+        heuristic (callable): As for astar (a many() method is used when present)
+        max_frontier (int): Maximum number of open-set entries (at least 2)
+        workspace (SearchWorkspace, optional): Reusable arrays for graph.num_nodes
+        costs (np.ndarray, optional): Edge costs aligned with graph.indices
+
+    Returns:
+        SearchResult: Path of product ids (or None), its cost and search counters
+    """
+    if max_frontier < 2:
+        raise ValueError("max_frontier must be at least 2")
+    began = time.perf_counter()
+    if workspace is None or workspace.num_nodes != graph.num_nodes:
+        workspace = SearchWorkspace(graph.num_nodes)
+    stamp = workspace.begin()
+    g_scores, parents = workspace.g_scores, workspace.parents
+    seen, closed = workspace.seen, workspace.closed
+    indptr, indices = graph.indptr, graph.indices
+    costs = graph.costs if costs is None else costs
+    many = getattr(heuristic, 'many', None)
+    stats = SearchStats()
+    keep = max_frontier // 2
+
+    g_scores[source] = 0.0
+    parents[source] = -1
+    seen[source] = stamp
+    counter = 0
+    open_set = [(heuristic(source), 0.0, counter, source)]
+    stats.pushed = 1
+
+    while open_set:
+        _, current_g, _, current = heapq.heappop(open_set)
+        if closed[current] == stamp or seen[current] != stamp or current_g > g_scores[current]:
+            stats.stale += 1
+            continue
+
+        if current == target:
+            stats.seconds = time.perf_counter() - began
+            return SearchResult(workspace.path_to(target), current_g, stats)
+
+        closed[current] = stamp
+        stats.expanded += 1
+
+        start, stop = indptr[current], indptr[current + 1]
+        neighbors = indices[start:stop]
+        estimates = many(neighbors).tolist() if many is not None else None
+        for position, (neighbor, cost) in enumerate(zip(neighbors.tolist(), costs[start:stop].tolist())):
+            if closed[neighbor] == stamp:
+                continue
+            tentative_g = current_g + cost
+            if seen[neighbor] != stamp or tentative_g < g_scores[neighbor]:
+                estimate = estimates[position] if estimates is not None else heuristic(neighbor)
+                if estimate == INFINITY or tentative_g == INFINITY:
+                    continue
+                seen[neighbor] = stamp
+                g_scores[neighbor] = tentative_g
+                parents[neighbor] = current
+                counter += 1
+                heapq.heappush(open_set, (tentative_g + estimate, tentative_g, counter, neighbor))
+                stats.pushed += 1
+                if len(open_set) >= max_frontier:
+                    stats.peak_frontier = max_frontier
+                    open_set.sort()
+                    for _, dropped_g, _, node in open_set[keep:]:
+                        if seen[node] == stamp and dropped_g == g_scores[node]:
+                            seen[node] = 0  # forget the label so another parent can reach it again
+                    stats.pruned += len(open_set) - keep
+                    del open_set[keep:]  # a sorted list is already a valid heap
+        if len(open_set) > stats.peak_frontier:
+            stats.peak_frontier = len(open_set)
+
+    stats.seconds = time.perf_counter() - began
+    return SearchResult(None, INFINITY, stats)
+
+
+class RouteCache:
+    """
+    Least-recently-used cache of routes.
+
+    Keys are (source, target, version) tuples, where version identifies the graph and
+    cost state the route was computed for; callers clear() the cache when it changes.
+    """
+
+    def __init__(self, maxsize=100_000):
+        if maxsize < 1:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._routes = OrderedDict()
+
+    def __len__(self):
+        return len(self._routes)
+
+    def get(self, key, default=None):
+        """Return the cached route for key (marking it recently used), or default."""
+        try:
+            route = self._routes[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._routes.move_to_end(key)
+        self.hits += 1
+        return route
+
+    def put(self, key, route):
+        """Store a route, evicting the least recently used one when full."""
+        self._routes[key] = route
+        self._routes.move_to_end(key)
+        if len(self._routes) > self.maxsize:
+            self._routes.popitem(last=False)
+
+    def clear(self):
+        self._routes.clear()
+
+
+def benchmark(num_products=200_000, co_purchases=1_000_000, pages=200, targets_per_page=30,
+              requests=20_000, seed=0):
+    """
+    Throughput of product-page route requests: one source with many targets each.
+
+    Page requests follow a Zipf-like popularity, so popular pages are served from the
+    route cache after their first request.
+    """
+    import numpy as np
+
+    from produtos_eletronicos import AStarRecommendation, Product
+    from product_graph import ProductGraph
+
+    rng = np.random.default_rng(seed)
+    products = [Product(f"Product {i}", f"Category {i % 50}", float(p))
+                for i, p in enumerate(rng.uniform(0.05, 0.95, num_products))]
+    graph = ProductGraph.from_relations(products, category_neighbors=5)
+    pairs = rng.integers(0, num_products, (co_purchases, 2))
+    graph.add_edges(np.concatenate([pairs[:, 0], pairs[:, 1]]), np.concatenate([pairs[:, 1], pairs[:, 0]]))
+    recommender = AStarRecommendation(products, graph)
+
+    # Every page shows routes to related products: ones within two steps of its own
+    page_sources = rng.integers(0, num_products, pages)
+    page_targets = []
+    for source in page_sources.tolist():
+        nearby = np.concatenate([graph.neighbors(node)[0] for node in graph.neighbors(source)[0]])
+        page_targets.append([products[t] for t in rng.choice(nearby, targets_per_page).tolist()])
+    popularity = 1.0 / np.arange(1, pages + 1)
+    schedule = rng.choice(pages, requests, p=popularity / popularity.sum())
+
+    began = time.perf_counter()
+    for page in schedule[:10].tolist():
+        for target in page_targets[page]:
+            recommender.conversion_route(products[page_sources[page]], target, use_cache=False)
+    single = (time.perf_counter() - began) / (10 * targets_per_page)
+
+    began = time.perf_counter()
+    for page in schedule.tolist():
+        recommender.routes_from(products[page_sources[page]], page_targets[page])
+    elapsed = time.perf_counter() - began
+    queries = requests * targets_per_page
+    cache = recommender.route_cache
+    print(f"{num_products:,} products, {graph.num_edges:,} edges, {pages:,} pages x {targets_per_page} targets")
+    print(f"One query per pair, no cache: {1 / single:>12,.0f} routes/s")
+    print(f"Batched with route cache:     {queries / elapsed:>12,.0f} routes/s "
+          f"({cache.hits / (cache.hits + cache.misses):.1%} cache hits)")
+
+
+def compare_modes(num_products=200_000, co_purchases=1_000_000, queries=10, max_frontier=20_000,
+                  landmark_count=16, seed=0):
+    """Expansions, peak frontier and time of each conversion_route search mode on long routes."""
+    import numpy as np
+
+    from produtos_eletronicos import AStarRecommendation, Product
+    from product_graph import ProductGraph
+
+    rng = np.random.default_rng(seed)
+    products = [Product(f"Product {i}", f"Category {i % 50}", float(p))
+                for i, p in enumerate(rng.uniform(0.05, 0.95, num_products))]
+    graph = ProductGraph.from_relations(products, category_neighbors=5)
+    pairs = rng.integers(0, num_products, (co_purchases, 2))
+    graph.add_edges(np.concatenate([pairs[:, 0], pairs[:, 1]]), np.concatenate([pairs[:, 1], pairs[:, 0]]))
+    recommender = AStarRecommendation(products, graph)
+    pairs = rng.integers(0, num_products, (queries, 2)).tolist()
+    optimal = {}
+
+    print(f"{num_products:,} products, {graph.num_edges:,} edges, {queries} random routes")
+    print(f"{'Mode':>24} | {'Expanded':>9} | {'Peak frontier':>13} | {'ms/query':>8} | {'Found':>5} | {'Optimal':>7}")
+    modes = [("astar", False), ("bidirectional", False), ("beam", False), ("astar", True), ("beam", True)]
+    for mode, use_landmarks in modes:
+        if use_landmarks and recommender.landmarks is None:
+            recommender.prepare_landmarks(landmark_count)
+        expanded = peak = seconds = found = matches = 0
+        for source, target in pairs:
+            route = recommender.conversion_route(products[source], products[target], use_landmarks=use_landmarks,
+                                                 use_cache=False, mode=mode, max_frontier=max_frontier)
+            stats = recommender.last_stats
+            expanded += stats.expanded
+            peak = max(peak, stats.peak_frontier)
+            seconds += stats.seconds
+            optimal.setdefault((source, target), route)
+            found += route is not None
+            matches += route == optimal[(source, target)]
+        label = mode + (" + landmarks" if use_landmarks else "")
+        print(f"{label:>24} | {expanded // queries:>9,} | {peak:>13,} | "
+              f"{seconds / queries * 1000:>8.1f} | {found:>5} | {matches:>7}")
+
+
+if __name__ == "__main__":
+    benchmark()
+    compare_modes()
@@ -0,0 +1,73 @@
+"""
+Inference Scaling Benchmark
+===========================
+
+Compares ExpertSystem.infer (indexed forward chaining) with the original rule-rescanning
+algorithm, kept as ExpertSystem.infer_naive, on synthetic rule bases of growing size.
+
+Every generated rule concludes a new fact from two to four derivable earlier facts; a
+few rules also need a fact that is never asserted and stay dormant. Rules are shuffled,
+which makes the naive algorithm need many passes before its closure stops growing. Both
+engines must reach the same closure.
+"""
+
+import random
+import time
+
+from specialist_system import ExpertSystem, KnowledgeBase
+
+
+def make_knowledge_base(num_rules, num_facts=50, unknown_share=0.05, seed=0):
+    """Random knowledge base with num_facts initial facts and num_rules shuffled rules."""
+    rng = random.Random(seed)
+    kb = KnowledgeBase()
+    for index in range(num_facts):
+        kb.add_fact(f"fact {index}")
+
+    derivable = [f"fact {index}" for index in range(num_facts)]
+    rules = []
+    for index in range(num_rules):
+        premises = [rng.choice(derivable) for _ in range(rng.randint(2, 4))]
+        conclusion = f"fact {num_facts + index}"
+        if rng.random() < unknown_share:
+            premises.append(f"unknown {index}")
+        else:
+            derivable.append(conclusion)
+        rules.append((premises, conclusion))
+    rng.shuffle(rules)
+    for condition, conclusion in rules:
+        kb.add_rule(condition, conclusion)
+    return kb
+
+
+def _time_inference(kb, method):
+    system = ExpertSystem(kb)
+    began = time.perf_counter()
+    getattr(system, method)()
+    return time.perf_counter() - began
+
+
+def benchmark(sizes=(100, 300, 1_000, 3_000, 10_000, 30_000, 100_000), naive_limit=3_000):
+    """
+    Print inference time of both engines for each rule-base size.
+
+    The naive engine only runs up to naive_limit rules, since its cost grows roughly
+    with passes x rules x premises x facts.
+    """
+    print(f"{'Rules':>8} | {'Facts':>8} | {'Naive (s)':>10} | {'Indexed (s)':>11} | {'Speedup':>8}")
+    for size in sizes:
+        indexed_kb = make_knowledge_base(size)
+        indexed = _time_inference(indexed_kb, 'infer')
+        if size <= naive_limit:
+            naive_kb = make_knowledge_base(size)
+            naive = _time_inference(naive_kb, 'infer_naive')
+            if set(naive_kb.facts) != set(indexed_kb.facts):
+                raise AssertionError(f"Closures differ for {size} rules")
+            naive_text, speedup_text = f"{naive:>10.3f}", f"{naive / indexed:>7.0f}x"
+        else:
+            naive_text, speedup_text = f"{'-':>10}", f"{'-':>8}"
+        print(f"{size:>8,} | {len(indexed_kb.facts):>8,} | {naive_text} | {indexed:>11.4f} | {speedup_text}")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -1,3 +1,6 @@
+from collections import defaultdict, deque
+
+
 class KnowledgeBase:
     def __init__(self):
         self.facts = []
@@ -14,6 +17,42 @@ class ExpertSystem:
         self.knowledge_base = knowledge_base
 
     def infer(self):
+        # Forward chaining driven by an agenda of newly asserted facts. Each rule keeps a
+        # counter of premises not yet known, and each fact lists the rules that use it as
+        # a premise, so a rule is only touched when one of its premises becomes known:
+        # O(facts + total premises) instead of rescanning every rule on every pass.
+        facts = self.knowledge_base.facts
+        rules = self.knowledge_base.rules
+        known = set(facts)
+        rules_by_premise = defaultdict(list)
+        remaining = []
+        for index, (condition, _) in enumerate(rules):
+            premises = set(condition)
+            remaining.append(len(premises))
+            for premise in premises:
+                rules_by_premise[premise].append(index)
+
+        agenda = deque(dict.fromkeys(facts))
+
+        def assert_fact(fact):
+            if fact not in known:
+                known.add(fact)
+                facts.append(fact)
+                agenda.append(fact)
+
+        for index, (condition, conclusion) in enumerate(rules):
+            if not remaining[index]:
+                assert_fact(conclusion)  # rules without premises always fire
+        while agenda:
+            fact = agenda.popleft()
+            for index in rules_by_premise.get(fact, ()):
+                remaining[index] -= 1
+                if not remaining[index]:
+                    assert_fact(rules[index][1])
+
+    def infer_naive(self):
+        # Original algorithm: rescan every rule until a pass adds nothing. Reaches the same
+        # closure as infer(), kept as a reference for tests and benchmarks
         new_facts_found = True
         while new_facts_found:
             new_facts_found = False
@@ -23,23 +62,24 @@ class ExpertSystem:
                         self.knowledge_base.facts.append(conclusion)
                         new_facts_found = True
 
-# Creating the knowledge base
-kb = KnowledgeBase()
+if __name__ == "__main__":
+    # Creating the knowledge base
+    kb = KnowledgeBase()
 
-# Adding facts
-kb.add_fact("high fever")
-kb.add_fact("cough")
+    # Adding facts
+    kb.add_fact("high fever")
+    kb.add_fact("cough")
 
-# Adding rules
-kb.add_rule(["high fever", "cough"], "respiratory infection")
-kb.add_rule(["respiratory infection", "difficulty breathing"], "pneumonia")
+    # Adding rules
+    kb.add_rule(["high fever", "cough"], "respiratory infection")
+    kb.add_rule(["respiratory infection", "difficulty breathing"], "pneumonia")
 
-# Creating the expert system
-system = ExpertSystem(kb)
+    # Creating the expert system
+    system = ExpertSystem(kb)
 
-# Running inference
-system.infer()
+    # Running inference
+    system.infer()
 
-# Displaying the updated facts
-print("Inferred facts:")
-print(kb.facts)
\ No newline at end of file
+    # Displaying the updated facts
+    print("Inferred facts:")
+    print(kb.facts)
\ No newline at end of file
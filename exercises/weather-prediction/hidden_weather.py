@@ -0,0 +1,311 @@
+"""
+Hidden Markov Model Mode
+========================
+
+Extends WeatherPredictor to the case where the weather itself is hidden and only noisy
+sensor categories (e.g. humidity or pressure bands) are observed. The predictor's
+transition matrix drives the hidden chain and an emission matrix gives
+P(observation | state).
+
+Forward filtering, forward-backward smoothing and Viterbi decoding all work in log
+space and are vectorized across a batch of independent sequences: the only Python loop
+runs over time steps, and each step processes every sequence at once. Per-step arrays
+are laid out state-major (n_states x sequences) so every reduction over states runs
+along contiguous memory. Observations are integer codes into the observation list,
+with -1 marking a missing reading.
+"""
+
+import numpy as np
+
+from weather_predictor import WeatherPredictor, _state_dtype
+
+
+class HiddenWeatherModel:
+    """
+    Hidden Markov Model over the states of a WeatherPredictor.
+
+    Attributes:
+        predictor (WeatherPredictor): Hidden chain (its transition matrix is reused)
+        observations (list): Observation category names
+        emission_matrix (np.ndarray): (n_states x n_observations) matrix,
+            P(observation j | state i) in row i
+        initial_distribution (np.ndarray): Distribution of the first hidden state
+    """
+
+    def __init__(self, emission_matrix, observations, predictor=None, initial_distribution=None):
+        """
+        Args:
+            emission_matrix (array-like): Row-stochastic (n_states x n_observations) matrix
+            observations (list): Observation category names
+            predictor (WeatherPredictor, optional): Hidden chain; defaults to the
+                three-state WeatherPredictor
+            initial_distribution (array-like, optional): First-state distribution;
+                defaults to the chain's steady state
+        """
+        self.predictor = predictor if predictor is not None else WeatherPredictor()
+        self.observations = list(observations)
+        self.observation_index = {name: i for i, name in enumerate(self.observations)}
+        n_states = len(self.predictor.states)
+
+        emission_matrix = np.array(emission_matrix, dtype=np.float64)
+        if emission_matrix.shape != (n_states, len(self.observations)):
+            raise ValueError(f"Emission matrix must be {n_states} x {len(self.observations)}, "
+                             f"got {emission_matrix.shape}")
+        if (emission_matrix < 0).any() or not np.allclose(emission_matrix.sum(axis=1), 1.0):
+            raise ValueError("Emission matrix rows must be non-negative and sum to 1")
+        self.emission_matrix = emission_matrix
+
+        if initial_distribution is None:
+            steady = self.predictor.steady_state_distribution()
+            initial_distribution = [steady[state] for state in self.predictor.states]
+        initial_distribution = np.asarray(initial_distribution, dtype=np.float64)
+        if initial_distribution.shape != (n_states,) or not np.isclose(initial_distribution.sum(), 1.0):
+            raise ValueError("Initial distribution must have one probability per state and sum to 1")
+        self.initial_distribution = initial_distribution
+
+        with np.errstate(divide='ignore'):
+            self._log_transitions = np.log(self.predictor._dense_matrix())
+            self._log_initial = np.log(initial_distribution)
+            # The extra all-zero column is selected by code -1: a missing reading is
+            # equally likely under every state
+            self._log_emissions = np.hstack([np.log(emission_matrix), np.zeros((n_states, 1))])
+        self._transitions_t = np.ascontiguousarray(self.predictor._dense_matrix().T)
+
+    def encode(self, observations):
+        """
+        Convert observation names to codes.
+
+        Args:
+            observations (list or nested list of str): Names; None marks a missing reading
+
+        Returns:
+            np.ndarray: int64 codes with -1 for missing readings
+        """
+        lookup = dict(self.observation_index)
+        lookup[None] = -1
+        try:
+            return np.vectorize(lookup.__getitem__, otypes=[np.int64])(np.asarray(observations, dtype=object))
+        except KeyError as error:
+            raise ValueError(f"Invalid observation: {error.args[0]}") from None
+
+    def _prepare(self, observations):
+        """Validate codes and lay them out time-major as (days x sequences)."""
+        codes = np.asarray(observations)
+        single = codes.ndim == 1
+        if single:
+            codes = codes[None, :]
+        if codes.ndim != 2 or codes.shape[1] == 0:
+            raise ValueError("Observations must be a non-empty sequence or (sequences x days) array")
+        if codes.min() < -1 or codes.max() >= len(self.observations):
+            raise ValueError(f"Observation codes must be in [-1, {len(self.observations) - 1}]")
+        return np.ascontiguousarray(codes.T), single
+
+    def _emissions(self, codes):
+        """Log emission probabilities of one day, state-major (n_states x sequences)."""
+        return np.take(self._log_emissions, codes, axis=1)
+
+    @staticmethod
+    def _propagate(log_vectors, matrix):
+        """log(matrix @ exp(log_vectors)), shifted by each sequence's maximum."""
+        shift = log_vectors.max(axis=0)
+        shift[~np.isfinite(shift)] = 0.0
+        with np.errstate(divide='ignore'):
+            return np.log(matrix @ np.exp(log_vectors - shift)) + shift
+
+    def _forward(self, codes, keep=True):
+        """Log forward variables log P(o_1..o_t, s_t) for every day (if keep) and the last day."""
+        days, sequences = codes.shape
+        alphas = np.empty((days, len(self.predictor.states), sequences)) if keep else None
+        alpha = self._log_initial[:, None] + self._emissions(codes[0])
+        if keep:
+            alphas[0] = alpha
+        for day in range(1, days):
+            alpha = self._propagate(alpha, self._transitions_t)
+            alpha += self._emissions(codes[day])
+            if keep:
+                alphas[day] = alpha
+        return alphas, alpha
+
+    def log_likelihood(self, observations):
+        """
+        Log-likelihood of each observation sequence, in O(sequences x states) memory.
+
+        Args:
+            observations (array-like of int): One sequence or (sequences x days) codes
+
+        Returns:
+            float or np.ndarray: log P(observations) per sequence
+        """
+        codes, single = self._prepare(observations)
+        _, alpha = self._forward(codes, keep=False)
+        result = _log_sum(alpha, axis=0)
+        return result[0] if single else result
+
+    def filter(self, observations):
+        """
+        Forward filtering: P(state on day t | observations up to day t).
+
+        The forward pass is streamed: only the running alpha (n_states x sequences) is
+        kept, and each day's normalized distribution is written straight into the
+        result, so memory beyond the output itself does not grow with the number of days.
+
+        Args:
+            observations (array-like of int): One sequence or (sequences x days) codes
+
+        Returns:
+            tuple: (filtered, log_likelihood) with filtered shaped (sequences x days x
+            n_states), or (days x n_states) for a single sequence
+        """
+        codes, single = self._prepare(observations)
+        days, sequences = codes.shape
+        filtered = np.empty((sequences, days, len(self.predictor.states)))
+        alpha = self._log_initial[:, None] + self._emissions(codes[0])
+        for day in range(days):
+            if day:
+                alpha = self._propagate(alpha, self._transitions_t)
+                alpha += self._emissions(codes[day])
+            filtered[:, day, :] = np.exp(alpha - _log_sum(alpha, axis=0)).T
+        log_likelihood = _log_sum(alpha, axis=0)
+        if single:
+            return filtered[0], log_likelihood[0]
+        return filtered, log_likelihood
+
+    def smooth(self, observations):
+        """
+        Forward-backward smoothing: P(state on day t | all observations).
+
+        Unlike filter(), the backward pass needs every forward variable, so memory is
+        O(sequences x days x n_states) on top of the output; split very large batches.
+
+        Args:
+            observations (array-like of int): One sequence or (sequences x days) codes
+
+        Returns:
+            np.ndarray: Posteriors shaped (sequences x days x n_states), or (days x
+            n_states) for a single sequence
+        """
+        codes, single = self._prepare(observations)
+        posteriors, _ = self._forward(codes)
+        beta = np.zeros(posteriors.shape[1:])
+        transitions = self.predictor._dense_matrix()
+        for day in range(codes.shape[0] - 1, -1, -1):
+            posteriors[day] += beta
+            if day:
+                beta = self._propagate(beta + self._emissions(codes[day]), transitions)
+        posteriors = np.exp(posteriors - _log_sum(posteriors, axis=1)[:, None, :]).transpose(2, 0, 1)
+        return posteriors[0] if single else posteriors
+
+    def viterbi(self, observations):
+        """
+        Most likely hidden state path of each sequence (max-product in log space).
+
+        Back-pointers are stored with the smallest integer type that fits the states,
+        one per (day, state, sequence). Each step keeps a running maximum over the
+        previous state instead of materializing an (n x n x sequences) score array.
+
+        Args:
+            observations (array-like of int): One sequence or (sequences x days) codes
+
+        Returns:
+            tuple: (paths, log_probability) with paths as state indices shaped
+            (sequences x days), or (days,) for a single sequence
+        """
+        codes, single = self._prepare(observations)
+        days, sequences = codes.shape
+        n_states = len(self.predictor.states)
+        dtype = _state_dtype(n_states)
+
+        # column i of log_transitions_t holds log P(next state | previous state i)
+        log_transitions_t = np.ascontiguousarray(self._log_transitions.T)[:, :, None]
+        back_pointers = np.zeros((days, n_states, sequences), dtype=dtype)
+        delta = self._log_initial[:, None] + self._emissions(codes[0])
+        for day in range(1, days):
+            best = delta[0] + log_transitions_t[:, 0]
+            pointers = back_pointers[day]
+            for previous in range(1, n_states):
+                candidate = delta[previous] + log_transitions_t[:, previous]
+                # strict comparison keeps the lowest index on ties, like argmax
+                np.copyto(pointers, previous, where=candidate > best)
+                np.maximum(best, candidate, out=best)
+            best += self._emissions(codes[day])
+            delta = best
+
+        paths = np.empty((days, sequences), dtype=dtype)
+        paths[-1] = delta.argmax(axis=0)
+        columns = np.arange(sequences)
+        for day in range(days - 1, 0, -1):
+            paths[day - 1] = back_pointers[day, paths[day], columns]
+        log_probability = delta.max(axis=0)
+        if single:
+            return paths[:, 0], log_probability[0]
+        return np.ascontiguousarray(paths.T), log_probability
+
+    def decode(self, observations):
+        """Viterbi path of a single sequence of observation names, as state names."""
+        path, _ = self.viterbi(self.encode(observations))
+        return [self.predictor.states[i] for i in path]
+
+    def sample(self, initial_state, days, sequences, seed=None):
+        """
+        Simulate hidden paths with predict_ensemble and draw an observation for each day.
+
+        Args:
+            initial_state (str): Hidden state on day 0
+            days (int): Days per sequence (including day 0)
+            sequences (int): Number of independent sequences
+            seed (int, optional): Seed for reproducible draws
+
+        Returns:
+            tuple: (states, observations), both (sequences x days) index arrays
+        """
+        rng = np.random.default_rng(seed)
+        states = self.predictor.predict_ensemble(initial_state, days, sequences,
+                                                 seed=rng.integers(2 ** 63)).states
+        cumulative = np.cumsum(self.emission_matrix, axis=1)
+        cumulative[:, -1] = 1.0
+        draws = rng.random(states.shape)
+        observations = np.empty(states.shape, dtype=np.int64)
+        for state in range(len(self.predictor.states)):
+            mask = states == state
+            observations[mask] = np.searchsorted(cumulative[state], draws[mask], side='right')
+        return states, observations
+
+
+def _log_sum(log_values, axis):
+    """log(sum(exp(log_values))) over one axis, with -inf where every term is -inf."""
+    shift = np.expand_dims(log_values.max(axis=axis), axis)
+    shift[~np.isfinite(shift)] = 0.0
+    with np.errstate(divide='ignore'):
+        return np.log(np.exp(log_values - shift).sum(axis=axis)) + np.squeeze(shift, axis)
+
+
+def main():
+    import time
+
+    # Humidity bands seen by a sensor: rain is usually humid, sun usually dry
+    model = HiddenWeatherModel(
+        emission_matrix=[
+            [0.6, 0.3, 0.1],  # Sunny
+            [0.3, 0.4, 0.3],  # Cloudy
+            [0.1, 0.3, 0.6],  # Rainy
+        ],
+        observations=['Dry', 'Moderate', 'Humid'],
+    )
+
+    readings = ['Dry', 'Dry', 'Humid', 'Humid', None, 'Humid', 'Moderate', 'Dry', 'Dry']
+    print("Readings:       ", readings)
+    print("Decoded weather:", model.decode(readings))
+    filtered, log_likelihood = model.filter(model.encode(readings))
+    print(f"Filtered P(Rainy) on the last day: {filtered[-1, 2]:.1%} "
+          f"(log-likelihood {log_likelihood:.3f})")
+
+    states, observations = model.sample('Sunny', days=10_000, sequences=1_000, seed=42)
+    began = time.perf_counter()
+    paths, _ = model.viterbi(observations)
+    elapsed = time.perf_counter() - began
+    print(f"\nViterbi over {observations.size:,} observations: {elapsed:.2f}s, "
+          f"{(paths == states).mean():.1%} of hidden states recovered")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Process-Parallel Ensemble Forecasts
+===================================
+
+Runs WeatherPredictor.predict_ensemble across a process pool for simulations too large
+for one core (e.g. a million members over a year). Members are split into shards, and
+each shard draws from its own stream spawned from one np.random.SeedSequence, so streams
+never overlap and no worker touches the global np.random state.
+
+Workers never send paths back. Each shard reduces its paths to per-day state counts
+and to histograms of how many days each member spent in each state; the parent sums
+those integer arrays. Results depend only on the seed and the number of shards, which
+defaults to the number of workers, so they are bit-identical across runs.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from weather_predictor import WeatherPredictor
+
+
+@dataclass
+class ParallelEnsembleResult:
+    """
+    Reduced result of run_parallel_ensemble.
+
+    Attributes:
+        state_names (list): State name for each index
+        members (int): Total number of ensemble members
+        counts (np.ndarray): int64 (days x n_states) number of members in each state per day
+        day_histograms (np.ndarray): int64 (n_states x days + 1); entry [s, k] is the number
+            of members that spent exactly k days in state s
+        workers (int): Processes used
+        seconds (float): Wall-clock time of the run
+        shard_seconds (list): Simulation time of each shard inside its worker
+    """
+    state_names: list
+    members: int
+    counts: np.ndarray
+    day_histograms: np.ndarray
+    workers: int
+    seconds: float
+    shard_seconds: list = field(default_factory=list)
+
+    @property
+    def frequencies(self):
+        """np.ndarray: (days x n_states) fraction of members in each state per day."""
+        return self.counts / self.members
+
+    def frequency_dict(self, day):
+        """Return the state frequencies of one day as {state: fraction}."""
+        return {state: freq for state, freq in zip(self.state_names, self.frequencies[day])}
+
+    def mean_days(self):
+        """Average number of days each member spends in each state, as {state: days}."""
+        days = np.arange(self.day_histograms.shape[1])
+        means = self.day_histograms @ days / self.members
+        return {state: float(mean) for state, mean in zip(self.state_names, means)}
+
+    @property
+    def utilization(self):
+        """float: Fraction of the workers' wall-clock capacity spent simulating."""
+        capacity = self.seconds * self.workers
+        return sum(self.shard_seconds) / capacity if capacity > 0 else 0.0
+
+
+def _run_shard(predictor, initial_state, days, members, seed_sequence, chunk_members, block_days):
+    """Simulate one shard in member chunks and reduce it to counts and histograms."""
+    began = time.perf_counter()
+    n_states = len(predictor.states)
+    counts = np.zeros((days, n_states), dtype=np.int64)
+    day_histograms = np.zeros((n_states, days + 1), dtype=np.int64)
+
+    chunk_sizes = [min(chunk_members, members - start) for start in range(0, members, chunk_members)]
+    for size, chunk_seed in zip(chunk_sizes, seed_sequence.spawn(len(chunk_sizes))):
+        states = predictor.predict_ensemble(initial_state, days, size, seed=chunk_seed,
+                                            block_days=block_days).states
+        for state in range(n_states):
+            in_state = states == state
+            counts[:, state] += in_state.sum(axis=0)
+            day_histograms[state] += np.bincount(in_state.sum(axis=1), minlength=days + 1)
+    return counts, day_histograms, time.perf_counter() - began
+
+
+def run_parallel_ensemble(predictor, initial_state, days, members, workers=None, seed=None,
+                          shards=None, chunk_members=100_000, block_days=32):
+    """
+    Simulate a large ensemble across processes and reduce it to summary statistics.
+
+    Args:
+        predictor (WeatherPredictor): Chain to simulate
+        initial_state (str): Starting weather state for every member
+        days (int): Number of days per path, including the initial day
+        members (int): Total number of ensemble members
+        workers (int, optional): Number of processes (default: number of CPUs)
+        seed (int, optional): Root seed; each shard gets SeedSequence(seed).spawn()
+        shards (int, optional): Number of member shards (default: workers); fixing it
+            makes results independent of the worker count
+        chunk_members (int): Members simulated at once inside a shard (bounds memory)
+        block_days (int): Days of uniform draws generated per block
+
+    Returns:
+        ParallelEnsembleResult: Per-day state counts, day histograms and timings
+    """
+    if initial_state not in predictor.state_index:
+        raise ValueError(f"Invalid state: {initial_state}. Must be one of {predictor.states}")
+    if days < 1 or members < 1:
+        raise ValueError("days and members must be positive")
+    workers = workers or os.cpu_count() or 1
+    shards = min(shards or workers, members)
+    began = time.perf_counter()
+
+    shard_members = [members // shards + (index < members % shards) for index in range(shards)]
+    seeds = np.random.SeedSequence(seed).spawn(shards)
+    arguments = [(predictor, initial_state, days, size, shard_seed, chunk_members, block_days)
+                 for size, shard_seed in zip(shard_members, seeds)]
+
+    if workers == 1:
+        outputs = [_run_shard(*args) for args in arguments]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outputs = list(pool.map(_run_shard, *zip(*arguments)))
+
+    return ParallelEnsembleResult(
+        state_names=list(predictor.states),
+        members=members,
+        counts=sum(output[0] for output in outputs),
+        day_histograms=sum(output[1] for output in outputs),
+        workers=workers,
+        seconds=time.perf_counter() - began,
+        shard_seconds=[output[2] for output in outputs],
+    )
+
+
+def benchmark(days=365, members=1_000_000, max_workers=None, seed=42):
+    """
+    Report speedup and scaling efficiency for 1, 2, 4, ... workers.
+
+    Every run uses the same number of shards, so all of them produce identical counts;
+    efficiency is the speedup over one worker divided by the number of workers.
+    """
+    predictor = WeatherPredictor()
+    max_workers = max_workers or os.cpu_count() or 1
+    worker_counts = []
+    workers = 1
+    while workers <= max_workers:
+        worker_counts.append(workers)
+        workers *= 2
+    shards = worker_counts[-1]
+
+    baseline = None
+    reference = None
+    print(f"{members:,} members x {days} days, {shards} shards")
+    print(f"{'Workers':>8} | {'Seconds':>8} | {'Speedup':>8} | {'Efficiency':>10} | {'Utilization':>11}")
+    for workers in worker_counts:
+        result = run_parallel_ensemble(predictor, "Sunny", days, members, workers=workers,
+                                       seed=seed, shards=shards)
+        if reference is None:
+            baseline, reference = result.seconds, result
+        elif not np.array_equal(result.counts, reference.counts):
+            raise AssertionError("Results changed with the number of workers")
+        speedup = baseline / result.seconds
+        print(f"{workers:>8} | {result.seconds:>8.2f} | {speedup:>7.2f}x | "
+              f"{speedup / workers:>10.1%} | {result.utilization:>11.1%}")
+    return reference
+
+
+def main():
+    result = benchmark()
+    print("\nAverage days per member:")
+    for state, days in result.mean_days().items():
+        print(f"  {state}: {days:.1f}")
+    print("Last-day frequencies: " + ", ".join(
+        f"{state} {freq:.1%}" for state, freq in result.frequency_dict(-1).items()))
+
+
+if __name__ == "__main__":
+    main()
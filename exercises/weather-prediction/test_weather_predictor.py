@@ -0,0 +1,46 @@
+"""
+Regression tests for WeatherPredictor.predict_ensemble.
+"""
+
+from bisect import bisect_right
+
+import numpy as np
+
+from weather_predictor import WeatherPredictor
+
+
+class _ConstantDraws:
+    """Stand-in generator whose uniform draws all equal one value."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def random(self, shape):
+        return np.full(shape, self.value)
+
+
+def test_largest_draw_stays_in_its_row():
+    # 1 + (1 - 2**-53) rounds to 2.0, which used to land in the next row
+    predictor = WeatherPredictor()
+    predictor.rng = _ConstantDraws(1 - 2**-53)
+    for index, state in enumerate(predictor.states):
+        forecast = predictor.predict_ensemble(state, days=3, members=4)
+        assert forecast.states[:, 0].tolist() == [index] * 4
+        assert (forecast.states[:, 1:] == len(predictor.states) - 1).all()
+
+
+def test_small_steps_survive_row_offset():
+    # In row 599, a step of 1e-14 is below ulp(599) and vanished once offset by the row
+    n_states = 600
+    matrix = np.full((n_states, n_states), 1 / n_states)
+    matrix[-1] = (1 - 1e-14) / (n_states - 1)
+    matrix[-1, 0] = 1e-14
+    predictor = WeatherPredictor([f"s{index}" for index in range(n_states)], matrix)
+    predictor.rng = _ConstantDraws(5e-15)
+
+    forecast = predictor.predict_ensemble(f"s{n_states - 1}", days=2, members=3)
+
+    cumulative = np.cumsum(matrix[-1])
+    cumulative[-1] = 1.0
+    assert bisect_right(cumulative.tolist(), 5e-15) == 0
+    assert forecast.states[:, 1].tolist() == [0] * 3
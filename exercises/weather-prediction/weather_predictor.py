@@ -1,25 +1,260 @@
 import numpy as np
-import random
+from bisect import bisect_right
+from dataclasses import dataclass
+
+try:
+    from scipy import sparse
+except ImportError:  # scipy is only required for sparse transition matrices
+    sparse = None
+
+
+@dataclass
+class EnsembleForecast:
+    """
+    Result of WeatherPredictor.predict_ensemble.
+
+    Attributes:
+        states (np.ndarray): (members x days) matrix of state indices, int8 for up to 127
+            states (wider integer types beyond that); column 0 is the initial state,
+            matching the layout of predict_sequence
+        frequencies (np.ndarray): (days x n_states) fraction of members in each state per day
+        state_names (list): State name for each index
+    """
+    states: np.ndarray
+    frequencies: np.ndarray
+    state_names: list
+
+    def frequency_dict(self, day):
+        """Return the state frequencies of one day as {state: fraction}."""
+        return {state: freq for state, freq in zip(self.state_names, self.frequencies[day])}
+
+
+class ForecastStream:
+    """
+    Lazy forecast returned by WeatherPredictor.stream_forecast.
+
+    Iterating yields one state name per day, starting with the initial state as in
+    predict_sequence, until a stop condition is met (or forever if there is none).
+    Uniform draws are generated chunk_days at a time, and the counters below are
+    updated as each day is produced, so no sequence is ever stored.
+
+    Attributes:
+        days (int): Days yielded so far
+        current_state (str): Most recent state, or None before the first day
+        current_run (int): Length of the run of current_state ending today
+        stopped (str): Stop condition that ended the stream ('state', 'run' or
+            'max_days'), or None while it is still running
+    """
+
+    def __init__(self, predictor, initial_state, stop_at=None, stop_after_run=None,
+                 max_days=None, rng=None, chunk_days=1024):
+        if chunk_days < 1:
+            raise ValueError("chunk_days must be positive")
+        self.predictor = predictor
+        self.days = 0
+        self.current_state = None
+        self.current_run = 0
+        self.stopped = None
+
+        n_states = len(predictor.states)
+        self._initial = predictor.state_index[initial_state]
+        self._stop_index = predictor.state_index[stop_at] if stop_at is not None else None
+        if stop_after_run is not None:
+            run_state, run_length = stop_after_run
+            self._run_stop = (predictor.state_index[run_state], run_length)
+        else:
+            self._run_stop = None
+        self._max_days = max_days
+        self._rng = rng
+        self._chunk_days = chunk_days
+
+        self._counts = [0] * n_states
+        self._runs = [0] * n_states
+        self._run_days = [0] * n_states
+        self._longest_runs = [0] * n_states
+        self._current_index = None
+        self._generator = self._generate()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._generator)
+
+    def _step_function(self):
+        """Map (state index, uniform draw) to the next state index."""
+        predictor = self.predictor
+        if predictor.is_sparse:
+            indptr, indices, accept, alias = predictor._alias_tables()
+
+            def step(current, draw):
+                start = indptr[current]
+                scaled = draw * (indptr[current + 1] - start)
+                slot = int(scaled)
+                position = start + slot
+                return int(indices[position] if scaled - slot < accept[position] else alias[position])
+            return step
+
+        # Same cumulative rows as predict_ensemble, as plain lists for bisect
+        cumulative = np.cumsum(predictor.transition_matrix, axis=1)
+        cumulative[:, -1] = 1.0
+        rows = cumulative.tolist()
+
+        def step(current, draw):
+            return bisect_right(rows[current], draw)
+        return step
+
+    def _record(self, index):
+        """Update the running counts and run-length statistics with one day."""
+        self.days += 1
+        self._counts[index] += 1
+        if index == self._current_index:
+            self.current_run += 1
+        else:
+            self._current_index = index
+            self.current_run = 1
+            self._runs[index] += 1
+            self.current_state = self.predictor.states[index]
+        self._run_days[index] += 1
+        if self.current_run > self._longest_runs[index]:
+            self._longest_runs[index] = self.current_run
+
+    def _stop_reason(self, index):
+        if self._stop_index is not None and index == self._stop_index:
+            return 'state'
+        if self._run_stop is not None and index == self._run_stop[0] and self.current_run >= self._run_stop[1]:
+            return 'run'
+        if self._max_days is not None and self.days >= self._max_days:
+            return 'max_days'
+        return None
+
+    def _generate(self):
+        states = self.predictor.states
+        step = self._step_function()
+        current = self._initial
+        while True:
+            for draw in self._rng.random(self._chunk_days).tolist():
+                self._record(current)
+                yield states[current]
+                self.stopped = self._stop_reason(current)
+                if self.stopped:
+                    return
+                current = step(current, draw)
+
+    def state_counts(self):
+        """Days spent in each state so far, as {state: days}."""
+        return dict(zip(self.predictor.states, self._counts))
+
+    def run_statistics(self):
+        """
+        Run-length statistics of each state so far (the current run included).
+
+        Returns:
+            dict: {state: {'runs': count, 'mean_length': days, 'longest': days}}
+        """
+        return {
+            state: {
+                'runs': runs,
+                'mean_length': run_days / runs if runs else 0.0,
+                'longest': longest,
+            }
+            for state, runs, run_days, longest in zip(
+                self.predictor.states, self._runs, self._run_days, self._longest_runs)
+        }
+
 
 class WeatherPredictor:
     """
     A Markov Chain-based weather prediction system.
 
-    States: Sunny, Cloudy, Rainy
+    States: Sunny, Cloudy, Rainy by default, or any list of N states with an N x N
+    transition matrix. The matrix may be a dense NumPy array or a SciPy sparse matrix;
+    sparse matrices are stored in CSR form so memory scales with the number of
+    non-zero transitions, sampling uses per-row alias tables (O(1) per draw) and the
+    steady state comes from an iterative sparse eigensolver.
+
+    Derived tables are cached per matrix object: assign a new transition_matrix
+    instead of modifying it in place.
     """
 
-    def __init__(self):
-        # Define weather states
-        self.states = ['Sunny', 'Cloudy', 'Rainy']
+    def __init__(self, states=None, transition_matrix=None, rng=None):
+        """
+        Args:
+            states (list, optional): State names; defaults to Sunny, Cloudy, Rainy
+            transition_matrix (array-like or scipy.sparse matrix, optional): Row-stochastic
+                N x N matrix; required when states is given
+            rng (int | np.random.Generator | None): Seed or Generator used by
+                predict_next_day, predict_sequence and unseeded ensembles; each predictor
+                owns its stream instead of sharing the global np.random state
+        """
+        if states is None and transition_matrix is None:
+            # Define weather states
+            states = ['Sunny', 'Cloudy', 'Rainy']
+
+            # Transition matrix: P[i][j] = probability of transitioning from state i to state j
+            # Rows: current state | Columns: next state
+            transition_matrix = np.array([
+                [0.7, 0.2, 0.1],  # From Sunny: 70% sunny, 20% cloudy, 10% rainy
+                [0.3, 0.4, 0.3],  # From Cloudy: 30% sunny, 40% cloudy, 30% rainy
+                [0.2, 0.3, 0.5]   # From Rainy: 20% sunny, 30% cloudy, 50% rainy
+            ])
+        elif states is None or transition_matrix is None:
+            raise ValueError("states and transition_matrix must be given together")
+
+        self.states = list(states)
         self.state_index = {state: i for i, state in enumerate(self.states)}
+        if len(self.state_index) != len(self.states):
+            raise ValueError("State names must be unique")
+        self.transition_matrix = _validate_transition_matrix(transition_matrix, len(self.states))
+        self.rng = np.random.default_rng(rng)
+        self._alias_cache = None
+
+    @property
+    def is_sparse(self):
+        """bool: Whether the transition matrix is stored as a sparse CSR matrix."""
+        return _is_sparse(self.transition_matrix)
+
+    def _row(self, index):
+        """Successor indices and probabilities of one state."""
+        if self.is_sparse:
+            matrix = self.transition_matrix
+            start, stop = matrix.indptr[index], matrix.indptr[index + 1]
+            return matrix.indices[start:stop], matrix.data[start:stop]
+        return np.arange(len(self.states)), self.transition_matrix[index]
+
+    def _alias_tables(self):
+        """
+        Per-row alias tables aligned with the CSR layout of a sparse transition matrix.
 
-        # Transition matrix: P[i][j] = probability of transitioning from state i to state j
-        # Rows: current state | Columns: next state
-        self.transition_matrix = np.array([
-            [0.7, 0.2, 0.1],  # From Sunny: 70% sunny, 20% cloudy, 10% rainy
-            [0.3, 0.4, 0.3],  # From Cloudy: 30% sunny, 40% cloudy, 30% rainy
-            [0.2, 0.3, 0.5]   # From Rainy: 20% sunny, 30% cloudy, 50% rainy
-        ])
+        Returns:
+            tuple: (indptr, indices, accept, alias) where, for slot k of row i, a draw
+            keeps indices[k] with probability accept[k] and otherwise moves to alias[k]
+        """
+        matrix = self.transition_matrix
+        if self._alias_cache is not None and self._alias_cache[0] is matrix:
+            return self._alias_cache[1]
+        indptr, indices, data = matrix.indptr, matrix.indices, matrix.data
+        accept = np.ones(len(data))
+        alias = indices.copy()
+
+        # Vose's method, one row at a time
+        for row in range(len(indptr) - 1):
+            start, stop = int(indptr[row]), int(indptr[row + 1])
+            scaled = (data[start:stop] * (stop - start)).tolist()
+            small = [k for k, value in enumerate(scaled) if value < 1.0]
+            large = [k for k, value in enumerate(scaled) if value >= 1.0]
+            while small and large:
+                low, high = small.pop(), large[-1]
+                accept[start + low] = scaled[low]
+                alias[start + low] = indices[start + high]
+                scaled[high] -= 1.0 - scaled[low]
+                if scaled[high] < 1.0:
+                    small.append(large.pop())
+            # Leftovers are 1 up to rounding and always keep their own column
+
+        tables = (indptr, indices, accept, alias)
+        self._alias_cache = (matrix, tables)
+        return tables
 
     def predict_next_day(self, current_state):
         """
@@ -37,11 +272,11 @@ class WeatherPredictor:
         # Get current state index
         current_idx = self.state_index[current_state]
 
-        # Get transition probabilities for current state
-        probabilities = self.transition_matrix[current_idx]
+        # Get successors and transition probabilities for current state
+        successors, probabilities = self._row(current_idx)
 
         # Select next state based on probabilities
-        next_idx = np.random.choice(len(self.states), p=probabilities)
+        next_idx = successors[self.rng.choice(len(successors), p=probabilities)]
 
         return self.states[next_idx]
 
@@ -66,6 +301,119 @@ class WeatherPredictor:
 
         return sequence
 
+    def stream_forecast(self, initial_state, stop_at=None, stop_after_run=None, max_days=None,
+                        seed=None, chunk_days=1024):
+        """
+        Lazily forecast one day at a time, optionally until a stop condition.
+
+        Unlike predict_sequence nothing is materialized: the returned stream yields
+        states on demand and keeps running counts and run-length statistics, which
+        makes long-horizon what-if queries cheap when most paths stop early.
+
+        Args:
+            initial_state (str): Starting weather state (the first state yielded)
+            stop_at (str, optional): Stop after the first day in this state,
+                e.g. 'Rainy' for "until the first rainy day"
+            stop_after_run (tuple, optional): (state, k) to stop after a run of k
+                consecutive days in state
+            max_days (int, optional): Stop after this many days
+            seed (int | np.random.Generator | None): Seed for reproducibility;
+                defaults to the predictor's own generator
+            chunk_days (int): Uniform draws pre-generated per chunk
+
+        Returns:
+            ForecastStream: Iterator over state names with running statistics
+        """
+        for state in (initial_state, stop_at, stop_after_run[0] if stop_after_run else None):
+            if state is not None and state not in self.state_index:
+                raise ValueError(f"Invalid state: {state}. Must be one of {self.states}")
+        if stop_after_run is not None and stop_after_run[1] < 1:
+            raise ValueError("The run length of stop_after_run must be positive")
+        rng = self.rng if seed is None else np.random.default_rng(seed)
+        return ForecastStream(self, initial_state, stop_at, stop_after_run, max_days, rng, chunk_days)
+
+    def predict_ensemble(self, initial_state, days, members, seed=None, block_days=32):
+        """
+        Simulate many independent forecast paths at once.
+
+        All members advance one day per step using a precomputed cumulative transition
+        matrix: each row is offset by its index and flattened, so a single searchsorted
+        call maps every member's uniform draw close to its next state, and a comparison
+        with the unshifted row corrects whatever the offset lost to rounding. Sparse
+        chains use the per-row alias tables instead, splitting each uniform draw into a
+        slot and an acceptance test. Uniform draws are taken from a seeded Generator in blocks of
+        block_days; the block size only bounds memory and does not change the result
+        for a given seed.
+
+        Args:
+            initial_state (str): Starting weather state for every member
+            days (int): Number of days per path, including the initial day
+            members (int): Number of ensemble members (paths)
+            seed (int | np.random.Generator | np.random.SeedSequence | None): Seed for
+                reproducibility; defaults to the predictor's own generator
+            block_days (int): Days of uniform draws generated per block
+
+        Returns:
+            EnsembleForecast: State matrix and per-day state frequencies
+        """
+        if initial_state not in self.state_index:
+            raise ValueError(f"Invalid state: {initial_state}. Must be one of {self.states}")
+        if days < 1 or members < 1:
+            raise ValueError("days and members must be positive")
+
+        rng = self.rng if seed is None else np.random.default_rng(seed)
+        n_states = len(self.states)
+
+        if self.is_sparse:
+            indptr, indices, accept, alias = self._alias_tables()
+            degrees = np.diff(indptr)
+
+            def advance(current, draws):
+                scaled = draws * degrees[current]
+                slots = scaled.astype(np.int64)
+                positions = indptr[current] + slots
+                return np.where(scaled - slots < accept[positions],
+                                indices[positions], alias[positions])
+        else:
+            # Adding the row offset rounds current + draw (1 + (1 - 2**-53) == 2.0) and
+            # merges steps smaller than ulp(current), so the search is only a first
+            # guess: it is clipped to the row and then moved until it is the first column
+            # whose unshifted cumulative value exceeds the draw, as bisect would return.
+            # The last column is exactly 1, so every draw in [0, 1) has such a column.
+            cumulative = np.cumsum(self.transition_matrix, axis=1)
+            cumulative[:, -1] = 1.0
+            flat_cumulative = (cumulative + np.arange(n_states)[:, None]).ravel()
+            unshifted = cumulative.ravel()
+
+            def advance(current, draws):
+                row_starts = current * n_states
+                positions = np.searchsorted(flat_cumulative, current + draws, side='right')
+                columns = np.clip(positions - row_starts, 0, n_states - 1)
+                while True:
+                    low = unshifted[row_starts + columns] <= draws
+                    high = (columns > 0) & (unshifted[row_starts + columns - 1] > draws)
+                    if not (low.any() or high.any()):
+                        return columns
+                    columns += low
+                    columns -= high
+
+        states = np.empty((members, days), dtype=_state_dtype(n_states))
+        frequencies = np.empty((days, n_states))
+        current = np.full(members, self.state_index[initial_state], dtype=np.intp)
+        states[:, 0] = current
+        frequencies[0] = np.bincount(current, minlength=n_states) / members
+
+        for block_start in range(1, days, block_days):
+            block = rng.random((min(block_days, days - block_start), members))
+            for offset, draws in enumerate(block):
+                day = block_start + offset
+                current = advance(current, draws)
+                states[:, day] = current
+                frequencies[day] = np.bincount(current, minlength=n_states) / members
+
+        return EnsembleForecast(states=states, frequencies=frequencies,
+                                state_names=list(self.states))
+
     def get_probability_distribution(self, current_state):
         """
         Get the probability distribution for the next day given current state.
@@ -74,53 +422,312 @@ class WeatherPredictor:
             current_state (str): Current weather state
 
         Returns:
-            dict: Probability distribution for next day
+            dict: Probability distribution for next day (only the reachable states when
+            the matrix is sparse)
         """
         if current_state not in self.state_index:
             raise ValueError(f"Invalid state: {current_state}")
 
         current_idx = self.state_index[current_state]
-        probabilities = self.transition_matrix[current_idx]
+        successors, probabilities = self._row(current_idx)
+
+        return {self.states[j]: prob for j, prob in zip(successors, probabilities)}
 
-        return {state: prob for state, prob in zip(self.states, probabilities)}
+    def _initial_vector(self, initial_state):
+        if initial_state not in self.state_index:
+            raise ValueError(f"Invalid state: {initial_state}. Must be one of {self.states}")
+        vector = np.zeros(len(self.states))
+        vector[self.state_index[initial_state]] = 1.0
+        return vector
 
-    def steady_state_distribution(self, iterations=100):
+    def k_step_distribution(self, initial_state, k):
+        """
+        Exact distribution of the weather k days after initial_state.
+
+        Uses P^k computed by repeated squaring, so the cost is O(n^3 log k) instead of
+        k matrix-vector products or a Monte Carlo estimate. Sparse chains instead apply
+        k sparse vector-matrix products (O(k * nnz)), since powers of a sparse matrix
+        quickly become dense.
+
+        Args:
+            initial_state (str): Current weather state
+            k (int): Number of days ahead (0 returns the initial state itself)
+
+        Returns:
+            dict: Probability distribution on day k
+        """
+        if k < 0:
+            raise ValueError("k must be non-negative")
+        if self.is_sparse:
+            vector = self.forecast_distributions(initial_state, [k])[0]
+        else:
+            vector = self._initial_vector(initial_state) @ np.linalg.matrix_power(self.transition_matrix, k)
+        return {state: prob for state, prob in zip(self.states, vector)}
+
+    def forecast_distributions(self, initial_state, horizons):
+        """
+        Exact distributions for several horizons in one call.
+
+        Horizons are processed in increasing order and each one reuses the previous
+        result, advancing by the difference through cached powers P^(2^i). Every horizon
+        therefore costs O(n^2 log(gap)) matrix-vector work on top of the shared squarings.
+        Sparse chains advance one sparse vector-matrix product per day instead.
+
+        Args:
+            initial_state (str): Current weather state
+            horizons (iterable of int): Days ahead, in any order
+
+        Returns:
+            np.ndarray: (len(horizons) x n_states) distributions, in the order given
+        """
+        horizons = np.asarray(list(horizons), dtype=np.int64)
+        if horizons.size and horizons.min() < 0:
+            raise ValueError("Horizons must be non-negative")
+
+        vector = self._initial_vector(initial_state)
+        results = np.empty((horizons.size, len(self.states)))
+        powers = [self.transition_matrix]
+        transposed = self.transition_matrix.T.tocsr() if self.is_sparse else None
+        reached = 0
+        for position in np.argsort(horizons, kind='stable'):
+            gap = int(horizons[position]) - reached
+            if transposed is not None:
+                for _ in range(gap):
+                    vector = transposed @ vector
+                gap = 0
+            bit = 0
+            while gap:
+                if bit == len(powers):
+                    powers.append(powers[-1] @ powers[-1])
+                if gap & 1:
+                    vector = vector @ powers[bit]
+                gap >>= 1
+                bit += 1
+            reached = int(horizons[position])
+            results[position] = vector
+        return results
+
+    def chain_diagnostics(self):
+        """
+        Structural properties of the chain that determine its long-run behavior.
+
+        Returns:
+            dict: 'irreducible' (every state reachable from every other), 'period' (gcd
+            of cycle lengths through the states reachable from the first state) and
+            'aperiodic' (period == 1). An irreducible aperiodic chain converges to its
+            steady state from any initial state.
+        """
+        indptr, indices = self._successors()
+        n_states = len(self.states)
+        levels = _bfs_levels(indptr, indices, 0, n_states)
+        reverse_indptr, reverse_indices = _transpose_structure(indptr, indices, n_states)
+        reverse_levels = _bfs_levels(reverse_indptr, reverse_indices, 0, n_states)
+        irreducible = bool((levels >= 0).all() and (reverse_levels >= 0).all())
+
+        # For every edge u -> v inside the reached set, the cycle lengths through it are
+        # congruent to level[u] + 1 - level[v]; the period is the gcd of these values
+        sources = np.repeat(np.arange(n_states), np.diff(indptr))
+        inside = (levels[sources] >= 0) & (levels[indices] >= 0)
+        offsets = np.abs(levels[sources[inside]] + 1 - levels[indices[inside]])
+        period = int(np.gcd.reduce(offsets)) if offsets.size else 0
+        return {'irreducible': irreducible, 'period': period, 'aperiodic': period == 1}
+
+    def _successors(self):
+        """Successor lists of each state in CSR form (indptr, indices)."""
+        if self.is_sparse:
+            return self.transition_matrix.indptr, self.transition_matrix.indices
+        rows, columns = np.nonzero(self.transition_matrix)
+        indptr = np.zeros(len(self.states) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(self.states)), out=indptr[1:])
+        return indptr, columns
+
+    def steady_state_distribution(self, iterations=None):
         """
         Calculate the steady-state (long-term) probability distribution.
 
+        The stationary distribution pi is obtained exactly by solving pi (P - I) = 0
+        together with sum(pi) = 1; sparse chains use an iterative Arnoldi eigensolver
+        for the eigenvalue-1 left eigenvector. For an irreducible aperiodic chain this is
+        also the limit of the forecast distribution from any initial state; see
+        chain_diagnostics() for those checks.
+
         Args:
-            iterations (int): Number of matrix multiplications
+            iterations (int, optional): If given, use the original approximation instead:
+                multiply a uniform distribution by the transition matrix this many times
 
         Returns:
             dict: Steady-state probability distribution
+
+        Raises:
+            ValueError: If the chain has more than one stationary distribution
         """
-        # Start with uniform distribution
-        distribution = np.array([1/3, 1/3, 1/3])
+        if iterations is not None:
+            distribution = np.full(len(self.states), 1 / len(self.states))
+            for _ in range(iterations):
+                distribution = distribution @ self.transition_matrix
+            return {state: prob for state, prob in zip(self.states, distribution)}
+
+        return {state: prob for state, prob in zip(self.states, self._stationary_vector())}
+
+    def _stationary_vector(self):
+        n_states = len(self.states)
+        if self.is_sparse and n_states > 2:
+            return _sparse_stationary_vector(self.transition_matrix)
+        # Replace one (redundant) balance equation with the normalization constraint
+        system = self._dense_matrix().T - np.eye(n_states)
+        system[-1, :] = 1.0
+        rhs = np.zeros(n_states)
+        rhs[-1] = 1.0
+        try:
+            return np.linalg.solve(system, rhs)
+        except np.linalg.LinAlgError:
+            raise ValueError("The chain has more than one stationary distribution "
+                             "(it has several closed classes)") from None
+
+    def mean_first_passage_times(self):
+        """
+        Expected number of days to first reach each state from each state.
+
+        Computed from the fundamental matrix Z = (I - P + 1 pi)^-1 as
+        M[i, j] = (Z[j, j] - Z[i, j]) / pi[j]; the diagonal holds the mean return times
+        1 / pi[j].
 
-        # Multiply by transition matrix repeatedly
-        for _ in range(iterations):
-            distribution = distribution @ self.transition_matrix
+        Returns:
+            np.ndarray: (n_states x n_states) matrix, rows = from, columns = to
 
-        return {state: prob for state, prob in zip(self.states, distribution)}
+        Raises:
+            ValueError: If the chain is not irreducible (some passages never happen) or
+                is too large for the dense N x N result
+        """
+        if not self.chain_diagnostics()['irreducible']:
+            raise ValueError("Mean first passage times require an irreducible chain")
+        pi = self._stationary_vector()
+        n_states = len(self.states)
+        fundamental = np.linalg.inv(np.eye(n_states) - self._dense_matrix() + pi[None, :])
+        passage = (np.diag(fundamental)[None, :] - fundamental) / pi[None, :]
+        passage[np.diag_indices(n_states)] = 1.0 / pi
+        return passage
+
+    def mean_return_times(self):
+        """
+        Expected number of days between consecutive visits to each state.
+
+        Returns:
+            dict: Mean return time (1 / steady-state probability) per state
+        """
+        passage = self.mean_first_passage_times()
+        return {state: passage[i, i] for i, state in enumerate(self.states)}
+
+    def _dense_matrix(self, max_states=5000):
+        """Dense copy of the transition matrix, refusing chains too large to densify."""
+        if not self.is_sparse:
+            return self.transition_matrix
+        if len(self.states) > max_states:
+            raise ValueError(f"Chain has {len(self.states)} states; dense operations are "
+                             f"limited to {max_states}")
+        return self.transition_matrix.toarray()
+
+    def display_transition_matrix(self, max_states=8):
+        """
+        Display the transition matrix in a readable format.
 
-    def display_transition_matrix(self):
-        """Display the transition matrix in a readable format."""
+        Args:
+            max_states (int): Chains with more states are listed row by row with only
+                their non-zero successors, truncated to this many rows
+        """
         print("\n" + "="*60)
         print("STATE TRANSITION MATRIX")
         print("="*60)
-        print(f"\n{'Current State':<15} | {'Sunny':<12} | {'Cloudy':<12} | {'Rainy':<12}")
-        print("-" * 60)
 
-        for i, state in enumerate(self.states):
-            probs = self.transition_matrix[i]
-            print(f"{state:<15} | {probs[0]:<12.1%} | {probs[1]:<12.1%} | {probs[2]:<12.1%}")
+        if len(self.states) <= max_states:
+            header = " | ".join(f"{state:<12}" for state in self.states)
+            print(f"\n{'Current State':<15} | {header}")
+            print("-" * 60)
+            for i, state in enumerate(self.states):
+                probs = self._dense_matrix()[i]
+                print(f"{state:<15} | " + " | ".join(f"{prob:<12.1%}" for prob in probs))
+        else:
+            print(f"\n{len(self.states)} states; non-zero transitions of the first {max_states}:")
+            print("-" * 60)
+            for i, state in enumerate(self.states[:max_states]):
+                successors, probs = self._row(i)
+                listed = ", ".join(f"{self.states[j]} {prob:.1%}" for j, prob in zip(successors, probs))
+                print(f"{state:<15} -> {listed}")
         print("="*60 + "\n")
 
 
+def _is_sparse(matrix):
+    return sparse is not None and sparse.issparse(matrix)
+
+
+def _validate_transition_matrix(matrix, n_states):
+    """Check shape and row sums; returns a float CSR matrix or a float ndarray."""
+    if _is_sparse(matrix):
+        matrix = sparse.csr_matrix(matrix, dtype=np.float64)
+        matrix.eliminate_zeros()
+        matrix.sort_indices()
+        values, row_sums = matrix.data, np.asarray(matrix.sum(axis=1)).ravel()
+    else:
+        matrix = np.array(matrix, dtype=np.float64)
+        values, row_sums = matrix, matrix.sum(axis=1) if matrix.ndim == 2 else None
+    if matrix.shape != (n_states, n_states):
+        raise ValueError(f"Transition matrix must be {n_states} x {n_states}, got {matrix.shape}")
+    if (values < 0).any() or not np.allclose(row_sums, 1.0, atol=1e-8):
+        raise ValueError("Transition matrix rows must be non-negative and sum to 1")
+    return matrix
+
+
+def _state_dtype(n_states):
+    """Smallest signed integer dtype able to hold every state index."""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_states <= np.iinfo(dtype).max + 1:
+            return dtype
+    return np.int64
+
+
+def _sparse_stationary_vector(matrix):
+    """Stationary distribution of a sparse chain via ARPACK on P^T."""
+    from scipy.sparse.linalg import eigs
+
+    _, vectors = eigs(matrix.T.tocsr(), k=1, which='LR', v0=np.full(matrix.shape[0], 1.0))
+    vector = np.real(vectors[:, 0])
+    vector /= vector.sum()
+    if (vector < -1e-10).any() or np.abs(vector @ matrix - vector).max() > 1e-8:
+        raise ValueError("The chain has more than one stationary distribution "
+                         "(it has several closed classes)")
+    return np.clip(vector, 0.0, None)
+
+
+def _bfs_levels(indptr, indices, source, n_states):
+    """Breadth-first search over CSR successor lists; -1 marks unreachable states."""
+    levels = np.full(n_states, -1, dtype=np.int64)
+    levels[source] = 0
+    frontier = np.array([source])
+    level = 0
+    while frontier.size:
+        level += 1
+        starts, lengths = indptr[frontier], np.diff(indptr)[frontier]
+        # Concatenate the successor ranges of all frontier states without a Python loop
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        successors = np.unique(indices[positions])
+        frontier = successors[levels[successors] < 0]
+        levels[frontier] = level
+    return levels
+
+
+def _transpose_structure(indptr, indices, n_states):
+    """CSR structure of the reversed graph (predecessor lists)."""
+    sources = np.repeat(np.arange(n_states), np.diff(indptr))
+    order = np.argsort(indices, kind='stable')
+    reverse_indptr = np.zeros(n_states + 1, dtype=np.int64)
+    np.cumsum(np.bincount(indices, minlength=n_states), out=reverse_indptr[1:])
+    return reverse_indptr, sources[order]
+
+
 # Demonstration and usage examples
-def main():
-    # Create weather predictor instance
-    predictor = WeatherPredictor()
+def main(seed=42):
+    # Create weather predictor instance with its own seeded generator (for reproducibility)
+    predictor = WeatherPredictor(rng=seed)
 
     # Display transition matrix
     predictor.display_transition_matrix()
@@ -165,16 +772,51 @@ def main():
     simulations = 5
 
     for sim in range(simulations):
-        sequence = predictor.predict_sequence(initial, 30)
-        counts = {state: sequence.count(state) for state in predictor.states}
+        stream = predictor.stream_forecast(initial, max_days=30)
+        for _ in stream:
+            pass
         print(f"\nSimulation {sim + 1}:")
-        for state, count in counts.items():
+        for state, count in stream.state_counts().items():
             print(f"  {state}: {count} days ({count/30:.1%})")
 
+    # Example 5: Ensemble forecast
+    print("\n" + "="*60)
+    print("EXAMPLE 5: Ensemble forecast (100,000 members x 365 days)")
+    print("-" * 60)
+    ensemble = predictor.predict_ensemble("Sunny", 365, 100_000, seed=42)
+    for day in (1, 7, 30, 364):
+        freqs = ensemble.frequency_dict(day)
+        summary = ", ".join(f"{state} {freq:.1%}" for state, freq in freqs.items())
+        print(f"  Day {day + 1}: {summary}")
 
-if __name__ == "__main__":
-    # Set random seed for reproducibility (optional)
-    np.random.seed(42)
-    random.seed(42)
+    # Example 6: Exact multi-day forecasts and return times
+    print("\n" + "="*60)
+    print("EXAMPLE 6: Exact k-day forecasts and mean return times")
+    print("-" * 60)
+    horizons = [1, 3, 7, 30]
+    distributions = predictor.forecast_distributions("Rainy", horizons)
+    print("Starting from Rainy:")
+    for k, distribution in zip(horizons, distributions):
+        summary = ", ".join(f"{state} {prob:.1%}" for state, prob in zip(predictor.states, distribution))
+        print(f"  In {k} days: {summary}")
+    print("Average days between visits:")
+    for state, days in predictor.mean_return_times().items():
+        print(f"  {state}: {days:.2f}")
+
+    # Example 7: Streaming what-if query with early stopping
+    print("\n" + "="*60)
+    print("EXAMPLE 7: Days from Sunny until the first rainy day (10,000 streams)")
+    print("-" * 60)
+    waits = []
+    for _ in range(10_000):
+        stream = predictor.stream_forecast("Sunny", stop_at="Rainy", chunk_days=16)
+        for _ in stream:
+            pass
+        waits.append(stream.days - 1)
+    expected = predictor.mean_first_passage_times()[0, 2]
+    print(f"  Simulated mean: {np.mean(waits):.2f} days (exact: {expected:.2f})")
+    print(f"  Longest wait: {max(waits)} days")
 
+
+if __name__ == "__main__":
     main()
\ No newline at end of file